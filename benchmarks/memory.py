@@ -0,0 +1,209 @@
+"""Measure the memory footprint of item trees using tracemalloc.
+
+For trees of increasing size, this reports the number of bytes retained per
+text item, definition item and Formatter object, as well as the peak memory
+used while formatting the tree. The peak is broken down into the intermediate
+list of formatted messages and the lists of markup positions computed for
+every item. The one-time cost of importing docutils and building its markup
+patterns, which happens the first time markup is parsed, is reported
+separately so that it isn't counted in the peak for the first tree.
+
+Usage:
+    PYTHONPATH=. python benchmarks/memory.py [--sizes N [N ...]]
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import gc
+import sys
+import copy
+import argparse
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+from linotype import Formatter, Item
+from linotype.items import DefinitionItem, TextItem, _get_inliner_patterns
+
+import trees
+
+
+def measure_retained(func: Callable[[], Any]) -> Tuple[Any, int]:
+    """Get the number of bytes retained by the return value of a function.
+
+    Returns:
+        The return value of the function, which is kept alive so that it can
+        be measured, and the number of bytes allocated by the function that
+        were not freed.
+    """
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    value = func()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    retained = sum(
+        stat.size_diff for stat in after.compare_to(before, "filename"))
+    return value, retained
+
+
+def measure_peak(func: Callable[[], Any]) -> Tuple[Any, int]:
+    """Get the peak memory allocated while calling a function.
+
+    Returns:
+        The return value of the function and the peak number of bytes
+        allocated above what was allocated before calling it.
+    """
+    gc.collect()
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        # Before Python 3.9, the peak can only be reset by restarting
+        # tracing, which forgets the memory that is already allocated.
+        tracemalloc.stop()
+        tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    value = func()
+    _, peak = tracemalloc.get_traced_memory()
+    return value, peak - baseline
+
+
+def bytes_per_item(size: int) -> Dict[str, float]:
+    """Measure the number of bytes retained for each item and Formatter."""
+    formatter = Formatter(auto_width=False)
+
+    def build_text_items():
+        root_item = Item(formatter)
+        for i in range(size):
+            root_item.add_text(
+                "This is text item number {0}.".format(i),
+                item_id="text{0}".format(i))
+        return root_item
+
+    def build_def_items():
+        root_item = Item(formatter)
+        for i in range(size):
+            root_item.add_def(
+                "--option-{0}".format(i), "[flags] path",
+                "Process the file at path.", item_id="def{0}".format(i))
+        return root_item
+
+    def build_formatters():
+        return [copy.copy(formatter) for _ in range(size)]
+
+    _, text_bytes = measure_retained(build_text_items)
+    _, def_bytes = measure_retained(build_def_items)
+    _, formatter_bytes = measure_retained(build_formatters)
+
+    return {
+        "TextItem": text_bytes / size,
+        "DefinitionItem": def_bytes / size,
+        "Formatter": formatter_bytes / size}
+
+
+def _markup_positions(item: Item) -> list:
+    """Compute the markup positions that formatting an item computes."""
+    if isinstance(item, TextItem):
+        return [item.parse_manual_markup(item.content)]
+    elif isinstance(item, DefinitionItem):
+        term, args, message = item.content
+        term, term_positions = item.parse_manual_markup(term)
+        args, args_positions = item.parse_manual_markup(args)
+        message, message_positions = item.parse_manual_markup(message)
+        return [
+            term_positions + item.parse_term_markup(term),
+            args_positions + item.parse_args_markup(args),
+            message_positions + item.parse_message_markup(args, message)]
+    return []
+
+
+def markup_setup_peak() -> int:
+    """Get the peak memory used the first time markup is parsed.
+
+    This must be called before anything else parses markup.
+    """
+    _, peak = measure_peak(_get_inliner_patterns)
+    return peak
+
+
+def format_memory(sections: int, options: int) -> Dict[str, float]:
+    """Measure the memory used while formatting a representative tree."""
+    root_item, tree_bytes = measure_retained(
+        lambda: trees.build_tree(sections, options))
+    items = [item for item in root_item.get_items() if item.parent]
+
+    output, format_peak = measure_peak(root_item.format)
+    _, messages_bytes = measure_retained(
+        lambda: [item._format_item() for item in items])
+    _, positions_bytes = measure_retained(
+        lambda: [_markup_positions(item) for item in items])
+
+    return {
+        "items": len(items),
+        "tree": tree_bytes,
+        "format peak": format_peak,
+        "output": sys.getsizeof(output),
+        "help_messages": messages_bytes,
+        "markup positions": positions_bytes}
+
+
+def _kib(value: float) -> str:
+    return "{0:10.1f}".format(value / 1024)
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 5000],
+        help="the numbers of items to measure the per-item footprint with")
+    parser.add_argument(
+        "--sections", type=int, nargs="+", default=[2, 8, 32],
+        help="the numbers of sections to measure formatting with")
+    parser.add_argument(
+        "--options", type=int, default=20,
+        help="the number of definitions in each section")
+    options = parser.parse_args(args)
+
+    tracemalloc.start()
+
+    print("Retained bytes per object")
+    print("  {0:>8} {1:>14} {2:>14} {3:>14}".format(
+        "items", "TextItem", "DefinitionItem", "Formatter"))
+    for size in options.sizes:
+        results = bytes_per_item(size)
+        print("  {0:>8} {1:>14.1f} {2:>14.1f} {3:>14.1f}".format(
+            size, results["TextItem"], results["DefinitionItem"],
+            results["Formatter"]))
+
+    print("")
+    print("Peak memory the first time markup is parsed (KiB)")
+    print("  {0}".format(_kib(markup_setup_peak())))
+
+    columns = [
+        "tree", "format peak", "output", "help_messages", "markup positions"]
+    print("")
+    print("Memory while formatting (KiB)")
+    print("  {0:>8} {1}".format(
+        "items", "".join("{0:>17}".format(column) for column in columns)))
+    for sections in options.sections:
+        results = format_memory(sections, options.options)
+        print("  {0:>8} {1}".format(results["items"], "".join(
+            "{0:>17}".format(_kib(results[column])) for column in columns)))
+
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Benchmark building a Sphinx project that uses the 'linotype' directive.
+
+This generates a Sphinx project in a temporary directory with many 'linotype'
+directives that import large item trees, select items with :item_id: and
+extend items with definition lists. The project is built offline and the
+total build time and the time spent in each directive are reported.
+
+Usage:
+    PYTHONPATH=. python benchmarks/sphinx_build.py [--pages N] ...
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import textwrap
+import statistics
+import contextlib
+from typing import List, NamedTuple
+
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+
+from linotype.ext import LinotypeDirective
+
+import trees
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILDER_MODULE = "linotype_bench_builders"
+
+DirectiveTiming = NamedTuple(
+    "DirectiveTiming",
+    [("docname", str), ("lineno", int), ("kind", str), ("seconds", float)])
+
+CONF_TEMPLATE = """\
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+sys.path.insert(0, {benchmark_dir!r})
+
+extensions = ["linotype.ext"]
+master_doc = "index"
+project = "linotype-benchmark"
+exclude_patterns = ["_build"]
+"""
+
+BUILDER_TEMPLATE = """\
+import trees
+
+
+def large_tree():
+    return trees.build_tree(
+        sections={sections}, options={options}, nested={nested})
+"""
+
+DIRECTIVE_TEMPLATES = {
+    "module": """\
+        .. linotype::
+            :module: {module}
+            :function: large_tree
+        """,
+    "filepath": """\
+        .. linotype::
+            :filepath: {filepath}
+            :function: large_tree
+        """,
+    "item_id": """\
+        .. linotype::
+            :module: {module}
+            :function: large_tree
+            :item_id: {section_id}
+        """,
+    "children": """\
+        .. linotype::
+            :module: {module}
+            :function: large_tree
+            :item_id: {section_id}
+            :children:
+        """,
+    "extended": """\
+        .. linotype::
+            :module: {module}
+            :function: large_tree
+            :item_id: {section_id}
+
+            {option_id}
+                This content is added after the existing content. It has
+                **strong** and *emphasized* markup.
+
+            {option_id} : @before : @rst
+                This content is added *before* the existing content.
+
+                - It contains a list.
+                - With two items.
+
+            {other_option_id} : @replace
+                This content replaces the existing content.
+        """,
+    }
+
+
+def generate_project(
+        srcdir: str, pages: int, directives: int, sections: int,
+        options: int, nested: int) -> int:
+    """Write the source files for a Sphinx project.
+
+    Args:
+        srcdir: The directory to write the project to.
+        pages: The number of pages to generate.
+        directives: The number of directives on each page.
+        sections: The number of sections in the item tree.
+        options: The number of definitions in each section.
+        nested: The number of nested definitions under each definition.
+
+    Returns:
+        The total number of directives in the project.
+    """
+    builder_path = os.path.join(srcdir, BUILDER_MODULE + ".py")
+    with open(os.path.join(srcdir, "conf.py"), "w") as file:
+        file.write(CONF_TEMPLATE.format(benchmark_dir=BENCHMARK_DIR))
+    with open(builder_path, "w") as file:
+        file.write(BUILDER_TEMPLATE.format(
+            sections=sections, options=options, nested=nested))
+
+    kinds = sorted(DIRECTIVE_TEMPLATES)
+    page_names = ["page{0}".format(page) for page in range(pages)]
+    total = 0
+    for page, page_name in enumerate(page_names):
+        blocks = [page_name, "=" * len(page_name), ""]
+        for directive in range(directives):
+            kind = kinds[(page + directive) % len(kinds)]
+            section = (page + directive) % sections
+            blocks.append(textwrap.dedent(
+                DIRECTIVE_TEMPLATES[kind]).format(
+                    module=BUILDER_MODULE, filepath=builder_path,
+                    section_id=trees.section_id(section),
+                    option_id=trees.option_id(section, 0),
+                    other_option_id=trees.option_id(
+                        section, min(1, options - 1))))
+            total += 1
+
+        with open(os.path.join(srcdir, page_name + ".rst"), "w") as file:
+            file.write("\n".join(blocks))
+
+    with open(os.path.join(srcdir, "index.rst"), "w") as file:
+        file.write(textwrap.dedent("""\
+            Benchmark
+            =========
+
+            .. toctree::
+
+            """))
+        file.write("".join("   {0}\n".format(name) for name in page_names))
+
+    return total
+
+
+def _directive_kind(directive: LinotypeDirective) -> str:
+    """Get the name of the template that a directive was generated from."""
+    options = directive.options
+    if directive.content:
+        return "extended"
+    elif "filepath" in options:
+        return "filepath"
+    elif "children" in options:
+        return "children"
+    elif "item_id" in options:
+        return "item_id"
+    return "module"
+
+
+@contextlib.contextmanager
+def record_directive_timings(timings: List[DirectiveTiming]):
+    """Time every run of the 'linotype' directive in this process."""
+    original_run = LinotypeDirective.run
+
+    def timed_run(self):
+        start = time.perf_counter()
+        try:
+            return original_run(self)
+        finally:
+            seconds = time.perf_counter() - start
+            env = getattr(self.state.document.settings, "env", None)
+            timings.append(DirectiveTiming(
+                env.docname if env else "", self.lineno,
+                _directive_kind(self), seconds))
+
+    LinotypeDirective.run = timed_run
+    try:
+        yield
+    finally:
+        LinotypeDirective.run = original_run
+
+
+def build_project(
+        srcdir: str, outdir: str, builder: str, jobs: int,
+        timings: List[DirectiveTiming]) -> float:
+    """Build the project from scratch and return the time it took."""
+    warnings = io.StringIO()
+    with docutils_namespace(), record_directive_timings(timings):
+        app = Sphinx(
+            srcdir, srcdir, outdir, os.path.join(outdir, ".doctrees"),
+            builder, status=None, warning=warnings, freshenv=True,
+            parallel=jobs)
+        start = time.perf_counter()
+        app.build(force_all=True)
+        seconds = time.perf_counter() - start
+
+    if app.statuscode:
+        raise RuntimeError(
+            "the Sphinx build failed:\n{0}".format(warnings.getvalue()))
+
+    return seconds
+
+
+def _summarize(values: List[float]) -> str:
+    """Format the statistics for a list of durations in milliseconds."""
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return "n={0:<6} mean={1:8.3f}  median={2:8.3f}  p95={3:8.3f}  " \
+        "max={4:8.3f}".format(
+            len(values), statistics.mean(values) * 1000,
+            statistics.median(values) * 1000, p95 * 1000, values[-1] * 1000)
+
+
+def report(
+        build_times: List[float], timings: List[DirectiveTiming],
+        total_directives: int, items: int, slowest: int, file=sys.stdout
+        ) -> None:
+    """Print the results of the benchmark."""
+    print("Sphinx build benchmark", file=file)
+    print("  directives per build: {0}".format(total_directives), file=file)
+    print("  items per tree:       {0}".format(items), file=file)
+    print("", file=file)
+    print("Total build time (s)", file=file)
+    for i, seconds in enumerate(build_times):
+        print("  build {0}: {1:.3f}".format(i + 1, seconds), file=file)
+    print("  best:    {0:.3f}".format(min(build_times)), file=file)
+
+    if not timings:
+        # Directives run in worker processes during parallel builds.
+        print("", file=file)
+        print("Per-directive timings are unavailable for parallel builds.",
+              file=file)
+        return
+
+    print("", file=file)
+    print("Per-directive time (ms)", file=file)
+    print("  all         {0}".format(
+        _summarize([timing.seconds for timing in timings])), file=file)
+    for kind in sorted(DIRECTIVE_TEMPLATES):
+        kind_times = [
+            timing.seconds for timing in timings if timing.kind == kind]
+        if kind_times:
+            print("  {0:<11} {1}".format(kind, _summarize(kind_times)),
+                  file=file)
+
+    print("", file=file)
+    print("Slowest directives (ms)", file=file)
+    for timing in sorted(timings, key=lambda x: x.seconds, reverse=True)[
+            :slowest]:
+        print("  {0:8.3f}  {1}:{2} ({3})".format(
+            timing.seconds * 1000, timing.docname, timing.lineno,
+            timing.kind), file=file)
+
+    directive_total = sum(timing.seconds for timing in timings)
+    print("", file=file)
+    print("Time in directives: {0:.3f}s of {1:.3f}s in the last build".format(
+        directive_total, build_times[-1]), file=file)
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--pages", type=int, default=20, help="the number of pages")
+    parser.add_argument(
+        "--directives", type=int, default=10,
+        help="the number of directives on each page")
+    parser.add_argument(
+        "--sections", type=int, default=10,
+        help="the number of sections in the item tree")
+    parser.add_argument(
+        "--options", type=int, default=20,
+        help="the number of definitions in each section")
+    parser.add_argument(
+        "--nested", type=int, default=2,
+        help="the number of nested definitions under each definition")
+    parser.add_argument(
+        "--builder", default="html", help="the Sphinx builder to use")
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="the number of parallel Sphinx processes")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="the number of builds to run")
+    parser.add_argument(
+        "--slowest", type=int, default=10,
+        help="the number of slowest directives to list")
+    options = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory(prefix="linotype-bench-") as tempdir:
+        srcdir = os.path.join(tempdir, "src")
+        os.mkdir(srcdir)
+        total_directives = generate_project(
+            srcdir, options.pages, options.directives, options.sections,
+            options.options, options.nested)
+
+        build_times = []
+        timings = []
+        for i in range(options.repeat):
+            # Only keep the per-directive timings from the last build so that
+            # they aren't skewed by the first import of the builder module.
+            timings.clear()
+            build_times.append(build_project(
+                srcdir, os.path.join(tempdir, "build{0}".format(i)),
+                options.builder, options.jobs, timings))
+
+    items = trees.count_items(trees.build_tree(
+        options.sections, options.options, options.nested))
+    report(build_times, timings, total_directives, items, options.slowest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Benchmark the cold-start cost of printing a help message.
+
+Every measurement runs in a fresh Python process so that nothing is cached
+between runs. The time it takes to import linotype, build a representative
+item tree and make the first call to Item.format() is measured using the wall
+clock, and the output of 'python -X importtime' is used to break down the
+import time by module. Some modules like docutils are only imported the first
+time markup is parsed, so the breakdown includes formatting a small tree.
+
+Usage:
+    python benchmarks/startup.py [--repeat N] [--modules N]
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import collections
+from typing import Dict, List, NamedTuple
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+IMPORTTIME_REGEX = re.compile(
+    r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+# This code is timed with 'python -X importtime'. Formatting a tree imports
+# the modules which are only needed to parse markup.
+IMPORTS_SCRIPT = """\
+import linotype
+import trees
+trees.build_tree(sections=1, options=1).format()
+"""
+
+# This script runs in a fresh interpreter. It times each phase of printing a
+# help message and writes the results to stdout as JSON.
+PHASES_SCRIPT = """\
+import json
+import time
+
+start = time.perf_counter()
+import linotype
+import_done = time.perf_counter()
+
+import trees
+root_item = trees.build_tree(sections={sections}, options={options})
+build_done = time.perf_counter()
+
+root_item.format()
+format_done = time.perf_counter()
+
+print(json.dumps({{
+    "import": import_done - start,
+    "build": build_done - import_done,
+    "format": format_done - build_done,
+    }}))
+"""
+
+ImportRecord = NamedTuple(
+    "ImportRecord",
+    [("module", str), ("self_us", int), ("cumulative_us", int),
+     ("depth", int)])
+
+
+def _subprocess_env() -> Dict[str, str]:
+    """Get the environment for subprocesses so they can import linotype."""
+    env = dict(os.environ)
+    paths = [REPO_DIR, BENCHMARK_DIR]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
+
+
+def measure_phases(sections: int, options: int) -> Dict[str, float]:
+    """Time importing, building and formatting in a fresh process."""
+    script = PHASES_SCRIPT.format(sections=sections, options=options)
+    start = time.perf_counter()
+    output = subprocess.check_output(
+        [sys.executable, "-c", script], env=_subprocess_env())
+    phases = json.loads(output.decode())
+    phases["process"] = time.perf_counter() - start
+    return phases
+
+
+def _run_importtime(code: str) -> List[ImportRecord]:
+    """Run code in a fresh process and parse the 'importtime' output."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=_subprocess_env(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        check=True)
+
+    records = []
+    for line in result.stderr.decode().splitlines():
+        match = IMPORTTIME_REGEX.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        records.append(ImportRecord(
+            module, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    return records
+
+
+def measure_imports() -> List[ImportRecord]:
+    """Get the import time of every module needed to print a help message.
+
+    This includes the modules imported by 'import linotype' and the modules
+    which are imported the first time a tree is formatted. It only includes
+    modules that aren't already imported by the interpreter at startup.
+    """
+    startup_modules = {record.module for record in _run_importtime("pass")}
+    return [
+        record for record in _run_importtime(IMPORTS_SCRIPT)
+        if record.module not in startup_modules]
+
+
+def group_imports(records: List[ImportRecord]) -> Dict[str, int]:
+    """Get the total self time of each top-level package in microseconds."""
+    totals = collections.Counter()
+    for record in records:
+        totals[record.module.split(".")[0]] += record.self_us
+    return totals
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--repeat", type=int, default=10,
+        help="the number of fresh processes to measure")
+    parser.add_argument(
+        "--sections", type=int, default=5,
+        help="the number of sections in the item tree")
+    parser.add_argument(
+        "--options", type=int, default=10,
+        help="the number of definitions in each section")
+    parser.add_argument(
+        "--modules", type=int, default=15,
+        help="the number of slowest packages and modules to list")
+    options = parser.parse_args(args)
+
+    phase_runs = collections.defaultdict(list)
+    import_runs = collections.defaultdict(list)
+    package_runs = collections.defaultdict(list)
+    for _ in range(options.repeat):
+        for phase, seconds in measure_phases(
+                options.sections, options.options).items():
+            phase_runs[phase].append(seconds)
+
+        records = measure_imports()
+        for record in records:
+            import_runs[record.module].append(record.cumulative_us)
+        for package, self_us in group_imports(records).items():
+            package_runs[package].append(self_us)
+
+    print("Startup benchmark ({0} fresh processes)".format(options.repeat))
+    print("")
+    print("Wall-clock time (ms)        median      min")
+    for phase in ["import", "build", "format", "process"]:
+        print("  {0:<24} {1:8.2f} {2:8.2f}".format(
+            phase, statistics.median(phase_runs[phase]) * 1000,
+            min(phase_runs[phase]) * 1000))
+
+    print("")
+    print("Import time by package, self (ms, median)")
+    packages = sorted(
+        package_runs.items(), key=lambda x: statistics.median(x[1]),
+        reverse=True)
+    for package, runs in packages[:options.modules]:
+        print("  {0:<24} {1:8.2f}".format(
+            package, statistics.median(runs) / 1000))
+
+    print("")
+    print("Slowest modules, cumulative (ms, median)")
+    modules = sorted(
+        import_runs.items(), key=lambda x: statistics.median(x[1]),
+        reverse=True)
+    for module, runs in modules[:options.modules]:
+        print("  {0:<40} {1:8.2f}".format(
+            module, statistics.median(runs) / 1000))
+
+
+if __name__ == "__main__":
+    main()
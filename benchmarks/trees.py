@@ -0,0 +1,80 @@
+"""Build representative item trees for the benchmarks.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from linotype import DefStyle, Formatter, Item
+
+
+def section_id(section: int) -> str:
+    """Get the item ID of a section in a tree built by build_tree()."""
+    return "section{0}".format(section)
+
+
+def option_id(section: int, option: int) -> str:
+    """Get the item ID of an option in a tree built by build_tree()."""
+    return "section{0}.option{1}".format(section, option)
+
+
+def build_tree(sections=10, options=20, nested=2) -> Item:
+    """Build a tree of items that resembles the help message of a large CLI.
+
+    Every section is a text item containing definitions with a mix of
+    definition styles, manual markup and arguments that are mentioned in the
+    message so that auto markup has work to do.
+
+    Args:
+        sections: The number of top-level sections.
+        options: The number of definitions in each section.
+        nested: The number of nested definitions under each definition.
+
+    Returns:
+        The root item of the tree.
+    """
+    root_item = Item(Formatter(auto_width=False))
+    root_item.add_text(
+        "Usage: tool [*global_options*] **command** [command_args]",
+        item_id="usage")
+
+    for section in range(sections):
+        section_item = root_item.add_text(
+            "Section {0} contains **commands** that operate on *files* and "
+            "other resources.".format(section),
+            item_id=section_id(section))
+
+        for option in range(options):
+            style = list(DefStyle)[option % len(DefStyle)]
+            option_item = section_item.add_def(
+                "--option-{0}".format(option), "[flags] path{0} count".format(
+                    option),
+                "Process path{0} count times. The *flags* change how "
+                "path{0} is handled, and **every** flag can be given more "
+                "than once.".format(option),
+                formatter=Formatter(auto_width=False, def_style=style),
+                item_id=option_id(section, option))
+
+            for child in range(nested):
+                option_item.add_def(
+                    "--sub-{0}".format(child), "value",
+                    "Set value for the sub-option.")
+
+    return root_item
+
+
+def count_items(root_item: Item) -> int:
+    """Count the items in a tree, not including the root item."""
+    return sum(1 for _ in root_item.get_items()) - 1
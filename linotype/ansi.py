@@ -17,8 +17,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with linotype.  If not, see <http://www.gnu.org/licenses/>.
 """
+import os
 import re
-from typing import Tuple, Union, Iterable
+from typing import Any, Tuple, Union, Iterable
 
 ANSI_COLORS = [
     "black", "red", "green", "yellow", "blue", "magenta", "cyan", "white"]
@@ -91,3 +92,22 @@ def ansi_format(
         start_codes.append(4)
 
     return "\x1b[{0}m".format(_ansi_join(*start_codes)), "\x1b[0m"
+
+
+def use_ansi(file: Any) -> bool:
+    """Check whether ANSI escape sequences should be written to a stream.
+
+    They shouldn't be if the stream isn't a terminal or if the NO_COLOR
+    environment variable is set to a non-empty value.
+
+    Args:
+        file: The stream that output is being written to.
+
+    Returns:
+        Whether to use ANSI escape sequences.
+    """
+    if os.environ.get("NO_COLOR"):
+        return False
+
+    isatty = getattr(file, "isatty", None)
+    return bool(isatty is not None and isatty())
@@ -0,0 +1,188 @@
+"""Export the definitions in a tree of items for shell completion.
+
+Shell completion runs a command every time the user presses Tab, so building
+the whole tree of items each time is too slow. Instead, the terms and
+arguments of every definition can be written to an index file ahead of time,
+and the completion script can load that file and look up terms by prefix
+without building any items or importing docutils.
+
+Definitions are grouped under the nearest ancestor that has an ID, so the
+options of a subcommand can be completed using the ID of the subcommand.
+Definitions without an ancestor that has an ID are grouped under ''.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+import bisect
+from typing import Dict, List, NamedTuple
+
+from linotype.items import DefinitionItem, Item
+
+# This is increased whenever the format of the index changes.
+COMPLETION_INDEX_VERSION = 1
+
+Completion = NamedTuple("Completion", [("term", str), ("args", str)])
+Completion.__doc__ = """A term that can be completed.
+
+Attributes:
+    term: The term of the definition.
+    args: The argument string of the definition.
+"""
+
+
+def build_completion_index(root_item: Item) -> Dict[str, List[List[str]]]:
+    """Get the terms and arguments of every definition in a tree.
+
+    Manual markup is removed from terms and arguments.
+
+    Args:
+        root_item: The item to export along with its descendants.
+
+    Returns:
+        A dict where keys are the IDs of items and values are lists of
+        [term, args] pairs sorted by term.
+    """
+    groups = {}
+    pending = [(child, "") for child in reversed(root_item.children)]
+    while pending:
+        item, group = pending.pop()
+        if isinstance(item, DefinitionItem):
+            term, args, message = item.content
+            if item.formatter.manual_markup:
+                term = item.parse_manual_markup(term)[0]
+                args = item.parse_manual_markup(args)[0]
+            groups.setdefault(group, []).append([term, args])
+
+        child_group = group if item.id is None else item.id
+        pending.extend(
+            (child, child_group) for child in reversed(item.children))
+
+    # Entries are sorted so that the loader can search them by prefix.
+    for entries in groups.values():
+        entries.sort()
+
+    return groups
+
+
+def write_completion_index(root_item: Item, path: str) -> None:
+    """Write the completion index for a tree to a file.
+
+    The first line of the file is a JSON object containing the version of the
+    format. Every other line contains the ID of a group as a JSON string, a
+    tab and the entries in the group as a JSON array. JSON strings can't
+    contain tabs or newlines, so the loader can find a group without parsing
+    the rest of the file.
+
+    Args:
+        root_item: The item to export along with its descendants.
+        path: The path of the file to write.
+    """
+    groups = build_completion_index(root_item)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(json.dumps({"version": COMPLETION_INDEX_VERSION}) + "\n")
+        for group, entries in sorted(groups.items()):
+            file.write("{0}\t{1}\n".format(
+                json.dumps(group), json.dumps(entries, separators=(",", ":"))))
+
+
+class CompletionIndex:
+    """Look up the terms in a completion index by prefix.
+
+    Args:
+        text: The contents of a file written by write_completion_index().
+
+    Raises:
+        ValueError: The index was invalid or was written by an incompatible
+            version.
+
+    Attributes:
+        _text: The contents of the index file.
+        _groups: A dict where keys are item IDs and values are sorted lists of
+            [term, args] pairs, which are parsed when first needed.
+        _terms: A dict where keys are item IDs and values are sorted lists of
+            the terms in each group.
+    """
+    def __init__(self, text: str) -> None:
+        header, separator, groups = text.partition("\n")
+        if json.loads(header).get("version") != COMPLETION_INDEX_VERSION:
+            raise ValueError("unsupported completion index version")
+
+        # This makes every group start after a newline.
+        self._text = "\n" + groups
+        self._groups = {}
+        self._terms = {}
+
+    @classmethod
+    def load(cls, path: str) -> "CompletionIndex":
+        """Load an index written by write_completion_index().
+
+        Args:
+            path: The path of the index file.
+
+        Raises:
+            ValueError: The index was invalid or was written by an
+                incompatible version.
+        """
+        with open(path, encoding="utf-8") as file:
+            return cls(file.read())
+
+    def _get_group(self, group: str) -> List[List[str]]:
+        """Parse the entries in a group.
+
+        Returns:
+            A list of [term, args] pairs, which is empty if the group doesn't
+            exist.
+        """
+        entries = self._groups.get(group)
+        if entries is None:
+            marker = "\n{0}\t".format(json.dumps(group))
+            start = self._text.find(marker)
+            if start < 0:
+                entries = []
+            else:
+                start += len(marker)
+                end = self._text.find("\n", start)
+                entries = json.loads(
+                    self._text[start:end if end >= 0 else None])
+            self._groups[group] = entries
+            self._terms[group] = [entry[0] for entry in entries]
+
+        return entries
+
+    def complete(self, prefix: str, group="") -> List[Completion]:
+        """Get the definitions whose terms start with a prefix.
+
+        Only the group being completed is parsed from the index.
+
+        Args:
+            prefix: The text to complete.
+            group: The ID of the item to complete the definitions of, or ''
+                for definitions that aren't under an item with an ID.
+
+        Returns:
+            A list of Completion objects sorted by term.
+        """
+        entries = self._get_group(group)
+        terms = self._terms[group]
+
+        start = bisect.bisect_left(terms, prefix)
+        end = start
+        while end < len(terms) and terms[end].startswith(prefix):
+            end += 1
+
+        return [Completion(term, args) for term, args in entries[start:end]]
@@ -18,16 +18,25 @@ You should have received a copy of the GNU General Public License
 along with linotype.  If not, see <http://www.gnu.org/licenses/>.
 """
 import os
-import re
+import ast
+import time
+import weakref
+import hashlib
+import sysconfig
 import importlib
+import importlib.util
+import contextlib
 import collections
-from typing import List, Tuple, NamedTuple, Optional, Dict, Set
+from typing import (
+    Any, List, Tuple, NamedTuple, Optional, Dict, Set, Generator)
 
 from docutils import nodes
 from docutils.parsers.rst import Directive
 from docutils.parsers.rst.directives import unchanged, flag
+from sphinx.util import logging
 
-from linotype.items import Item, TextItem, DefinitionItem, MarkupPositions
+from linotype.items import (
+    Item, TextItem, DefinitionItem, MarkupPositions, iter_markup)
 
 
 # These keep track of content that was used to extend items through the
@@ -41,6 +50,274 @@ CONTENT_CLASSIFIERS = {"@after", "@before", "@replace"}
 MARKUP_CLASSIFIERS = {"@auto", "@rst"}
 ALL_CLASSIFIERS = CONTENT_CLASSIFIERS | MARKUP_CLASSIFIERS
 
+MARKUP_NODES = {"strong": nodes.strong, "em": nodes.emphasis}
+
+# These are the phases that running the directive is split into for timing.
+DIRECTIVE_PHASES = ["import", "build", "convert", "extend"]
+
+logger = logging.getLogger(__name__)
+
+# Trees of items are cached so that directives that use the same function
+# don't build the same tree again. Trees are keyed by tuples containing the
+# type of source ('module' or 'filepath'), the module name or file path and the
+# function name. The stamp and digest of the source file are used to tell if
+# the tree is out of date, and the dependencies are the files that documents
+# using the tree depend on. Cached trees must never be modified.
+CachedTree = NamedTuple(
+    "CachedTree",
+    [("stamp", Optional[Tuple[int, int]]), ("digest", Optional[str]),
+     ("item", Item), ("dependencies", List[str])])
+
+# Each cache belongs to a Sphinx build environment, or to a document when the
+# directive is run without Sphinx, so that builder functions are called again
+# for each build in long-running processes. Keys are the environment or
+# document and values are dicts of cached trees.
+_tree_cache = weakref.WeakKeyDictionary()
+
+# These are the digests of the modules that trees were last built from, which
+# are used to tell if a module needs to be reloaded. Keys are module names.
+_module_digests = {}
+
+# The nodes generated by each directive are cached in the Sphinx build
+# environment so that they can be reused in later builds. Keys are hashes of
+# everything the nodes are generated from. This should be incremented
+# whenever the nodes generated for the same input change.
+NODE_CACHE_VERSION = 1
+
+
+def _get_stamp(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Get the modification time and size of a file.
+
+    Returns:
+        A tuple containing the modification time in nanoseconds and the size
+        of the file, or 'None' if the file doesn't exist.
+    """
+    if path is None:
+        return None
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _get_digest(path: Optional[str]) -> Optional[str]:
+    """Get a hash of the contents of a file.
+
+    Returns:
+        The hex digest of the file, or 'None' if the file doesn't exist.
+    """
+    if path is None:
+        return None
+
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _get_imported_names(
+        tree: ast.AST, package: Optional[str]) -> Generator[str, None, None]:
+    """Get the names of modules that may be imported by Python code.
+
+    Args:
+        tree: The abstract syntax tree of the code.
+        package: The name of the package the code belongs to. This is used
+            to resolve relative imports, which are skipped if it is 'None.'
+
+    Yields:
+        The absolute names of modules. For 'from' imports, the name of each
+        imported object is also yielded in case it is a submodule.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                if not package:
+                    continue
+                base_name = importlib.util.resolve_name(
+                    "." * node.level + (node.module or ""), package)
+            else:
+                base_name = node.module
+
+            yield base_name
+            for alias in node.names:
+                if alias.name != "*":
+                    yield "{0}.{1}".format(base_name, alias.name)
+
+
+def _find_imported_files(path: str, package: Optional[str]) -> List[str]:
+    """Find the source files of modules imported by a Python file.
+
+    Imports are followed recursively. Modules in the standard library or in
+    site-packages are skipped since they don't change between builds.
+
+    Args:
+        path: The path of the Python file.
+        package: The name of the package the file belongs to.
+
+    Returns:
+        A sorted list of absolute file paths, not including the given file.
+    """
+    library_paths = tuple(
+        os.path.abspath(library_path)
+        for name, library_path in sysconfig.get_paths().items()
+        if name in {"stdlib", "platstdlib", "purelib", "platlib"})
+
+    found_paths = set()
+    pending = [(path, package)]
+    while pending:
+        current_path, current_package = pending.pop()
+        try:
+            with open(current_path, "rb") as file:
+                tree = ast.parse(file.read(), current_path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+
+        for module_name in _get_imported_names(tree, current_package):
+            try:
+                spec = importlib.util.find_spec(module_name)
+            except (ImportError, ValueError, AttributeError):
+                continue
+
+            if spec is None or not spec.has_location or not spec.origin:
+                continue
+
+            origin = os.path.abspath(spec.origin)
+            if (origin == path or origin in found_paths
+                    or not origin.endswith(".py")
+                    or origin.startswith(library_paths)):
+                continue
+
+            found_paths.add(origin)
+            pending.append((origin, spec.parent))
+
+    return sorted(found_paths)
+
+
+DirectiveTiming = NamedTuple(
+    "DirectiveTiming",
+    [("docname", str), ("lineno", int), ("total", float),
+     ("phases", Dict[str, float]), ("tree_cache_hit", bool),
+     ("node_cache_hit", bool)])
+DirectiveTiming.__doc__ = """The time spent running a single directive.
+
+Attributes:
+    docname: The name of the document containing the directive.
+    lineno: The line number of the directive.
+    total: The total number of seconds spent running the directive.
+    phases: A dict where keys are the names of phases and values are the
+        number of seconds spent in that phase. The phases are 'import' for
+        importing the module or executing the file, 'build' for calling the
+        function that builds the tree, 'convert' for converting items to
+        nodes and 'extend' for parsing the content of the directive.
+    tree_cache_hit: The tree was already built by another directive.
+    node_cache_hit: The nodes were reused from a previous build.
+"""
+
+
+def _clear_timings(app, env, docnames: List[str]) -> None:
+    """Forget the timings from the last build before reading documents.
+
+    Timings are stored in the 'linotype_timings' attribute of the build
+    environment so that they are merged after parallel reads. It is a dict
+    where keys are document names and values are lists of DirectiveTiming
+    objects.
+    """
+    env.linotype_timings = {}
+
+
+def _merge_timings(app, env, docnames: List[str], other) -> None:
+    """Merge the timings from a parallel reading process."""
+    other_timings = getattr(other, "linotype_timings", {})
+    for docname in docnames:
+        if docname in other_timings:
+            env.linotype_timings[docname] = other_timings[docname]
+
+
+def _report_timings(app, exception: Optional[Exception]) -> None:
+    """Log the slowest directives and cache statistics after a build."""
+    slowest = app.config.linotype_report_slowest
+    all_timings = getattr(app.env, "linotype_timings", None)
+    if exception is not None or not slowest or not all_timings:
+        return
+
+    timings = [
+        timing for doc_timings in all_timings.values()
+        for timing in doc_timings]
+    tree_hits = sum(timing.tree_cache_hit for timing in timings)
+    node_hits = sum(timing.node_cache_hit for timing in timings)
+
+    logger.info(
+        "linotype: {0} directives in {1:.3f}s; tree cache: {2} hits, {3} "
+        "misses; node cache: {4} hits, {5} misses".format(
+            len(timings), sum(timing.total for timing in timings),
+            tree_hits, len(timings) - tree_hits, node_hits,
+            len(timings) - node_hits))
+
+    logger.info("slowest linotype directives:")
+    for timing in sorted(timings, key=lambda x: x.total, reverse=True)[
+            :slowest]:
+        logger.info("  {0:10.3f} ms  {1}:{2} ({3})".format(
+            timing.total * 1000, app.env.doc2path(timing.docname),
+            timing.lineno, ", ".join(
+                "{0} {1:.3f} ms".format(phase, timing.phases[phase] * 1000)
+                for phase in DIRECTIVE_PHASES)))
+
+
+def _init_node_cache(env) -> None:
+    """Add the node cache to a Sphinx build environment if it's missing.
+
+    The environment is pickled between builds, so the cache persists as long
+    as the environment does. The 'linotype_nodes' attribute is a dict where
+    keys are cache keys and values are lists of nodes. The
+    'linotype_node_keys' attribute is a dict where keys are document names
+    and values are sets of the cache keys used by each document.
+    """
+    if not hasattr(env, "linotype_nodes"):
+        env.linotype_nodes = {}
+        env.linotype_node_keys = {}
+
+
+def _purge_node_cache(app, env, docname: str) -> None:
+    """Forget the cache keys used by a document before it is read again."""
+    _init_node_cache(env)
+    env.linotype_node_keys.pop(docname, None)
+
+
+def _merge_node_cache(app, env, docnames: List[str], other) -> None:
+    """Merge the node cache from a parallel reading process."""
+    _init_node_cache(env)
+    _init_node_cache(other)
+    for docname in docnames:
+        keys = other.linotype_node_keys.get(docname)
+        if not keys:
+            continue
+        env.linotype_node_keys[docname] = keys
+        for key in keys:
+            env.linotype_nodes[key] = other.linotype_nodes[key]
+
+
+def _prune_node_cache(app, env) -> List[str]:
+    """Remove cached nodes that are no longer used by any document.
+
+    Returns:
+        An empty list, since no extra documents need to be written.
+    """
+    _init_node_cache(env)
+    used_keys = set()
+    for keys in env.linotype_node_keys.values():
+        used_keys |= keys
+    for key in set(env.linotype_nodes) - used_keys:
+        del env.linotype_nodes[key]
+
+    return []
+
 
 def _parse_definition_list(
         def_list_node: nodes.definition_list) -> ExtraContentDict:
@@ -184,80 +461,19 @@ def _apply_markup(text: str, positions: MarkupPositions) -> List[nodes.Node]:
     Returns:
         A list of Node objects.
     """
-    # Get the start and end positions of each substring that should have
-    # markup applied. These are referred to as "spans." Create a list
-    # of tuples where each tuple has the format:
-    # ((start, end), markup_type).
-    markup_spans = []
-    for markup_type in ["strong", "em"]:
-        # Get the positions of each substring in the string.
-        for substring, instance in getattr(positions, markup_type):
-            match = list(re.finditer(re.escape(substring), text))[instance]
-            markup_spans.append((match.span(), markup_type))
-
-    # Order the spans by their start position.
-    markup_spans.sort(key=lambda x: x[0][0])
-
-    def parse_top_level(markup_spans, parent_span):
-        """Parse nested spans to create Node objects.
-
-        This function works from the outside in, parsing one level of
-        nested spans at a time.
-
-        Args:
-            markup_spans: A list of spans in the form:
-                ((start, end), markup_type).
-            parent_span: The span containing the current list of spans in
-                the form: (start, end).
-
-        Returns:
-            A list of docutils Node objects.
-        """
-        # Get a list of top-level spans, including spans without any
-        # markup.
-        prev_end = parent_span[0]
-        top_level_spans = []
-        for (start, end), markup_type in markup_spans:
-            if start < prev_end:
-                # This span is nested inside another span.
-                continue
-
-            top_level_spans.append(((prev_end, start), None))
-            top_level_spans.append(((start, end), markup_type))
-
-            prev_end = end
-        top_level_spans.append(((prev_end, parent_span[1]), None))
-
-        # Create nodes from those spans.
-        top_level_nodes = []
-        for (start, end), markup_type in top_level_spans:
-            if markup_type is None:
-                top_level_nodes.append(nodes.Text(text[start:end]))
-            elif markup_type == "strong":
-                top_level_nodes.append(nodes.strong())
-            elif markup_type == "em":
-                top_level_nodes.append(nodes.emphasis())
-
-        # Iterate over nested spans and add those nodes to their parent
-        # nodes.
-        for i, ((start, end), markup_type) in enumerate(top_level_spans):
-            if markup_type is None:
-                continue
-
-            nested_spans = []
-            for (nested_start, nested_end), nested_type in markup_spans:
-                if (nested_start in range(start, end)
-                        and nested_end in range(start, end + 1)
-                        and (nested_start, nested_end) != (start, end)):
-                    nested_spans.append(
-                        ((nested_start, nested_end), nested_type))
-
-            top_level_nodes[i] += parse_top_level(
-                nested_spans, (start, end))
-
-        return top_level_nodes
+    root_node = nodes.section()
+    parent_nodes = [root_node]
+    for event, value in iter_markup(text, positions):
+        if event == "text":
+            parent_nodes[-1] += nodes.Text(value)
+        elif event == "start":
+            new_node = MARKUP_NODES[value]()
+            parent_nodes[-1] += new_node
+            parent_nodes.append(new_node)
+        else:
+            parent_nodes.pop()
 
-    return parse_top_level(markup_spans, (0, len(text)))
+    return root_node.children
 
 
 class LinotypeDirective(Directive):
@@ -274,48 +490,177 @@ class LinotypeDirective(Directive):
         "no_auto_markup": flag,
         "no_manual_markup": flag}
 
-    def _retrieve_item(self) -> Item:
+    def _retrieve_tree(self) -> CachedTree:
         """Get the Item object from the given module or filepath.
 
+        The tree is only built once for each function in each Sphinx build, or
+        in each document when the directive isn't run by Sphinx, unless the
+        file it is defined in changes. The returned tree is shared with other
+        directives and must not be modified.
+
         Returns:
             The output of the specified function from the specified module or
-            file.
+            file along with the files that it depends on.
         """
         if "module" in self.options and "function" in self.options:
-            # Import from given module.
             module_name = self.options["module"]
-            function_name = self.options["function"]
+            with self._time_phase("import"):
+                module = self._import_module(module_name)
+            key = ("module", module_name, self.options["function"])
+            path = getattr(module, "__file__", None)
+            package = getattr(module, "__package__", None)
+        elif "filepath" in self.options and "function" in self.options:
+            path = os.path.abspath(self.options["filepath"])
+            key = ("filepath", path, self.options["function"])
+            package = None
+        else:
+            raise self.error(
+                "both :function: and either :module: or :filepath: must be "
+                "specified.")
 
-            try:
-                given_module = importlib.import_module(module_name)
-            except ImportError:
-                raise self.error(
-                    "failed to import module '{0}'".format(module_name))
+        env = self._get_env()
+        scope = env if env is not None else self.state.document
+        tree_cache = _tree_cache.get(scope)
+        if tree_cache is None:
+            tree_cache = _tree_cache[scope] = {}
+
+        # Check the modification time first since it's cheaper than hashing
+        # the file, and only rebuild the tree if the contents changed.
+        stamp = _get_stamp(path)
+        cached_tree = tree_cache.get(key)
+        if cached_tree is not None:
+            if cached_tree.stamp == stamp:
+                self._tree_cache_hit = True
+                return cached_tree
+
+            digest = _get_digest(path)
+            if digest == cached_tree.digest:
+                cached_tree = cached_tree._replace(stamp=stamp)
+                tree_cache[key] = cached_tree
+                self._tree_cache_hit = True
+                return cached_tree
+        else:
+            digest = _get_digest(path)
+
+        with self._time_phase("import"):
+            if key[0] == "module":
+                # The module is out of date if it changed since a tree was
+                # last built from it, even in an earlier build.
+                reload = _module_digests.get(key[1], digest) != digest
+                _module_digests[key[1]] = digest
+                func = self._get_function(vars(self._import_module(
+                    key[1], reload=reload)))
+            else:
+                func = self._get_function(self._exec_file(path))
 
-            if not hasattr(given_module, function_name):
-                raise self.error("module '{0}' has no attribute '{1}'".format(
-                    module_name, function_name))
+        dependencies = []
+        if path is not None and os.path.isfile(path):
+            dependencies.append(path)
+            if env is not None and env.config.linotype_track_imports:
+                dependencies += _find_imported_files(path, package)
 
-            func = getattr(given_module, function_name)
+        with self._time_phase("build"):
+            root_item = func()
 
-        elif "filepath" in self.options and "function" in self.options:
-            # Import from given file.
-            filepath = self.options["filepath"]
-            function_name = self.options["function"]
-            local_dict = {}
+        cached_tree = CachedTree(stamp, digest, root_item, dependencies)
+        tree_cache[key] = cached_tree
 
-            file = open(os.path.abspath(filepath))
-            code = compile(file.read(), filepath, "exec")
-            exec(code, local_dict)
+        return cached_tree
 
-            func = local_dict[function_name]
+    @contextlib.contextmanager
+    def _time_phase(self, phase: str):
+        """Add the time spent inside this context to a phase.
 
-        else:
+        Args:
+            phase: The name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phase_times[phase] += time.perf_counter() - start
+
+    def _get_env(self):
+        """Get the Sphinx build environment.
+
+        Returns:
+            The BuildEnvironment object, or 'None' if the directive is not
+            being run by Sphinx.
+        """
+        return getattr(self.state.document.settings, "env", None)
+
+    def _import_module(self, module_name: str, reload=False) -> Any:
+        """Import a module given in the directive options.
+
+        Args:
+            module_name: The name of the module to import.
+            reload: Reload the module if it has already been imported.
+
+        Returns:
+            The module object.
+        """
+        try:
+            module = importlib.import_module(module_name)
+            if reload:
+                module = importlib.reload(module)
+        except ImportError:
             raise self.error(
-                "both :function: and either :module: or :filepath: must be "
-                "specified.")
+                "failed to import module '{0}'".format(module_name))
+
+        return module
+
+    def _exec_file(self, filepath: str) -> Dict[str, Any]:
+        """Execute a file given in the directive options.
+
+        Returns:
+            The global namespace of the file.
+        """
+        local_dict = {}
+        with open(filepath) as file:
+            code = compile(file.read(), self.options["filepath"], "exec")
+        exec(code, local_dict)
+
+        return local_dict
+
+    def _get_function(self, namespace: Dict[str, Any]):
+        """Get the function given in the directive options from a namespace.
+
+        Returns:
+            The function which returns an Item object.
+        """
+        function_name = self.options["function"]
+        if function_name not in namespace:
+            source = self.options.get("module", self.options.get("filepath"))
+            raise self.error("module '{0}' has no attribute '{1}'".format(
+                source, function_name))
+
+        return namespace[function_name]
+
+    def _get_node_key(self, root_item: Item, include_root: bool) -> str:
+        """Get the key for the nodes generated by this directive.
+
+        Args:
+            root_item: The item which the nodes are generated from.
+            include_root: The root item is included in the output.
+
+        Returns:
+            A hash of the content of the item and its descendants and the
+            directive options.
+        """
+        key_hash = hashlib.sha256()
+        key_hash.update(repr((
+            NODE_CACHE_VERSION, include_root,
+            sorted(self.options.items()))).encode())
+
+        pending = [(root_item, 0)]
+        while pending:
+            item, depth = pending.pop()
+            key_hash.update(repr((
+                type(item).__name__, depth, item.id, item.content)).encode())
+            pending.extend(
+                (child, depth + 1) for child in reversed(item.children))
 
-        return func()
+        return key_hash.hexdigest()
 
     def _parse_item(
             self, item: Item, extra_content: Optional[List[ExtraContent]]
@@ -392,8 +737,8 @@ class LinotypeDirective(Directive):
         return root_node.children
 
     def _parse_tree(
-            self, root_item: Item, extra_content: ExtraContentDict
-            ) -> List[nodes.Node]:
+            self, root_item: Item, extra_content: ExtraContentDict,
+            include_root=True) -> List[nodes.Node]:
         """Convert a tree of Item objects to a tree of Node objects.
         
         Docutils definitions are used for indentation.
@@ -403,109 +748,174 @@ class LinotypeDirective(Directive):
                 Node objects.
             extra_content: Extra content from the directive body that is to be
                 added to the node tree.
+            include_root: Include the root item in the output. This is ignored
+                if the root item is the root of the item tree.
 
         Returns:
             The list of Node objects that make up the root of the tree.
         """
         root_node = nodes.section()
-        parent_node = root_node
-        previous_level = root_item.current_level
-
-        if type(root_item) is not Item:
-            if root_item.parent:
-                # The root item is to be included in the output.
-                new_nodes = self._parse_item(
-                    root_item, extra_content[root_item.id])
-                if isinstance(root_item, DefinitionItem):
-                    definition_list = nodes.definition_list()
-                    definition_list += new_nodes
-                    root_node += definition_list
-                else:
-                    root_node += new_nodes
-            else:
-                # The root item is not to be included in the output.
-                previous_level += 1
 
-        # This keeps track of the current indentation level by maintaining a
-        # queue with the current parent node on the right and all of its
-        # ancestors up the tree moving to the left.
-        ancestor_nodes = collections.deque()
-        
-        for item in root_item.get_items():
-            if item is root_item:
-                continue
-                
-            if item.current_level > previous_level:
-                # The indentation level increased.
-                ancestor_nodes.append(parent_node)
-
-                if not isinstance(parent_node[-1], nodes.definition_list):
-                    # Create a new empty definition to act as a starting
-                    # point for new nodes. 
-                    parent_node.append(nodes.definition_list(
-                        "", nodes.definition_list_item(
-                            "", nodes.term(), nodes.definition())))
-
-                if parent_node.children:
-                    # Set the parent node equal to the last definition in 
-                    # the last definition_list_item in the last 
-                    # definition_list belonging to the current parent node. 
-                    definition_list = _get_matching_child(
-                        parent_node, nodes.definition_list)
-                    definition_list_item = _get_matching_child(
-                        definition_list, nodes.definition_list_item)
-                    definition = _get_matching_child(
-                        definition_list_item, nodes.definition)
-                    parent_node = definition
-            elif item.current_level < previous_level:
-                # The indentation level decreased.
-                for i in range(previous_level - item.current_level):
-                    new_parent = ancestor_nodes.pop()
-                parent_node = new_parent
+        if type(root_item) is not Item and include_root:
+            # The root item is to be included in the output.
+            self._parse_children([root_item], root_node, extra_content)
+        else:
+            self._parse_children(
+                root_item.children, root_node, extra_content)
+
+        return root_node.children
+
+    def _parse_children(
+            self, items: List[Item], parent_node: nodes.Element,
+            extra_content: ExtraContentDict) -> None:
+        """Convert sibling items and their descendants to Node objects.
+
+        The current insertion points are passed down the tree so that no
+        nodes need to be searched for.
 
+        Args:
+            items: The sibling items to convert.
+            parent_node: The node to add the new nodes to.
+            extra_content: Extra content from the directive body that is to be
+                added to the node tree.
+        """
+        # Consecutive definitions are added to the same definition_list.
+        definition_list = None
+        for item in items:
             new_nodes = self._parse_item(item, extra_content[item.id])
             if isinstance(item, DefinitionItem):
-                # Wrap definitions in a definition_list.
-                if not parent_node.children or not isinstance(
-                        parent_node[-1], nodes.definition_list):
-                    parent_node.append(nodes.definition_list())
-                parent_node[-1] += new_nodes
+                if definition_list is None:
+                    definition_list = nodes.definition_list()
+                    parent_node += definition_list
+                definition_list += new_nodes
+
+                # Children are added to the definition of the
+                # definition_list_item.
+                child_parent_node = new_nodes[-1][-1]
             else:
                 parent_node += new_nodes
-                
-            previous_level = item.current_level
+                definition_list = None
+                child_parent_node = None
 
-        return root_node.children
+            if not item.children:
+                continue
+
+            if child_parent_node is None:
+                # Create a new empty definition to act as a starting point
+                # for new nodes.
+                child_parent_node = nodes.definition()
+                definition_list = nodes.definition_list(
+                    "", nodes.definition_list_item(
+                        "", nodes.term(), child_parent_node))
+                parent_node += definition_list
+
+            self._parse_children(
+                item.children, child_parent_node, extra_content)
 
     def run(self) -> List[nodes.Node]:
-        """Run the directive.
+        """Run the directive and record the time spent on it.
 
         Returns:
             A list of Node objects.
         """
-        root_item = self._retrieve_item()
+        self._phase_times = dict.fromkeys(DIRECTIVE_PHASES, 0.0)
+        self._tree_cache_hit = False
+        self._node_cache_hit = False
 
-        if "item_id" in self.options:
-            root_item = root_item.get_item_by_id(
-                self.options["item_id"], raising=True)
+        start = time.perf_counter()
+        new_nodes = self._run()
+        end = time.perf_counter()
+
+        env = self._get_env()
+        if env is not None and hasattr(env, "linotype_timings"):
+            env.linotype_timings.setdefault(env.docname, []).append(
+                DirectiveTiming(
+                    env.docname, self.lineno, end - start, self._phase_times,
+                    self._tree_cache_hit, self._node_cache_hit))
+
+        return new_nodes
+
+    def _run(self) -> List[nodes.Node]:
+        """Convert the items to nodes.
+
+        Returns:
+            A list of Node objects.
+        """
+        cached_tree = self._retrieve_tree()
+        root_item = cached_tree.item
 
-        if "children" in self.options:
-            root_item.parent = None
+        # Rebuild this document when the function that builds the tree
+        # changes.
+        env = self._get_env()
+        if env is not None:
+            for path in cached_tree.dependencies:
+                env.note_dependency(path)
+
+        if "item_id" in self.options:
+            try:
+                root_item = root_item.get_item_by_id(
+                    self.options["item_id"], raising=True)
+            except ValueError as e:
+                raise self.error(str(e))
+
+        include_root = "children" not in self.options
+        node_key = None
+
+        # Parsing the directive content can have side effects on the document
+        # and the build environment, like registering targets or recording
+        # the files that it includes, so only directives without content are
+        # cached.
+        if env is not None and not self.content:
+            _init_node_cache(env)
+            with self._time_phase("convert"):
+                node_key = self._get_node_key(root_item, include_root)
+                cached_nodes = env.linotype_nodes.get(node_key)
+                if cached_nodes is not None:
+                    env.linotype_node_keys.setdefault(
+                        env.docname, set()).add(node_key)
+                    self._node_cache_hit = True
+                    return [node.deepcopy() for node in cached_nodes]
 
         # Parse directive and get content to extend items with.
-        nested_nodes = nodes.paragraph()
-        self.state.nested_parse(
-            self.content, self.content_offset, nested_nodes)
-        def_list = _get_matching_child(
-            nested_nodes, nodes.definition_list, last=False)
-        if def_list is not None:
-            definitions = _parse_definition_list(def_list)
-        else:
-            definitions = collections.defaultdict(lambda: None)
+        with self._time_phase("extend"):
+            nested_nodes = nodes.paragraph()
+            self.state.nested_parse(
+                self.content, self.content_offset, nested_nodes)
+            def_list = _get_matching_child(
+                nested_nodes, nodes.definition_list, last=False)
+            if def_list is not None:
+                definitions = _parse_definition_list(def_list)
+            else:
+                definitions = collections.defaultdict(lambda: None)
 
-        return self._parse_tree(root_item, definitions)
+        with self._time_phase("convert"):
+            new_nodes = self._parse_tree(
+                root_item, definitions, include_root=include_root)
 
+        if node_key is not None:
+            env.linotype_nodes[node_key] = [
+                node.deepcopy() for node in new_nodes]
+            env.linotype_node_keys.setdefault(
+                env.docname, set()).add(node_key)
 
-def setup(app) -> None:
-    """Add directives to Sphinx."""
+        return new_nodes
+
+
+def setup(app) -> Dict[str, Any]:
+    """Add directives to Sphinx.
+
+    The extension is safe for parallel reading and writing. Each process
+    builds its own cache of item trees, and the nodes cached in the build
+    environment are merged after parallel reads.
+    """
     app.add_directive("linotype", LinotypeDirective)
+    app.add_config_value("linotype_track_imports", False, "env")
+    app.add_config_value("linotype_report_slowest", 0, "")
+    app.connect("env-purge-doc", _purge_node_cache)
+    app.connect("env-merge-info", _merge_node_cache)
+    app.connect("env-updated", _prune_node_cache)
+    app.connect("env-before-read-docs", _clear_timings)
+    app.connect("env-merge-info", _merge_timings)
+    app.connect("build-finished", _report_timings)
+
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
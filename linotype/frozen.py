@@ -0,0 +1,341 @@
+"""Compile a tree of items into a flat, immutable form for rendering.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import copy
+import types
+import collections
+from typing import Generator, Tuple
+
+from linotype.items import (
+    DefStyle, DefinitionItem, Formatter, Item, _get_width, _render_layout)
+from linotype.suggest import Suggester, format_suggestions
+
+# These are the kinds of items in a frozen tree.
+KIND_ROOT = 0
+KIND_TEXT = 1
+KIND_DEFINITION = 2
+
+FORMATTER_FIELDS = list(vars(Formatter()))
+
+FrozenFormatter = collections.namedtuple("FrozenFormatter", FORMATTER_FIELDS)
+FrozenFormatter.__doc__ = """An immutable copy of a Formatter's attributes.
+
+This has the same attributes as Formatter.
+"""
+
+
+class FrozenTree:
+    """A tree of items compiled into flat arrays.
+
+    Items are stored in preorder, so the descendants of each item directly
+    follow it. Every array is a tuple with one element for each item. Frozen
+    trees can't be modified, so they can be formatted from multiple threads
+    at once.
+
+    Args:
+        root_item: The item to compile along with its descendants.
+        overrides: A dict of Formatter attributes to override in every item.
+            The items themselves are left unchanged.
+        levels: The number of levels of nested items to compile. 'None'
+            means that there is no limit.
+
+    Raises:
+        ValueError: The overrides contained an unknown Formatter attribute.
+
+    Attributes:
+        parents: The index of the parent of each item, or -1 for the first
+            item.
+        depths: The number of levels below the first item that each item is.
+        kinds: The kind of each item, which is KIND_ROOT for the root of an
+            item tree, KIND_TEXT for text items and KIND_DEFINITION for
+            definition items.
+        contents: The content of each item.
+        ids: The ID of each item, or 'None' if it doesn't have one.
+        formatter_indices: The index in 'formatters' of the Formatter
+            settings of each item.
+        formatters: The distinct Formatter settings in the tree as
+            FrozenFormatter instances.
+        subtree_sizes: The number of items in the subtree starting at each
+            item, including the item itself.
+        indents: The number of spaces that each item is indented.
+        aligned_buffers: The number of spaces to leave before the message of
+            each definition that has the ALIGNED style.
+        layouts: The parts of each item which don't depend on the width, as
+            Layout objects, or 'None' for items that aren't printed.
+        plain_layouts: The same as 'layouts' without the strings which apply
+            markup.
+        id_indices: A read-only mapping of item IDs to indices.
+        _id_suggester: A Suggester object containing every item ID.
+    """
+    def __init__(self, root_item: Item, overrides=None, levels=None) -> None:
+        unknown_keys = set(overrides or {}) - set(FORMATTER_FIELDS)
+        if unknown_keys:
+            raise ValueError("unknown formatter attributes: {0}".format(
+                ", ".join(sorted(unknown_keys))))
+
+        # Items which share a Formatter keep sharing a copy of it.
+        override_formatters = {}
+
+        def get_formatter(item):
+            if not overrides:
+                return item.formatter
+            formatter = override_formatters.get(id(item.formatter))
+            if formatter is None:
+                formatter = copy.copy(item.formatter)
+                for key, value in overrides.items():
+                    setattr(formatter, key, value)
+                override_formatters[id(item.formatter)] = formatter
+            return formatter
+
+        parents = []
+        depths = []
+        kinds = []
+        contents = []
+        ids = []
+        formatter_indices = []
+        indents = []
+        formatters = []
+        formatter_table = {}
+        items = []
+        item_formatters = []
+
+        pending = [(root_item, -1, 0, 0)]
+        while pending:
+            item, parent, depth, indent = pending.pop()
+            index = len(parents)
+            items.append(item)
+            parents.append(parent)
+            depths.append(depth)
+            ids.append(item.id)
+            indents.append(indent)
+
+            if not item.parent:
+                kinds.append(KIND_ROOT)
+                contents.append(None)
+            elif isinstance(item, DefinitionItem):
+                kinds.append(KIND_DEFINITION)
+                contents.append(tuple(item.content))
+            else:
+                kinds.append(KIND_TEXT)
+                contents.append(item.content)
+
+            formatter = get_formatter(item)
+            item_formatters.append(formatter)
+            settings = FrozenFormatter(*(
+                getattr(formatter, field) for field in FORMATTER_FIELDS))
+            if settings not in formatter_table:
+                formatter_table[settings] = len(formatters)
+                formatters.append(settings)
+            formatter_indices.append(formatter_table[settings])
+
+            if levels is not None and depth >= levels:
+                continue
+
+            # Children are indented relative to their parent unless the
+            # parent is the root of the item tree. Like with Item.format(),
+            # this uses the indentation that the item was added with.
+            child_indent = indent
+            if item.parent:
+                child_indent += item.formatter.indent_spaces
+            pending.extend(
+                (child, index, depth + 1, child_indent)
+                for child in reversed(item.children))
+
+        # Children always come after their parents, so working backwards
+        # counts every descendant before adding the subtree to its parent.
+        subtree_sizes = [1] * len(parents)
+        for index in range(len(parents) - 1, 0, -1):
+            subtree_sizes[parents[index]] += subtree_sizes[index]
+
+        self.parents = tuple(parents)
+        self.depths = tuple(depths)
+        self.kinds = tuple(kinds)
+        self.contents = tuple(contents)
+        self.ids = tuple(ids)
+        self.formatter_indices = tuple(formatter_indices)
+        self.formatters = tuple(formatters)
+        self.subtree_sizes = tuple(subtree_sizes)
+        self.indents = tuple(indents)
+
+        # The first item is aligned with its siblings even though they aren't
+        # part of the frozen tree.
+        root_longest = -1
+        if root_item.parent:
+            root_longest = max((
+                len(" ".join([string for string in item.content[:2]
+                              if string]))
+                for item in root_item.parent.children
+                if isinstance(item, DefinitionItem)
+                and get_formatter(item).def_style is DefStyle.ALIGNED),
+                default=-1)
+        self.aligned_buffers = self._compute_aligned_buffers(root_longest)
+
+        # Markup is parsed and signatures are built once here, so formatting
+        # only has to wrap and indent text. Plain layouts are built first so
+        # that the cache of each item is left with the parts with markup.
+        layouts = []
+        plain_layouts = []
+        for index, item in enumerate(items):
+            formatter = item_formatters[index]
+            if kinds[index] == KIND_ROOT or not formatter.visible:
+                layouts.append(None)
+                plain_layouts.append(None)
+                continue
+
+            # The item's own Formatter is passed as 'None' so that the parts
+            # are cached.
+            if formatter is item.formatter:
+                formatter = None
+            plain_layouts.append(item._get_layout(
+                item.content, self.aligned_buffers[index], plain=True,
+                formatter=formatter))
+            layouts.append(item._get_layout(
+                item.content, self.aligned_buffers[index],
+                formatter=formatter))
+
+        self.layouts = tuple(layouts)
+        self.plain_layouts = tuple(plain_layouts)
+        self.id_indices = types.MappingProxyType({
+            item_id: index for index, item_id in enumerate(ids)
+            if item_id is not None})
+        self._id_suggester = Suggester(self.id_indices)
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def _compute_aligned_buffers(self, root_longest=-1) -> Tuple[int, ...]:
+        """Get the buffer before the message of each definition.
+
+        This is the length of the longest signature of any sibling
+        definitions with the ALIGNED style plus the definition gap, or the
+        indentation increment if there are none.
+
+        Args:
+            root_longest: The length of the longest signature of the siblings
+                of the first item, or -1 if there are none.
+        """
+        longest = collections.defaultdict(lambda: -1)
+        longest[-1] = root_longest
+        for index, kind in enumerate(self.kinds):
+            formatter = self.formatters[self.formatter_indices[index]]
+            if (kind == KIND_DEFINITION
+                    and formatter.def_style is DefStyle.ALIGNED):
+                term, args, message = self.contents[index]
+                longest[self.parents[index]] = max(
+                    longest[self.parents[index]],
+                    len(" ".join([string for string in (term, args)
+                                  if string])))
+
+        aligned_buffers = []
+        for index, parent in enumerate(self.parents):
+            formatter = self.formatters[self.formatter_indices[index]]
+            if longest[parent] < 0:
+                aligned_buffers.append(formatter.indent_spaces)
+            else:
+                aligned_buffers.append(longest[parent] + formatter.def_gap)
+
+        return tuple(aligned_buffers)
+
+    def get_index(self, item_id: str) -> int:
+        """Get the index of an item by its ID.
+
+        Raises:
+            ValueError: An item with the given ID doesn't exist.
+        """
+        try:
+            return self.id_indices[item_id]
+        except KeyError:
+            raise ValueError(
+                "an item with the ID '{0}' does not exist{1}".format(
+                    item_id, format_suggestions(
+                        self._id_suggester.suggest(item_id))))
+
+    def iter_indices(
+            self, levels=None, item_id=None) -> Generator[int, None, None]:
+        """Yield the index of each item in a subtree in preorder.
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+                'None' means that there is no limit.
+            item_id: The ID of the root of the subtree. If 'None,' this
+                defaults to the first item.
+
+        Raises:
+            ValueError: An item with the given ID doesn't exist.
+
+        Yields:
+            The index of each item.
+        """
+        start = 0 if item_id is None else self.get_index(item_id)
+        end = start + self.subtree_sizes[start]
+        max_depth = None if levels is None else self.depths[start] + levels
+
+        index = start
+        while index < end:
+            yield index
+            if max_depth is not None and self.depths[index] >= max_depth:
+                # Skip the descendants of this item.
+                index += self.subtree_sizes[index]
+            else:
+                index += 1
+
+    def format(
+            self, levels=None, item_id=None, plain=False, width=None) -> str:
+        """Format the tree in the same way as Item.format().
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+            item_id: The ID of the root item. If 'None,' this defaults to the
+                first item.
+            plain: Leave out the strings which apply markup.
+            width: The number of columns to wrap text to. If 'None,' this
+                depends on the Formatter settings of each item.
+
+        Raises:
+            ValueError: An item with the given ID doesn't exist.
+
+        Returns:
+            The text output as a single string.
+        """
+        start = 0 if item_id is None else self.get_index(item_id)
+        dedent_amount = self.indents[start]
+        layouts = self.plain_layouts if plain else self.layouts
+
+        # The width only depends on the Formatter settings, so it is only
+        # computed once for each of them.
+        widths = {}
+        help_messages = []
+        for index in self.iter_indices(levels=levels, item_id=item_id):
+            layout = layouts[index]
+            if layout is None:
+                continue
+
+            formatter_index = self.formatter_indices[index]
+            formatter = self.formatters[formatter_index]
+            item_width = width
+            if item_width is None:
+                item_width = widths.get(formatter_index)
+            if item_width is None:
+                item_width = widths[formatter_index] = _get_width(formatter)
+
+            help_messages.append(_render_layout(
+                layout, formatter, item_width,
+                self.indents[index] - dedent_amount))
+
+        return "\n".join(help_messages)
@@ -0,0 +1,166 @@
+"""Render a tree of items as HTML without using docutils.
+
+Text items are rendered as paragraphs and definition items as definition
+lists. The children of a definition are nested inside its description, and
+the children of a text item are nested inside a 'div' element which can be
+indented with CSS.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import html
+from typing import Generator, List, Optional
+
+from linotype.items import Item, DefinitionItem, MarkupPositions, iter_markup
+
+MARKUP_TAGS = {"strong": ("<strong>", "</strong>"), "em": ("<em>", "</em>")}
+
+ROOT_CLASS = "linotype"
+INDENT_CLASS = "linotype-indent"
+
+
+def _apply_markup(text: str, positions: MarkupPositions) -> str:
+    """Escape text and add HTML tags for markup.
+
+    Args:
+        text: The text to apply markup to.
+        positions: The positions of substrings to apply markup to.
+
+    Returns:
+        The text as HTML.
+    """
+    chunks = []
+    for event, value in iter_markup(text, positions):
+        if event == "text":
+            chunks.append(html.escape(value, quote=False))
+        elif event == "start":
+            chunks.append(MARKUP_TAGS[value][0])
+        else:
+            chunks.append(MARKUP_TAGS[value][1])
+
+    return "".join(chunks)
+
+
+def _iter_items(
+        items: List[Item], levels: Optional[int], depth: int
+        ) -> Generator[str, None, None]:
+    """Recursively yield HTML for sibling items and their descendants.
+
+    Args:
+        items: The sibling items to render.
+        levels: The number of levels of nested items to descend into.
+            'None' means that there is no limit.
+        depth: The number of levels below the item being rendered that the
+            items are at.
+
+    Yields:
+        Chunks of HTML.
+    """
+    # Consecutive definitions are rendered in the same list.
+    in_list = False
+    for item in items:
+        visible = item.formatter.visible
+        is_definition = visible and isinstance(item, DefinitionItem)
+        if is_definition and not in_list:
+            yield "<dl>\n"
+            in_list = True
+        elif not is_definition and in_list:
+            yield "</dl>\n"
+            in_list = False
+
+        if levels is None or depth < levels:
+            children = item.children
+        else:
+            children = []
+
+        if is_definition:
+            ((term, term_positions), (args, args_positions),
+             (message, message_positions)) = item._parse_content(
+                 item.content)
+            signature = _apply_markup(term, term_positions)
+            if args:
+                signature += " " + _apply_markup(args, args_positions)
+            yield "<dt>{0}</dt>\n<dd>".format(signature)
+            if message:
+                yield "<p>{0}</p>\n".format(
+                    _apply_markup(message, message_positions))
+            yield from _iter_items(children, levels, depth + 1)
+            yield "</dd>\n"
+        else:
+            if visible:
+                text, positions = item._parse_content(item.content)[0]
+                yield "<p>{0}</p>\n".format(_apply_markup(text, positions))
+            if children:
+                yield '<div class="{0}">\n'.format(INDENT_CLASS)
+                yield from _iter_items(children, levels, depth + 1)
+                yield "</div>\n"
+
+    if in_list:
+        yield "</dl>\n"
+
+
+def iter_html(
+        root_item: Item, levels=None, item_id=None
+        ) -> Generator[str, None, None]:
+    """Render a tree of items as HTML one piece at a time.
+
+    The output is produced as the tree is traversed, so it can be streamed
+    without building the whole document first.
+
+    Args:
+        root_item: The root of the item tree.
+        levels: The number of levels of nested items to descend into.
+            'None' means that there is no limit.
+        item_id: The ID of the item to render. If 'None,' this defaults to
+            the root item.
+
+    Raises:
+        ValueError: An item with the given ID doesn't exist.
+
+    Yields:
+        Chunks of HTML which make up a single 'div' element.
+    """
+    if item_id is None:
+        target_item = root_item
+    else:
+        target_item = root_item.get_item_by_id(item_id, raising=True)
+
+    yield '<div class="{0}">\n'.format(ROOT_CLASS)
+    if target_item.parent:
+        yield from _iter_items([target_item], levels, 0)
+    elif levels is None or levels > 0:
+        yield from _iter_items(target_item.children, levels, 1)
+    yield "</div>\n"
+
+
+def render_html(root_item: Item, levels=None, item_id=None) -> str:
+    """Render a tree of items as HTML.
+
+    Args:
+        root_item: The root of the item tree.
+        levels: The number of levels of nested items to descend into.
+            'None' means that there is no limit.
+        item_id: The ID of the item to render. If 'None,' this defaults to
+            the root item.
+
+    Raises:
+        ValueError: An item with the given ID doesn't exist.
+
+    Returns:
+        The HTML as a single string.
+    """
+    return "".join(iter_html(root_item, levels=levels, item_id=item_id))
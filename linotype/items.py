@@ -18,6 +18,7 @@ You should have received a copy of the GNU General Public License
 along with linotype.  If not, see <http://www.gnu.org/licenses/>.
 """
 import re
+import sys
 import enum
 import copy
 import shutil
@@ -26,13 +27,12 @@ import functools
 import contextlib
 import collections
 from typing import (
-    Any, Tuple, Generator, Optional, NamedTuple, List, Callable)
+    Any, Dict, Tuple, Generator, Optional, NamedTuple, List, Callable)
 
-from docutils.frontend import OptionParser
-from docutils.parsers.rst import Parser
-from docutils.parsers.rst.states import Inliner
-
-from linotype.ansi import ansi_format
+from linotype.ansi import ansi_format, use_ansi
+from linotype.suggest import Suggester, format_suggestions
+from linotype.trie import IdTrie
+from linotype.timing import counters, current_recorder, stage
 
 try:
     import colorama
@@ -42,6 +42,7 @@ else:
     colorama.init()
 
 ARG_REGEX = re.compile(r"([\w-]+)")
+REGEX_CACHE_SIZE = 4096
 MARKUP_CHARS = collections.namedtuple(
     "MARKUP_CHARS", ["strong", "em"])("**", "*")
 
@@ -62,6 +63,204 @@ class MarkupPositions(MarkupPositionsBase):
             self.em + other.em)
 
 
+PreparedText = NamedTuple(
+    "PreparedText", [("text", str), ("positions", MarkupPositions)])
+PreparedText.__doc__ = """A part of an item which is ready to be wrapped.
+
+This doesn't depend on the width of the output, so it can be reused to wrap
+the same text to different widths.
+
+Attributes:
+    text: The text with any manual markup removed.
+    positions: The positions of the substrings that should have markup
+        applied.
+"""
+
+FormattedLine = NamedTuple(
+    "FormattedLine",
+    [("text", str), ("item_id", Optional[str]), ("level", int)])
+FormattedLine.__doc__ = """A line of the text output.
+
+Attributes:
+    text: The text of the line, without a trailing newline.
+    item_id: The ID of the item that the line belongs to, or 'None' if it
+        doesn't have one.
+    level: The indentation level of the item in the output.
+"""
+
+# These are the ways that the message of an item can be laid out.
+LAYOUT_TEXT = 0
+LAYOUT_SAMELINE = 1
+LAYOUT_NEWLINE = 2
+
+Layout = NamedTuple(
+    "Layout",
+    [("kind", int), ("signature", str), ("message", PreparedText),
+     ("message_indent", int), ("subsequent_indent", int)])
+Layout.__doc__ = """The parts of a formatted item which don't depend on width.
+
+Attributes:
+    kind: LAYOUT_TEXT for text items, LAYOUT_SAMELINE for definitions whose
+        message starts on the same line as the signature and LAYOUT_NEWLINE
+        for definitions whose message starts on the next line.
+    signature: The term and argument string of a definition with markup
+        applied, or an empty string for text items.
+    message: The text to wrap.
+    message_indent: The number of spaces before the first line of the
+        message. For LAYOUT_SAMELINE, this includes the signature.
+    subsequent_indent: The number of spaces before every other line of the
+        message.
+"""
+
+_regex_cache = {}
+_inliner_patterns = None
+
+
+def _cached_regex(pattern: str):
+    """Compile a regular expression or get it from the cache.
+
+    The same patterns are compiled for the same terms and arguments every time
+    a tree is formatted, so they are cached for the life of the process.
+
+    Args:
+        pattern: The regular expression to compile.
+
+    Returns:
+        The compiled regular expression.
+    """
+    try:
+        regex = _regex_cache[pattern]
+    except KeyError:
+        if len(_regex_cache) >= REGEX_CACHE_SIZE:
+            _regex_cache.clear()
+        regex = _regex_cache[pattern] = re.compile(pattern)
+        counters.regex_compiles += 1
+    else:
+        counters.cache_hits += 1
+
+    return regex
+
+
+def _get_inliner_patterns():
+    """Get the patterns that docutils uses to parse inline markup.
+
+    Creating these is expensive, so they are only created once. Docutils is
+    imported here so that importing this module stays cheap for programs that
+    never parse markup, like shell completion scripts.
+    """
+    global _inliner_patterns
+    if _inliner_patterns is None:
+        from docutils.frontend import OptionParser
+        from docutils.parsers.rst import Parser
+        from docutils.parsers.rst.states import Inliner
+
+        inliner = Inliner()
+        default_settings = OptionParser(
+            components=(Parser,)).get_default_values()
+        inliner.init_customizations(default_settings)
+        _inliner_patterns = inliner.patterns
+    else:
+        counters.cache_hits += 1
+
+    return _inliner_patterns
+
+
+class _InstanceCounter:
+    """Find which instance of a substring in a string is at a given span.
+
+    The instances of each substring are only searched for once, so looking up
+    the instances of many substrings takes linear time.
+
+    Args:
+        text: The string to search for substrings in.
+
+    Attributes:
+        text: The string to search for substrings in.
+        _instances: A dict where keys are substrings and values are dicts
+            mapping the span of each instance of that substring to its index.
+    """
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._instances = {}
+
+    def get(self, substring: str, span: Tuple[int, int]) -> Optional[int]:
+        """Get the instance of a substring at the given span.
+
+        Returns:
+            The index of the instance of the substring, or 'None' if no
+            instance is at that span.
+        """
+        if substring not in self._instances:
+            regex = _cached_regex(re.escape(substring))
+            self._instances[substring] = {
+                match.span(): instance for instance, match in enumerate(
+                    regex.finditer(self.text))}
+
+        return self._instances[substring].get(span)
+
+
+def iter_markup(text: str, positions: MarkupPositions
+                ) -> Generator[Tuple[str, str], None, None]:
+    """Split text into plain text and the start and end of nested markup.
+
+    Each marked-up substring is only searched for once, and the spans of
+    markup are sorted once and nested using a stack, so this takes linear
+    time in the length of the text and the number of spans. Spans which
+    overlap an enclosing span without being contained by it and spans which
+    are the same as an enclosing span are skipped.
+
+    Args:
+        text: The text that the markup applies to.
+        positions: The positions of substrings to apply markup to.
+
+    Yields:
+        Tuples of the form (event, value). The event is 'text' for plain
+        text, where the value is the text, or 'start' or 'end' for the start
+        or end of markup, where the value is 'strong' or 'em'. Text between
+        markup is always yielded, even if it is empty.
+    """
+    matches = {}
+    markup_spans = []
+    for markup_type in ["strong", "em"]:
+        for substring, instance in getattr(positions, markup_type):
+            if substring not in matches:
+                matches[substring] = [
+                    match.span() for match in _cached_regex(
+                        re.escape(substring)).finditer(text)]
+            start, end = matches[substring][instance]
+            markup_spans.append((start, end, markup_type))
+
+    # Enclosing spans come before the spans nested inside them.
+    markup_spans.sort(key=lambda x: (x[0], -x[1]))
+
+    # This is a stack of the spans that are open.
+    open_spans = [(0, len(text), None)]
+    position = 0
+    for start, end, markup_type in markup_spans:
+        while open_spans[-1][1] <= start and len(open_spans) > 1:
+            _, close_end, close_type = open_spans.pop()
+            yield "text", text[position:close_end]
+            yield "end", close_type
+            position = close_end
+
+        if end > open_spans[-1][1] or (
+                len(open_spans) > 1 and (start, end) == open_spans[-1][:2]):
+            continue
+
+        yield "text", text[position:start]
+        yield "start", markup_type
+        open_spans.append((start, end, markup_type))
+        position = start
+
+    while len(open_spans) > 1:
+        _, close_end, close_type = open_spans.pop()
+        yield "text", text[position:close_end]
+        yield "end", close_type
+        position = close_end
+
+    yield "text", text[position:]
+
+
 class DefStyle(enum.Enum):
     """Styles for definition items.
 
@@ -126,6 +325,139 @@ class Formatter:
         self.em = em
 
 
+def _get_width(formatter: Formatter) -> int:
+    """Get the number of columns to wrap text to.
+
+    This is either the width of the terminal window or the maximum width set
+    in the Formatter instance, whichever is smaller.
+    """
+    if formatter.auto_width:
+        return min(formatter.max_width, shutil.get_terminal_size().columns)
+    else:
+        return formatter.max_width
+
+
+def _render_layout(
+        layout: Layout, formatter: Formatter, width: int, indent: int) -> str:
+    """Wrap an item to a width and add markup and indentation.
+
+    Args:
+        layout: The parts of the item which don't depend on the width.
+        formatter: The Formatter containing the strings which apply markup.
+        width: The number of columns to wrap text to.
+        indent: The number of spaces to indent the item by.
+
+    Returns:
+        The formatted item as a string.
+    """
+    message = layout.message
+    if layout.kind == LAYOUT_NEWLINE and not message.text:
+        with stage("indent"):
+            return textwrap.indent(layout.signature, " "*indent)
+
+    with stage("wrap"):
+        if layout.kind == LAYOUT_TEXT:
+            wrapper = textwrap.TextWrapper(width=width)
+            output_message = wrapper.fill(message.text)
+        elif layout.kind == LAYOUT_SAMELINE:
+            # The signature is replaced with spaces while wrapping so that
+            # markup strings don't affect the wrapping and tab stops are the
+            # same as in the output.
+            wrapper = textwrap.TextWrapper(
+                width=width - indent,
+                subsequent_indent=" "*layout.subsequent_indent)
+            output_message = wrapper.fill(
+                " "*layout.message_indent + message.text)
+        else:
+            wrapper = textwrap.TextWrapper(
+                width=width - indent,
+                initial_indent=" "*layout.message_indent,
+                subsequent_indent=" "*layout.subsequent_indent)
+            output_message = wrapper.fill(message.text)
+
+    if message.positions.strong or message.positions.em:
+        with stage("markup"):
+            output_message = _apply_markup(
+                output_message, message.positions, formatter)
+
+    if layout.kind == LAYOUT_SAMELINE:
+        output_message = (
+            layout.signature + output_message[layout.message_indent:])
+    elif layout.kind == LAYOUT_NEWLINE:
+        output_message = "\n".join([layout.signature, output_message])
+
+    with stage("indent"):
+        return textwrap.indent(output_message, " "*indent)
+
+
+def _apply_markup(
+        text: str, positions: MarkupPositions, formatter: Formatter) -> str:
+    """Apply ANSI escape sequences to text at certain positions.
+
+    Args:
+        text: The text to apply the markup to.
+        positions: The positions of substrings to apply markup to.
+        formatter: The Formatter containing the strings which apply markup.
+
+    Returns:
+        The original text with ANSI escape sequences added.
+    """
+    markup_spans = []
+    substring_matches = {}
+    for markup_type in ["strong", "em"]:
+        for substring, instance in getattr(positions, markup_type):
+            if substring not in substring_matches:
+                # Match any number of whitespace and newline characters
+                # between each word in the substring since line breaks
+                # can only happen between words. It is necessary to strip
+                # out spaces because sometimes spaces are replaced with
+                # newlines in the formatted text, which is a problem when
+                # the text isn't indented.
+                words = re.split(r"(\w+)", substring)
+                substring_regex = _cached_regex("[\n\\s]*".join(
+                    re.escape(word) for word in words if word.strip()))
+                substring_matches[substring] = list(
+                    substring_regex.finditer(text))
+            match = substring_matches[substring][instance]
+            markup_spans.append((match.span(), markup_type))
+
+    markup_spans.sort(key=lambda x: x[0][1], reverse=True)
+    markup_spans.sort(key=lambda x: x[0][0])
+
+    # Get the positions of ANSI escape sequences in the text. Keep track of
+    # which sequences are still "open" so that the ends of other sequences
+    # don't close them. This allows for nested markup.
+    markup_sequences = []
+    open_sequences = []
+    for (start, end), markup_type in markup_spans:
+        start_sequence, end_sequence = getattr(formatter, markup_type)
+
+        open_sequences = [
+            (position, sequence) for position, sequence in open_sequences
+            if position > start]
+
+        markup_sequences.append((start, start_sequence))
+        markup_sequences.append((end, end_sequence))
+        markup_sequences += [
+            (end, sequence) for position, sequence in open_sequences]
+
+        open_sequences.append((end, start_sequence))
+
+    markup_sequences.sort(key=lambda x: x[0])
+
+    # Get a list of strings that will make up the output. This is the
+    # ordered ANSI escape sequences with the appropriate text between them.
+    prev_position = 0
+    text_sequences = []
+    for position, sequence in markup_sequences:
+        text_sequences.append(text[prev_position:position])
+        text_sequences.append(sequence)
+        prev_position = position
+    text_sequences.append(text[prev_position:])
+
+    return "".join(text_sequences)
+
+
 class Item:
     """An item to be displayed in the output.
 
@@ -153,15 +485,56 @@ class Item:
         _format_func: The function used for formatting the text output.
         _current_indent: The number of spaces that the item is currently
             indented.
+        _ids: A dict of all items in the item tree that have an ID, which is
+            shared by every item in the tree.
+        _aligned_buffer_cache: The length of the longest signature of the
+            children of this item with the ALIGNED style, which is computed
+            once each time the tree is formatted.
+        _prepared_cache: A tuple containing the content and markup settings
+            that the parts of the item were last prepared with and the list
+            of PreparedText objects, or 'None' if they haven't been prepared.
+        _pending_children: A function which adds the children of this item
+            the first time they are accessed, or 'None' if they have already
+            been added.
+        _lazy_ids: A dict where keys are the IDs of items which haven't been
+            added yet and values are the indices of the children to follow
+            from the root item to get to them. This is shared by every item
+            in the tree.
+        _id_suggester: A Suggester object containing the IDs of every item
+            in the tree, including items which haven't been added yet. This
+            is shared by every item in the tree.
+        _id_trie: An IdTrie object containing the IDs of every item in the
+            tree, including items which haven't been added yet. This is
+            shared by every item in the tree.
+        _observers: A list of functions which are called with each new item
+            when it is added to the tree. This is shared by every item in the
+            tree.
         children: A list of all Item objects belonging to this item.
     """
     def __init__(self, formatter=Formatter()) -> None:
+        self._init_item(formatter)
+        self._ids = {}
+        self._lazy_ids = {}
+        self._id_suggester = Suggester()
+        self._id_trie = IdTrie()
+        self._observers = []
+
+    def _init_item(self, formatter: Formatter) -> None:
+        """Set the attributes which aren't shared with the rest of the tree.
+
+        Child items call this instead of __init__() so that the attributes
+        which are shared by every item in the tree are only created once for
+        the root item.
+        """
         self.content = None
         self.formatter = formatter
-        self.id = None
         self.parent = None
-        self.children = []
+        self._children = []
+        self._pending_children = None
         self._current_indent = 0
+        self._id = None
+        self._aligned_buffer_cache = None
+        self._prepared_cache = None
 
     def __repr__(self) -> str:
         if self.children:
@@ -177,6 +550,77 @@ class Item:
         """Get the function for formatting the text output."""
         return lambda: None
 
+    def _format(self, content: Any, plain=False) -> str:
+        """Format the content of the item for the text output.
+
+        Args:
+            content: The content of the item.
+            plain: Leave out the strings which apply markup.
+
+        Returns:
+            The formatted item as a string.
+        """
+        layout = self._get_layout(content, plain=plain)
+        return _render_layout(
+            layout, self.formatter, self._width, self._current_indent)
+
+    def _get_layout(
+            self, content: Any, aligned_buffer=None, plain=False,
+            formatter=None) -> Layout:
+        """Get the parts of the formatted item which don't depend on the width.
+
+        The root of a tree only contains other items, so its layout is empty.
+        Subclasses override this to lay out their content.
+
+        Args:
+            content: The content of the item.
+            aligned_buffer: The number of spaces to leave before the message
+                of ALIGNED and OVERFLOW definitions. If 'None,' this is
+                computed from the siblings of the item.
+            plain: Leave out the strings which apply markup.
+            formatter: The Formatter to use instead of the item's own.
+
+        Returns:
+            The Layout of the item.
+        """
+        return Layout(
+            LAYOUT_TEXT, "", PreparedText("", MarkupPositions([], [])), 0, 0)
+
+    @property
+    def children(self) -> List["Item"]:
+        """A list of all Item objects belonging to this item."""
+        if self._pending_children is not None:
+            # Children which are added lazily are added before any others.
+            add_children = self._pending_children
+            self._pending_children = None
+            add_children(self)
+
+        return self._children
+
+    @children.setter
+    def children(self, children: List["Item"]) -> None:
+        self._pending_children = None
+        self._children = children
+
+    @property
+    def id(self) -> Optional[str]:
+        """The item ID."""
+        return self._id
+
+    @id.setter
+    def id(self, item_id: Optional[str]) -> None:
+        # Keep the dict of item IDs up to date so that items can be looked up
+        # without searching the whole tree.
+        if self._id is not None and self._ids.get(self._id) is self:
+            del self._ids[self._id]
+            self._id_suggester.discard(self._id)
+            self._id_trie.discard(self._id)
+        self._id = item_id
+        if item_id is not None:
+            self._ids[item_id] = self
+            self._id_suggester.add(item_id)
+            self._id_trie.add(item_id)
+
     @property
     def current_level(self) -> int:
         """The current indentation level."""
@@ -267,41 +711,323 @@ class Item:
             new_item = item_type(content, self, formatter, item_id)
             self.children.append(new_item)
 
+        # Observers can remove themselves from the list while it's iterated.
+        for observer in tuple(self._observers):
+            observer(new_item)
+
         return new_item
 
     # Message formatting methods
     # ==========================
 
-    def format(self, levels=None, item_id=None) -> str:
+    def format(self, levels=None, item_id=None, plain=False) -> str:
         """Print a tree of items.
 
         Args:
             levels: The number of levels of nested items to descend into.
             item_id: The ID of the root item. If 'None,' this defaults to the
                 current item.
+            plain: Leave out the strings which apply markup. Manual markup
+                characters are still removed. This is faster than formatting
+                with markup and removing it afterwards.
 
         Returns:
             The text output as a single string.
         """
+        if item_id is None:
+            target_item = self
+        else:
+            target_item = self.get_item_by_id(item_id, raising=True)
+
+        return "\n".join(target_item._format_subtree(levels, plain=plain))
+
+    def print(
+            self, levels=None, item_id=None, file=None, plain=None) -> None:
+        """Write a tree of items to a stream.
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+            item_id: The ID of the root item. If 'None,' this defaults to the
+                current item.
+            file: The stream to write to. If 'None,' this defaults to
+                sys.stdout.
+            plain: Leave out the strings which apply markup. If 'None,' markup
+                is left out when the stream isn't a terminal or the NO_COLOR
+                environment variable is set.
+        """
+        if file is None:
+            file = sys.stdout
+        if plain is None:
+            plain = not use_ansi(file)
+
+        file.write(self.format(levels=levels, item_id=item_id, plain=plain))
+        file.write("\n")
+
+    def format_matching(self, pattern: str, levels=None, plain=False) -> str:
+        """Print every item whose ID matches a pattern.
+
+        Each matching item is printed along with its descendants, in the order
+        that they appear in the tree. Items which are descendants of another
+        matching item are only printed once.
+
+        Args:
+            pattern: The pattern to match item IDs against. See
+                get_items_matching() for the syntax.
+            levels: The number of levels of nested items to descend into
+                below each matching item.
+            plain: Leave out the strings which apply markup.
+
+        Returns:
+            The text output as a single string.
+        """
+        help_messages = []
+        printed_item = None
+        for item in self.get_items_matching(pattern):
+            ancestor = item.parent
+            while ancestor is not None and ancestor is not printed_item:
+                ancestor = ancestor.parent
+            if printed_item is not None and ancestor is printed_item:
+                continue
+
+            printed_item = item
+            help_messages.extend(item._format_subtree(levels, plain=plain))
+
+        return "\n".join(help_messages)
+
+    def format_many(
+            self, widths: List[int], profiles=None, levels=None, item_id=None
+            ) -> Dict[Tuple[int, str], str]:
+        """Print a tree of items at several widths and with several styles.
+
+        The tree is frozen once for each distinct set of Formatter overrides,
+        so markup is only parsed and signatures are only built once no matter
+        how many widths there are. The items in the tree aren't changed.
+
+        Args:
+            widths: The numbers of columns to wrap text to.
+            profiles: A dict where keys are names and values are dicts of
+                Formatter attributes to override in every item. The special
+                key 'plain' leaves out the strings which apply markup, like
+                {"color": {}, "plain": {"plain": True}}. If 'None,' the output
+                is only printed with the existing Formatter of each item under
+                the name 'default'.
+            levels: The number of levels of nested items to descend into.
+            item_id: The ID of the root item. If 'None,' this defaults to the
+                current item.
+
+        Raises:
+            ValueError: A profile contained an unknown Formatter attribute or
+                an item with the given ID doesn't exist.
+
+        Returns:
+            A dict where keys are tuples containing a width and the name of a
+            profile and values are the text output as a single string.
+        """
+        # This is imported here because the frozen module depends on this one.
+        from linotype.frozen import FrozenTree
+
+        if profiles is None:
+            profiles = {"default": {}}
+
+        if item_id is None:
+            target_item = self
+        else:
+            target_item = self.get_item_by_id(item_id, raising=True)
+
+        # Frozen trees contain both plain and styled output, so profiles
+        # which only differ by 'plain' share one.
+        frozen_trees = []
+        output = {}
+        for name, overrides in profiles.items():
+            overrides = dict(overrides)
+            plain = overrides.pop("plain", False)
+            for frozen_overrides, frozen_tree in frozen_trees:
+                if frozen_overrides == overrides:
+                    break
+            else:
+                frozen_tree = FrozenTree(
+                    target_item, overrides=overrides, levels=levels)
+                frozen_trees.append((overrides, frozen_tree))
+
+            for width in widths:
+                output[(width, name)] = frozen_tree.format(
+                    plain=plain, width=width)
+
+        return output
+
+    def _format_subtree(self, levels=None, plain=False) -> List[str]:
+        """Format this item and its descendants.
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+            plain: Leave out the strings which apply markup.
+
+        Returns:
+            A list of the formatted text of each item.
+        """
+        return [
+            help_message for item, level, help_message
+            in self._iter_formatted(levels=levels, plain=plain)
+            if help_message is not None]
+
+    def _iter_formatted(
+            self, levels=None, plain=False
+            ) -> Generator[Tuple["Item", int, Optional[str]], None, None]:
+        """Format this item and its descendants one at a time.
+
+        Items are only visited when the next one is needed, so the rest of
+        the tree is skipped if the caller stops early.
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+            plain: Leave out the strings which apply markup.
+
+        Yields:
+            A tuple containing each item except the root of the tree, its
+            indentation level in the output and its formatted text, which is
+            'None' if the item isn't printed.
+        """
+        if self.parent:
+            self.parent._aligned_buffer_cache = None
+
         # Dedent the output so that it's flush with the left edge.
+        dedent_amount = self._current_indent
+        for item in self.get_items(levels=levels):
+            # Parents are always formatted before their children, so this
+            # resets the cached buffer before any of the children use it.
+            item._aligned_buffer_cache = None
+            if not item.parent:
+                continue
+
+            # The indentation is only changed while the item is formatted so
+            # that formatting doesn't change the tree and children which are
+            # added lazily are indented relative to their parent.
+            original_indent = item._current_indent
+            item._current_indent -= dedent_amount
+            try:
+                level = item.current_level
+                help_message = item._format_item(plain=plain)
+            finally:
+                item._current_indent = original_indent
+
+            yield item, level, help_message
+
+    def iter_lines(
+            self, levels=None, item_id=None, plain=False, start_line=0,
+            max_lines=None) -> Generator["FormattedLine", None, None]:
+        """Print a tree of items one line at a time.
+
+        Items are formatted as their lines are needed, so items after the
+        last line are never formatted. Items before the first line still
+        have to be formatted to know how many lines they take up.
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+            item_id: The ID of the root item. If 'None,' this defaults to the
+                current item.
+            plain: Leave out the strings which apply markup.
+            start_line: The index of the first line to yield.
+            max_lines: The maximum number of lines to yield. 'None' means that
+                there is no limit.
+
+        Raises:
+            ValueError: An item with the given ID doesn't exist.
+
+        Yields:
+            A FormattedLine object for each line of the output.
+        """
         if item_id is None:
             target_item = self
         else:
-            target_item = self.get_item_by_id(item_id)
+            target_item = self.get_item_by_id(item_id, raising=True)
 
-        if not target_item:
+        if max_lines is not None and max_lines <= 0:
+            return
+
+        line_number = 0
+        lines_yielded = 0
+        for item, level, help_message in target_item._iter_formatted(
+                levels=levels, plain=plain):
+            if help_message is None:
+                continue
+            for line in help_message.split("\n"):
+                if line_number >= start_line:
+                    yield FormattedLine(line, item.id, level)
+                    lines_yielded += 1
+                    if max_lines is not None and lines_yielded >= max_lines:
+                        return
+                line_number += 1
+
+    async def format_async(
+            self, levels=None, item_id=None, plain=False, batch_size=50
+            ) -> str:
+        """Print a tree of items without blocking the event loop.
+
+        This is a coroutine which gives control back to the event loop after
+        every few items, so other tasks can run while a large tree is
+        formatted. The output is the same as format(). If the task is
+        cancelled, it stops at the next batch and raises CancelledError.
+
+        The tree must not be modified while it is being formatted.
+
+        Args:
+            levels: The number of levels of nested items to descend into.
+            item_id: The ID of the root item. If 'None,' this defaults to the
+                current item.
+            plain: Leave out the strings which apply markup.
+            batch_size: The number of items to visit before giving control
+                back to the event loop. Items which aren't printed are
+                counted too.
+
+        Raises:
+            ValueError: An item with the given ID doesn't exist or the batch
+                size is less than one.
+
+        Returns:
+            The text output as a single string.
+        """
+        # This is imported here so that programs which don't use it don't
+        # have to import asyncio.
+        import asyncio
+
+        if batch_size < 1:
             raise ValueError(
-                "an item with the ID '{0}' does not exist".format(item_id))
+                "the batch size must be at least 1, not {0}".format(
+                    batch_size))
+
+        if item_id is None:
+            target_item = self
+        else:
+            target_item = self.get_item_by_id(item_id, raising=True)
 
-        dedent_amount = target_item._current_indent
         help_messages = []
-        for item in self.get_items(levels=levels, item_id=item_id):
-            item._current_indent -= dedent_amount
-            if item.parent:
-                help_messages.append(item._format_item())
+        formatted_items = target_item._iter_formatted(
+            levels=levels, plain=plain)
+        try:
+            for items_visited, (item, level, help_message) in enumerate(
+                    formatted_items, start=1):
+                if help_message is not None:
+                    help_messages.append(help_message)
+                if items_visited % batch_size == 0:
+                    await asyncio.sleep(0)
+        finally:
+            formatted_items.close()
+
+        return "\n".join(help_messages)
+
+    def freeze(self):
+        """Compile this item and its descendants into a FrozenTree.
+
+        The frozen tree is a copy which formats the same way as this item but
+        can't be modified. It is faster to format and can be shared between
+        threads.
 
-        return "\n".join([
-            message for message in help_messages if message is not None])
+        Returns:
+            A linotype.frozen.FrozenTree object.
+        """
+        # This is imported here because the frozen module depends on this one.
+        from linotype.frozen import FrozenTree
+        return FrozenTree(self)
 
     def get_items(
             self, levels=None, item_id=None
@@ -324,14 +1050,25 @@ class Item:
 
         yield from self._depth_search(target_item, levels=levels)
 
-    def _format_item(self) -> str:
+    def _format_item(self, plain=False) -> str:
         """Format the items belonging to this item.
 
+        Args:
+            plain: Leave out the strings which apply markup.
+
         Returns:
             The formatted text output as a string.
         """
         if self.parent and self.formatter.visible:
-            help_message = self._format_func(self.content)
+            counters.items_rendered += 1
+            format_func = self._format_func
+            if plain:
+                format_func = functools.partial(format_func, plain=True)
+            recorder = current_recorder()
+            if recorder is None:
+                help_message = format_func(self.content)
+            else:
+                help_message = recorder.record_item(self, format_func)
         else:
             help_message = None
 
@@ -381,13 +1118,70 @@ class Item:
         else:
             root = self
 
-        for item in self._depth_search(root):
-            if item.id is not None and item.id == item_id:
+        # Items are looked up in the dict of IDs for the whole tree, so check
+        # that the item is a descendant of the item being searched.
+        item = self._ids.get(item_id)
+        if item is None and item_id in self._lazy_ids:
+            # Add the item and its ancestors by following the path to it.
+            lazy_item = self._get_root_item()
+            for index in self._lazy_ids[item_id]:
+                lazy_item = lazy_item.children[index]
+            item = self._ids.get(item_id)
+        ancestor = item
+        while ancestor is not None:
+            if ancestor is root:
                 return item
+            ancestor = ancestor.parent
 
         if raising:
             raise ValueError(
-                "an item with the ID '{0}' does not exist".format(item_id))
+                "an item with the ID '{0}' does not exist{1}".format(
+                    item_id, format_suggestions(
+                        self._id_suggester.suggest(item_id))))
+
+    def get_items_matching(self, pattern: str) -> List["Item"]:
+        """Get the items whose IDs match a pattern.
+
+        IDs are split into segments at each '.', and each segment of the
+        pattern matches one segment of an ID. Segments can contain the
+        wildcards supported by fnmatch, and the segment '**' matches any
+        number of segments. For example, 'cmd.*.options' matches
+        'cmd.sync.options' and 'cmd.**' matches 'cmd' and every ID starting
+        with 'cmd.'.
+
+        Args:
+            pattern: The pattern to match item IDs against.
+
+        Returns:
+            A list of the matching items which are descendants of this item,
+            in the order that they appear in the tree.
+        """
+        items = []
+        for item_id in self._id_trie.match(pattern):
+            item = self.get_item_by_id(item_id)
+            if item is not None and item is not self:
+                items.append(item)
+
+        # Sort items by the path of child indices from the root. The position
+        # of each child is looked up in a dict so that sorting doesn't search
+        # the same list of siblings repeatedly.
+        positions = {}
+
+        def get_path(item: "Item") -> List[int]:
+            path = []
+            while item.parent is not None:
+                parent = item.parent
+                if id(parent) not in positions:
+                    positions[id(parent)] = {
+                        id(child): index
+                        for index, child in enumerate(parent.children)}
+                path.append(positions[id(parent)][id(item)])
+                item = parent
+            path.reverse()
+            return path
+
+        items.sort(key=get_path)
+        return items
 
     def _get_root_item(self) -> "Item":
         """Get the root item in the item tree.
@@ -411,6 +1205,69 @@ class Item:
         yield
         self._current_indent -= self.formatter.indent_spaces
 
+    def _prepare(
+            self, content: Any, plain=False, formatter=None
+            ) -> List[PreparedText]:
+        """Get the parts of the item that don't depend on the width.
+
+        These are cached until the content or the markup settings change, so
+        formatting the same tree to different widths only parses markup
+        once.
+
+        Args:
+            content: The content of the item.
+            plain: Don't compute the positions of markup.
+            formatter: The Formatter to use instead of the item's own. The
+                result is only cached for the item's own Formatter.
+
+        Returns:
+            A list of PreparedText objects for each part of the item.
+        """
+        cached = formatter is None or formatter is self.formatter
+        if formatter is None:
+            formatter = self.formatter
+
+        key = (
+            content if isinstance(content, str) else tuple(content),
+            formatter.manual_markup, formatter.auto_markup, plain)
+        if (cached and self._prepared_cache is not None
+                and self._prepared_cache[0] == key):
+            counters.cache_hits += 1
+            return self._prepared_cache[1]
+
+        if plain:
+            parts = self._parse_plain_content(content, formatter)
+        else:
+            parts = self._parse_content(content, formatter)
+        prepared = [PreparedText(text, positions) for text, positions in parts]
+        if cached:
+            self._prepared_cache = (key, prepared)
+        return prepared
+
+    def _parse_plain_content(
+            self, content: Any, formatter=None
+            ) -> List[Tuple[str, MarkupPositions]]:
+        """Get the parts of the item without the positions of markup.
+
+        Args:
+            content: The content of the item, which is either a string or a
+                sequence of strings.
+            formatter: The Formatter to use instead of the item's own.
+
+        Returns:
+            A list containing a tuple for each part of the item. Each tuple
+            contains the text with any manual markup removed and empty
+            markup positions.
+        """
+        if formatter is None:
+            formatter = self.formatter
+
+        parts = [content] if isinstance(content, str) else list(content)
+        if formatter.manual_markup:
+            parts = [self.strip_manual_markup(part) for part in parts]
+
+        return [(part, MarkupPositions([], [])) for part in parts]
+
     @property
     def _width(self) -> int:
         """Get the number of columns to wrap text to.
@@ -418,11 +1275,7 @@ class Item:
         This is either the width of the terminal window or the maximum width
         set in the Formatter instance, whichever is smaller.
         """
-        if self.formatter.auto_width:
-            return min(
-                self.formatter.max_width, shutil.get_terminal_size().columns)
-        else:
-            return self.formatter.max_width
+        return _get_width(self.formatter)
 
     @staticmethod
     def parse_manual_markup(text: str) -> Tuple[str, MarkupPositions]:
@@ -442,16 +1295,70 @@ class Item:
             The original text with markup characters removed and the positions
             of the substrings wrapped by the markup characters.
         """
-        inliner = Inliner()
-        default_settings = OptionParser(
-            components=(Parser,)).get_default_values()
-        inliner.init_customizations(default_settings)
+        counters.parse_calls += 1
+        text, strong_spans, em_spans = Item._remove_manual_markup(text)
+
+        markup_positions = MarkupPositions([], [])
+        instances = _InstanceCounter(text)
+
+        # Record the substring that should be marked up as 'strong' and the
+        # instance of it if it occurs multiple times in the text.
+        for content, span in strong_spans:
+            instance = instances.get(content, span)
+            if instance is not None:
+                markup_positions.strong.append((content, instance))
+
+        # Record the substring that should be marked up as 'emphasized' and the
+        # instance of it if it occurs multiple times in the text.
+        for content, span in em_spans:
+            instance = instances.get(content, span)
+            if instance is not None:
+                markup_positions.em.append((content, instance))
+
+        return text, markup_positions
+
+    @staticmethod
+    def strip_manual_markup(text: str) -> str:
+        """Remove reST markup characters from text.
+
+        This is cheaper than parse_manual_markup() because the positions of
+        the markup aren't computed.
+
+        Args:
+            text: The text containing reST inline markup.
+
+        Returns:
+            The original text with markup characters removed.
+        """
+        return Item._remove_manual_markup(text)[0]
+
+    @staticmethod
+    def _remove_manual_markup(
+            text: str
+            ) -> Tuple[str, List[Tuple[str, Tuple[int, int]]],
+                       List[Tuple[str, Tuple[int, int]]]]:
+        """Remove reST markup characters from text.
+
+        Args:
+            text: The text containing reST inline markup.
+
+        Returns:
+            A tuple containing the text with markup characters removed, a list
+            of the 'strong' substrings and their spans in the new text and a
+            list of the 'emphasized' substrings and their spans.
+        """
+        if MARKUP_CHARS.em not in text:
+            # Both kinds of markup contain this character, so there is nothing
+            # to remove. This avoids loading the docutils patterns.
+            return text, [], []
+
+        patterns = _get_inliner_patterns()
 
         strong_spans = []
         em_spans = []
         previous_match_end = 0
         offset = 0  # Adjust for characters removed from the original string.
-        for initial_match in inliner.patterns.initial.finditer(text):
+        for initial_match in patterns.initial.finditer(text):
             initial_match_start = initial_match.start() + offset
             initial_match_end = initial_match.end() + offset
             if initial_match_start < previous_match_end:
@@ -463,9 +1370,9 @@ class Item:
             # Determine what type of markup it is.
             initial_match_string = initial_match.groupdict()["start"]
             if initial_match_string == MARKUP_CHARS.strong:
-                end_pattern = inliner.patterns.strong
+                end_pattern = patterns.strong
             elif initial_match_string == MARKUP_CHARS.em:
-                end_pattern = inliner.patterns.emphasis
+                end_pattern = patterns.emphasis
             else:
                 continue
 
@@ -499,89 +1406,7 @@ class Item:
             text = new_text
             previous_match_end = end_match_end
 
-        markup_positions = MarkupPositions([], [])
-
-        # Record the substring that should be marked up as 'strong' and the
-        # instance of it if it occurs multiple times in the text.
-        for content, span in strong_spans:
-            match_counter = 0
-            for match in re.finditer(re.escape(content), text):
-                if match.span() == span:
-                    markup_positions.strong.append((content, match_counter))
-                match_counter += 1
-
-        # Record the substring that should be marked up as 'emphasized' and the
-        # instance of it if it occurs multiple times in the text.
-        for content, span in em_spans:
-            match_counter = 0
-            for match in re.finditer(re.escape(content), text):
-                if match.span() == span:
-                    markup_positions.em.append((content, match_counter))
-                match_counter += 1
-
-        return text, markup_positions
-
-    def _apply_markup(self, text: str, positions: MarkupPositions) -> str:
-        """Apply ANSI escape sequences to text at certain positions.
-
-        Args:
-            text: The text to apply the markup to.
-            positions: The positions of substrings to apply markup to.
-
-        Returns:
-            The original text with ANSI escape sequences added.
-        """
-        markup_spans = []
-        for markup_type in ["strong", "em"]:
-            for substring, instance in getattr(positions, markup_type):
-                # Match any number of whitespace and newline characters
-                # between each word in the substring since line breaks can
-                # only happen between words. It is necessary to strip out
-                # spaces because sometimes spaces are replaced with newlines
-                # in the formatted text, which is a problem when the text
-                # isn't indented.
-                words = re.split(r"(\w+)", substring)
-                substring_regex = re.compile("[\n\\s]*".join(
-                    re.escape(word) for word in words if word.strip()))
-                match = list(substring_regex.finditer(text))[instance]
-                markup_spans.append((match.span(), markup_type))
-
-        markup_spans.sort(key=lambda x: x[0][1], reverse=True)
-        markup_spans.sort(key=lambda x: x[0][0])
-
-        # Get the positions of ANSI escape sequences in the text. Keep track of
-        # which sequences are still "open" so that the ends of other sequences
-        # don't close them. This allows for nested markup.
-        markup_sequences = []
-        open_sequences = []
-        for (start, end), markup_type in markup_spans:
-            start_sequence, end_sequence = getattr(
-                self.formatter, markup_type)
-
-            open_sequences = [
-                (position, sequence) for position, sequence in open_sequences
-                if position > start]
-
-            markup_sequences.append((start, start_sequence))
-            markup_sequences.append((end, end_sequence))
-            markup_sequences += [
-                (end, sequence) for position, sequence in open_sequences]
-
-            open_sequences.append((end, start_sequence))
-
-        markup_sequences.sort(key=lambda x: x[0])
-
-        # Get a list of strings that will make up the output. This is the
-        # ordered ANSI escape sequences with the appropriate text between them.
-        prev_position = 0
-        text_sequences = []
-        for position, sequence in markup_sequences:
-            text_sequences.append(text[prev_position:position])
-            text_sequences.append(sequence)
-            prev_position = position
-        text_sequences.append(text[prev_position:])
-
-        return "".join(text_sequences)
+        return text, strong_spans, em_spans
 
 
 class TextItem(Item):
@@ -604,35 +1429,51 @@ class TextItem(Item):
     def __init__(
             self, content: Any, parent: Item, formatter: Formatter,
             item_id: Optional[str]) -> None:
-        super().__init__(formatter)
+        self._init_item(formatter)
         self.content = content
-        self.id = item_id
         self.parent = parent
         self._current_indent = parent._current_indent
+        self._ids = parent._ids
+        self._lazy_ids = parent._lazy_ids
+        self._id_suggester = parent._id_suggester
+        self._id_trie = parent._id_trie
+        self._observers = parent._observers
+        self.id = item_id
 
     @property
     def _format_func(self) -> Callable:
         """Get the function for formatting the text output."""
         return self._format
 
-    def _format(self, content: str) -> str:
-        """Format plain text for the text output.
+    def _parse_content(
+            self, content: str, formatter=None
+            ) -> List[Tuple[str, MarkupPositions]]:
+        """Get the text of the item and the positions of its markup.
 
         Args:
-            content: The text to be formatted.
+            content: The text of the item.
+            formatter: The Formatter to use instead of the item's own.
 
         Returns:
-            The formatted text as a string.
+            A list containing a tuple of the text with any manual markup
+            removed and the positions of the substrings that should have
+            markup applied.
         """
-        if self.formatter.manual_markup:
-            output_text, positions = self.parse_manual_markup(content)
-        else:
-            output_text, positions = content, MarkupPositions([], [])
+        if formatter is None:
+            formatter = self.formatter
 
-        wrapper = textwrap.TextWrapper(width=self._width)
-        output_text = wrapper.fill(output_text)
-        output_text = self._apply_markup(output_text, positions)
-        return textwrap.indent(output_text, " "*self._current_indent)
+        if formatter.manual_markup:
+            return [self.parse_manual_markup(content)]
+
+        return [(content, MarkupPositions([], []))]
+
+    def _get_layout(
+            self, content: str, aligned_buffer=None, plain=False,
+            formatter=None) -> Layout:
+        with stage("parse"):
+            text = self._prepare(content, plain, formatter)[0]
+
+        return Layout(LAYOUT_TEXT, "", text, 0, 0)
 
 
 class DefinitionItem(Item):
@@ -655,31 +1496,21 @@ class DefinitionItem(Item):
     def __init__(
             self, content: Any, parent: Item, formatter: Formatter,
             item_id: Optional[str]) -> None:
-        super().__init__(formatter)
+        self._init_item(formatter)
         self.content = content
-        self.id = item_id
         self.parent = parent
         self._current_indent = parent._current_indent
+        self._ids = parent._ids
+        self._lazy_ids = parent._lazy_ids
+        self._id_suggester = parent._id_suggester
+        self._id_trie = parent._id_trie
+        self._observers = parent._observers
+        self.id = item_id
 
     @property
     def _format_func(self) -> Callable:
-        """Get the function for formatting the text output.
-
-        Raises:
-            ValueError: The definition style was unrecognized.
-
-        Returns:
-             The function for formatting the text output.
-        """
-        style = self.formatter.def_style
-        if style is DefStyle.PARAGRAPH:
-            return functools.partial(self._format_newline, aligned=False)
-        elif style is DefStyle.OVERFLOW:
-            return functools.partial(self._format_newline, aligned=True)
-        elif style is DefStyle.INLINE:
-            return functools.partial(self._format_sameline, aligned=False)
-        elif style is DefStyle.ALIGNED:
-            return functools.partial(self._format_sameline, aligned=True)
+        """Get the function for formatting the text output."""
+        return self._format
 
     @staticmethod
     def parse_term_markup(term_string: str) -> MarkupPositions:
@@ -688,6 +1519,7 @@ class DefinitionItem(Item):
         Returns:
             The positions of the substrings that should have markup applied.
         """
+        counters.parse_calls += 1
         return MarkupPositions([(term_string, 0)], [])
 
     @staticmethod
@@ -697,15 +1529,14 @@ class DefinitionItem(Item):
         Returns:
             The positions of the substrings that should have markup applied.
         """
+        counters.parse_calls += 1
         positions = MarkupPositions([], [])
+        instances = _InstanceCounter(args_string)
         for word_match in ARG_REGEX.finditer(args_string):
-            match_counter = 0
             match_string = word_match.group()
-            for match_instance in re.finditer(
-                    re.escape(match_string), args_string):
-                if match_instance.span() == word_match.span():
-                    positions.em.append((match_string, match_counter))
-                match_counter += 1
+            instance = instances.get(match_string, word_match.span())
+            if instance is not None:
+                positions.em.append((match_string, instance))
 
         return positions
 
@@ -722,20 +1553,62 @@ class DefinitionItem(Item):
         Returns:
             The positions of the substrings that should have markup applied.
         """
+        counters.parse_calls += 1
         positions = MarkupPositions([], [])
+        instances = _InstanceCounter(text)
+        arg_positions = {}
         for arg in ARG_REGEX.findall(args):
-            for word_match in re.finditer(
-                    r"(?<!\w){}(?!\w)".format(re.escape(arg)), text):
-                match_counter = 0
-                match_string = word_match.group()
-                for match_instance in re.finditer(
-                        re.escape(match_string), text):
-                    if match_instance.span() == word_match.span():
-                        positions.em.append((match_string, match_counter))
-                    match_counter += 1
+            # The same argument can appear in the argument string more than
+            # once, and each one gets the same positions.
+            if arg not in arg_positions:
+                arg_positions[arg] = []
+                arg_regex = _cached_regex(
+                    r"(?<!\w){}(?!\w)".format(re.escape(arg)))
+                for word_match in arg_regex.finditer(text):
+                    match_string = word_match.group()
+                    instance = instances.get(match_string, word_match.span())
+                    if instance is not None:
+                        arg_positions[arg].append((match_string, instance))
+            positions.em.extend(arg_positions[arg])
 
         return positions
 
+    def _parse_content(
+            self, content: Tuple[str, str, str], formatter=None
+            ) -> List[Tuple[str, MarkupPositions]]:
+        """Get the parts of the definition and the positions of their markup.
+
+        Args:
+            content: A tuple containing the term, args and message for the
+                definition.
+            formatter: The Formatter to use instead of the item's own.
+
+        Returns:
+            A list containing a tuple for each of the term, args and message.
+            Each tuple contains the text with any manual markup removed and
+            the positions of the substrings that should have markup applied.
+        """
+        if formatter is None:
+            formatter = self.formatter
+
+        term, args, message = content
+        if formatter.manual_markup:
+            term, term_positions = self.parse_manual_markup(term)
+            args, args_positions = self.parse_manual_markup(args)
+            message, message_positions = self.parse_manual_markup(message)
+        else:
+            term_positions = args_positions = message_positions = (
+                MarkupPositions([], []))
+
+        if formatter.auto_markup:
+            term_positions += self.parse_term_markup(term)
+            args_positions += self.parse_args_markup(args)
+            message_positions += self.parse_message_markup(args, message)
+
+        return [
+            (term, term_positions), (args, args_positions),
+            (message, message_positions)]
+
     def _get_aligned_buffer(self) -> int:
         """Get the length of the buffer to leave before aligned messages.
 
@@ -747,25 +1620,33 @@ class DefinitionItem(Item):
         Returns:
             The number of spaces to buffer.
         """
-        aligned_content = (
-            item.content for item in self.parent.children
-            if isinstance(item, type(self))
-            and item.formatter.def_style is DefStyle.ALIGNED)
-        try:
-            longest = max(
+        # The length of the longest signature is the same for every sibling,
+        # so it is only computed once each time the tree is formatted.
+        longest = self.parent._aligned_buffer_cache
+        if longest is not None:
+            counters.cache_hits += 1
+        else:
+            aligned_content = (
+                item.content for item in self.parent.children
+                if isinstance(item, type(self))
+                and item.formatter.def_style is DefStyle.ALIGNED)
+            longest = max((
                 len(" ".join([string for string in (term, args) if string]))
-                for term, args, message in aligned_content)
-            longest += self.formatter.def_gap
-        except ValueError:
+                for term, args, message in aligned_content), default=-1)
+            self.parent._aligned_buffer_cache = longest
+
+        if longest < 0:
             # There are no siblings that are definitions with the ALIGNED
             # style.
-            longest = self.formatter.indent_spaces
+            return self.formatter.indent_spaces
 
-        return longest
+        return longest + self.formatter.def_gap
 
+    @staticmethod
     def _create_signature(
-            self, term: str, args: str, term_positions: MarkupPositions,
-            args_positions: MarkupPositions, signature_buffer: int) -> str:
+            term: str, args: str, term_positions: MarkupPositions,
+            args_positions: MarkupPositions, signature_buffer: int,
+            formatter: Formatter, plain=False) -> str:
         """Create a signature for a definition.
 
         A 'signature' is the concatenation of the definition's term and
@@ -780,6 +1661,9 @@ class DefinitionItem(Item):
                 argument string.
             signature_buffer: The amount of space there should be between the
                 beginning of the line and the message.
+            formatter: The Formatter containing the strings which apply
+                markup.
+            plain: Leave out the strings which apply markup.
 
         Returns:
             The signature string for the definition.
@@ -792,117 +1676,63 @@ class DefinitionItem(Item):
         # separately, spaces are used as filler in certain places so that
         # the text can be wrapped properly before the real text is
         # substituted.
-        if self.formatter.auto_markup:
-            term_positions += self.parse_term_markup(term)
-            args_positions += self.parse_args_markup(args)
-
         output_args = "{0:<{1}}".format(
             " "*(term_buffer + 1) + args, signature_buffer)
 
-        output_signature = (
-            self._apply_markup(term, term_positions)
-            + self._apply_markup(
-                output_args[term_buffer:], args_positions))
-
-        return output_signature
-
-    def _format_sameline(
-            self, content: Tuple[str, str, str], aligned: bool) -> str:
-        """Format an INLINE or ALIGNED definition for the text output.
-
-        Args:
-            content: A tuple containing the term, args and message for the
-                definition.
-            aligned: Align the definition with all others belonging to the same
-                parent item and with a style of ALIGNED.
-
-        Returns:
-            The formatted definition as a string.
-        """
-        term, args, message = content
-        if self.formatter.manual_markup:
-            term, term_positions = self.parse_manual_markup(term)
-            args, args_positions = self.parse_manual_markup(args)
-            message, message_positions = self.parse_manual_markup(message)
-        else:
-            term_positions = args_positions = message_positions = (
-                MarkupPositions([], []))
+        if plain:
+            return term + output_args[term_buffer:]
 
-        if self.formatter.auto_markup:
-            message_positions += self.parse_message_markup(args, message)
+        with stage("markup"):
+            output_signature = (
+                _apply_markup(term, term_positions, formatter)
+                + _apply_markup(
+                    output_args[term_buffer:], args_positions, formatter))
 
-        # Get the total length of the term and argument string.
-        if aligned:
-            signature_buffer = self._get_aligned_buffer()
-        else:
-            signature_buffer = (
-                len(" ".join([string for string in (term, args) if string]))
-                + self.formatter.def_gap)
-
-        # This is the combined term and argument string.
-        output_signature = self._create_signature(
-            term, args, term_positions, args_positions, signature_buffer)
-
-        subsequent_indent = self.formatter.indent_spaces
-        if aligned:
-            subsequent_indent += signature_buffer
-        wrapper = textwrap.TextWrapper(
-            width=self._width - self._current_indent,
-            subsequent_indent=" "*subsequent_indent)
-
-        output_message = wrapper.fill(" "*signature_buffer + message)
-        output_message = self._apply_markup(output_message, message_positions)
-
-        return textwrap.indent(
-            output_signature + output_message[signature_buffer:],
-            " "*self._current_indent)
-
-    def _format_newline(
-            self, content: Tuple[str, str, str], aligned: bool) -> str:
-        """Format a PARAGRAPH or OVERFLOW definition for the text output.
-
-        Args:
-            content: A tuple containing the term, args and message for the
-                definition.
-            aligned: Align the definition with all others belonging to the same
-                parent item and with a style of ALIGNED.
-
-        Returns:
-            The formatted definition as a string.
-        """
-        term, args, message = content
-        if self.formatter.manual_markup:
-            term, term_positions = self.parse_manual_markup(term)
-            args, args_positions = self.parse_manual_markup(args)
-            message, message_positions = self.parse_manual_markup(message)
-        else:
-            term_positions = args_positions = message_positions = (
-                MarkupPositions([], []))
+        return output_signature
 
-        if self.formatter.auto_markup:
-            message_positions += self.parse_message_markup(args, message)
+    def _get_layout(
+            self, content: Tuple[str, str, str], aligned_buffer=None,
+            plain=False, formatter=None) -> Layout:
+        if formatter is None:
+            formatter = self.formatter
 
-        # This is the combined term and argument string.
-        output_signature = self._create_signature(
-            term, args, term_positions, args_positions, 0)
+        with stage("parse"):
+            term, args, message = self._prepare(content, plain, formatter)
 
-        if not message:
-            return textwrap.indent(output_signature, " "*self._current_indent)
+        style = formatter.def_style
+        if aligned_buffer is None and style in (
+                DefStyle.ALIGNED, DefStyle.OVERFLOW):
+            aligned_buffer = self._get_aligned_buffer()
 
-        if aligned:
-            signature_buffer = self._get_aligned_buffer()
-            initial_indent = " "*signature_buffer
-            subsequent_indent = " "*(signature_buffer + self.formatter.indent_spaces)
-        else:
-            initial_indent = " "*self.formatter.indent_spaces
-            subsequent_indent = " "*self.formatter.indent_spaces
-        wrapper = textwrap.TextWrapper(
-            width=self._width - self._current_indent,
-            initial_indent=initial_indent,
-            subsequent_indent=subsequent_indent)
-
-        output_message = wrapper.fill(message)
-        output_message = self._apply_markup(output_message, message_positions)
-
-        return textwrap.indent(
-            "\n".join([output_signature, output_message]), " "*self._current_indent)
+        if style is DefStyle.INLINE or style is DefStyle.ALIGNED:
+            if style is DefStyle.ALIGNED:
+                signature_buffer = aligned_buffer
+                subsequent_indent = formatter.indent_spaces + aligned_buffer
+            else:
+                # Get the total length of the term and argument string.
+                signature_buffer = (
+                    len(" ".join([
+                        string for string in (term.text, args.text)
+                        if string]))
+                    + formatter.def_gap)
+                subsequent_indent = formatter.indent_spaces
+
+            # This is the combined term and argument string.
+            signature = self._create_signature(
+                term.text, args.text, term.positions, args.positions,
+                signature_buffer, formatter, plain=plain)
+            return Layout(
+                LAYOUT_SAMELINE, signature, message, signature_buffer,
+                subsequent_indent)
+
+        signature = self._create_signature(
+            term.text, args.text, term.positions, args.positions, 0,
+            formatter, plain=plain)
+        if style is DefStyle.OVERFLOW:
+            return Layout(
+                LAYOUT_NEWLINE, signature, message, aligned_buffer,
+                aligned_buffer + formatter.indent_spaces)
+
+        return Layout(
+            LAYOUT_NEWLINE, signature, message, formatter.indent_spaces,
+            formatter.indent_spaces)
@@ -0,0 +1,343 @@
+"""Profile formatting a tree of items and export a Chrome trace.
+
+This imports a function that returns an Item object, formats the tree
+repeatedly and writes the timings to a file in the Chrome trace event format,
+which can be opened in chrome://tracing or Perfetto.
+
+Usage:
+    python -m linotype.profile module:function [--item-id ID] [--width N]
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import importlib
+import threading
+import contextlib
+import collections
+from typing import Any, Callable, Dict, List, Optional
+
+from linotype.items import DefinitionItem, Item
+from linotype.timing import ItemTiming, Recorder, instrument
+
+
+class TraceRecorder(Recorder):
+    """Record timings as Chrome trace events.
+
+    Args:
+        callback: A function which is called with an ItemTiming instance each
+            time an item is formatted.
+
+    Attributes:
+        events: A list of trace events, which are dicts in the Chrome trace
+            event format.
+        item_names: A list of the name of the item for each timing in
+            'timings', which is unique within the tree.
+        _origin: The value of time.perf_counter() that timestamps are
+            relative to.
+        _names: A dict where keys are the ids of items and values are their
+            names.
+        _current_name: The name of the item that is currently being
+            formatted.
+    """
+    def __init__(self, callback: Optional[Callable[[ItemTiming], Any]] = None
+                 ) -> None:
+        super().__init__(callback)
+        self.events = []
+        self.item_names = []
+        self._origin = time.perf_counter()
+        self._names = {}
+        self._current_name = None
+
+    def _get_name(self, item: Item) -> str:
+        """Get a name for an item which is unique within its tree.
+
+        Items with an ID are named by their ID. Other items are named by the
+        name of their parent and their position among its children, followed
+        by the term of definitions, like 'commands/2 --verbose'.
+        """
+        name = self._names.get(id(item))
+        if name is None:
+            if item.id is not None:
+                name = item.id
+            elif item.parent is None:
+                name = ""
+            else:
+                parent = item.parent
+                # The names of every sibling are computed at once so that
+                # finding positions doesn't search the same list repeatedly.
+                parent_name = self._get_name(parent)
+                for index, sibling in enumerate(parent.children):
+                    if sibling.id is not None:
+                        continue
+                    sibling_name = "{0}/{1}".format(parent_name, index)
+                    if isinstance(sibling, DefinitionItem):
+                        sibling_name += " " + sibling.content[0]
+                    self._names[id(sibling)] = sibling_name
+                name = self._names[id(item)]
+            self._names[id(item)] = name
+
+        return name
+
+    def record_item(self, item, format_func: Callable[[Any], str]) -> str:
+        self._current_name = self._get_name(item)
+        return super().record_item(item, format_func)
+
+    def add_span(
+            self, name: str, category: str, start: float, end: float,
+            args: Optional[Dict[str, Any]] = None) -> None:
+        """Add a complete event to the trace.
+
+        Args:
+            name: The name of the span.
+            category: The category of the span.
+            start: The value of time.perf_counter() when the span started.
+            end: The value of time.perf_counter() when the span ended.
+            args: Extra information to display for the span.
+        """
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+
+        self.events.append(event)
+
+    def add_item(self, timing: ItemTiming, start: float, end: float) -> None:
+        super().add_item(timing, start, end)
+        self.item_names.append(self._current_name)
+        if timing.item_id is None:
+            name = timing.item_type
+        else:
+            name = "{0} {1}".format(timing.item_type, timing.item_id)
+        self.add_span(name, "item", start, end, {
+            "item_id": timing.item_id,
+            "level": timing.level,
+            "output_size": timing.output_size})
+
+    def add_stage(self, name: str, start: float, end: float) -> None:
+        super().add_stage(name, start, end)
+        self.add_span(name, "stage", start, end)
+
+    def trace(self) -> Dict[str, Any]:
+        """Get the trace as a dict that can be serialized as JSON."""
+        return {"traceEvents": self.events, "displayTimeUnit": "ms"}
+
+
+def import_function(spec: str) -> Callable[[], Item]:
+    """Import a function given as 'module:function' or 'filepath:function'.
+
+    Modules are imported in the same way as the :module: option of the Sphinx
+    directive, and files ending in '.py' are executed in the same way as the
+    :filepath: option.
+
+    Raises:
+        ValueError: The spec was malformed or the function doesn't exist.
+
+    Returns:
+        The function.
+    """
+    source, separator, function_name = spec.rpartition(":")
+    if not separator or not source or not function_name:
+        raise ValueError(
+            "expected 'module:function' or 'filepath:function', got "
+            "'{0}'".format(spec))
+
+    if source.endswith(".py"):
+        namespace = {}
+        with open(os.path.abspath(source)) as file:
+            code = compile(file.read(), source, "exec")
+        exec(code, namespace)
+    else:
+        namespace = vars(importlib.import_module(source))
+
+    if function_name not in namespace:
+        raise ValueError("'{0}' has no attribute '{1}'".format(
+            source, function_name))
+
+    return namespace[function_name]
+
+
+@contextlib.contextmanager
+def fixed_width(root_item: Item, width: int):
+    """Use a fixed width for every item in a tree inside this context.
+
+    Each item is given a copy of its Formatter, so Formatter objects which
+    are shared with other trees aren't changed. The original Formatter
+    objects are put back when the context exits.
+    """
+    items = list(root_item.get_items())
+    original_formatters = [item.formatter for item in items]
+
+    # Items which share a Formatter keep sharing a copy.
+    formatters = {}
+    for item, formatter in zip(items, original_formatters):
+        if id(formatter) not in formatters:
+            new_formatter = copy.copy(formatter)
+            new_formatter.max_width = width
+            new_formatter.auto_width = False
+            formatters[id(formatter)] = new_formatter
+        item.formatter = formatters[id(formatter)]
+
+    try:
+        yield
+    finally:
+        for item, formatter in zip(items, original_formatters):
+            item.formatter = formatter
+
+
+def profile(
+        func: Callable[[], Item], repeat=10, item_id=None, width=None,
+        levels=None) -> TraceRecorder:
+    """Build a tree of items once and format it repeatedly.
+
+    Args:
+        func: The function which returns the root item of the tree.
+        repeat: The number of times to format the tree.
+        item_id: The ID of the item to format.
+        width: The number of columns to wrap text to. If 'None,' the width set
+            in each item's Formatter is used.
+        levels: The number of levels of nested items to descend into.
+
+    Raises:
+        ValueError: An item with the given ID doesn't exist.
+
+    Returns:
+        The TraceRecorder containing the timings.
+    """
+    recorder = TraceRecorder()
+
+    start = time.perf_counter()
+    root_item = func()
+    recorder.add_span(
+        "build", "build", start, time.perf_counter(),
+        {"function": getattr(func, "__qualname__", repr(func))})
+
+    if item_id is not None:
+        root_item.get_item_by_id(item_id, raising=True)
+
+    if width is None:
+        width_context = contextlib.ExitStack()
+    else:
+        width_context = fixed_width(root_item, width)
+
+    with width_context, instrument(recorder=recorder):
+        for i in range(repeat):
+            start = time.perf_counter()
+            root_item.format(levels=levels, item_id=item_id)
+            recorder.add_span(
+                "format", "traversal", start, time.perf_counter(),
+                {"repeat": i})
+
+    return recorder
+
+
+def _summarize(recorder: TraceRecorder, repeat: int, slowest: int) -> None:
+    """Print a summary of the timings."""
+    spans = collections.defaultdict(list)
+    for event in recorder.events:
+        if event["cat"] in ("build", "traversal"):
+            spans[event["name"]].append(event["dur"] / 1000)
+
+    print("build:  {0:10.3f} ms".format(sum(spans["build"])))
+    print("format: {0:10.3f} ms (mean of {1})".format(
+        sum(spans["format"]) / max(1, len(spans["format"])), repeat))
+
+    stage_totals = collections.Counter()
+    item_totals = collections.defaultdict(float)
+    for timing, name in zip(recorder.timings, recorder.item_names):
+        stage_totals.update(timing.stages)
+        item_totals[(timing.item_type, name)] += timing.total
+
+    print("")
+    print("Time per stage (ms per format):")
+    for name, seconds in stage_totals.most_common():
+        print("  {0:<8} {1:10.3f}".format(
+            name, seconds * 1000 / repeat))
+
+    print("")
+    print("Slowest items (ms per format):")
+    ranked = sorted(item_totals.items(), key=lambda x: x[1], reverse=True)
+    for (item_type, name), seconds in ranked[:slowest]:
+        print("  {0:10.3f}  {1} {2}".format(
+            seconds * 1000 / repeat, item_type, name))
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m linotype.profile",
+        description="Profile formatting a tree of items and export a Chrome "
+                    "trace.")
+    parser.add_argument(
+        "function", metavar="module:function",
+        help="the function which returns the root item, given as "
+             "'module:function' or 'filepath:function'")
+    parser.add_argument(
+        "--item-id", help="the ID of the item to format")
+    parser.add_argument(
+        "--width", type=int, help="the number of columns to wrap text to")
+    parser.add_argument(
+        "--levels", type=int,
+        help="the number of levels of nested items to descend into")
+    parser.add_argument(
+        "--repeat", type=int, default=10,
+        help="the number of times to format the tree")
+    parser.add_argument(
+        "--output", default="linotype-trace.json",
+        help="the file to write the trace to")
+    parser.add_argument(
+        "--slowest", type=int, default=10,
+        help="the number of slowest items to list")
+    options = parser.parse_args(args)
+
+    # Allow importing modules from the current directory like 'python -m'.
+    if "" not in sys.path and os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    try:
+        func = import_function(options.function)
+    except (ValueError, ImportError) as e:
+        parser.error(str(e))
+
+    try:
+        recorder = profile(
+            func, repeat=options.repeat, item_id=options.item_id,
+            width=options.width, levels=options.levels)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(options.output, "w") as file:
+        json.dump(recorder.trace(), file)
+
+    _summarize(recorder, options.repeat, options.slowest)
+    print("")
+    print("Wrote {0} events to {1}".format(
+        len(recorder.events), options.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Render a tree of items as a roff man page without using Sphinx.
+
+Text items are rendered as paragraphs and definition items as tagged
+paragraphs. The children of an item are indented relative to it.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from typing import Generator, List, Optional
+
+from linotype.items import Item, DefinitionItem, MarkupPositions, iter_markup
+
+MARKUP_FONTS = {"strong": "B", "em": "I"}
+
+# Backslashes start escape sequences and hyphens are rendered as hyphens
+# rather than minus signs unless they are escaped.
+ROFF_ESCAPES = str.maketrans({"\\": "\\e", "-": "\\-", "\n": " "})
+
+# Double quotes end a quoted macro argument.
+ROFF_ARG_ESCAPES = str.maketrans({"\"": "\\(dq"})
+
+
+def _escape(text: str) -> str:
+    """Escape text so that it is printed literally."""
+    return text.translate(ROFF_ESCAPES)
+
+
+def _escape_arg(text: str) -> str:
+    """Escape text so that it is printed literally as a quoted argument."""
+    return _escape(text).translate(ROFF_ARG_ESCAPES)
+
+
+def _apply_markup(text: str, positions: MarkupPositions) -> str:
+    """Escape text and add font changes for markup.
+
+    Args:
+        text: The text to apply markup to.
+        positions: The positions of substrings to apply markup to.
+
+    Returns:
+        The text as a single line of roff.
+    """
+    chunks = []
+    fonts = ["R"]
+    for event, value in iter_markup(text, positions):
+        if event == "text":
+            chunks.append(_escape(value))
+        elif event == "start":
+            fonts.append(MARKUP_FONTS[value])
+            chunks.append("\\f" + fonts[-1])
+        else:
+            # Return to the font of the enclosing markup.
+            fonts.pop()
+            chunks.append("\\f" + fonts[-1])
+
+    line = "".join(chunks)
+    if line.startswith((".", "'")):
+        # Lines starting with these characters are control lines.
+        line = "\\&" + line
+
+    return line
+
+
+def _iter_items(
+        items: List[Item], levels: Optional[int], depth: int
+        ) -> Generator[str, None, None]:
+    """Recursively yield roff for sibling items and their descendants.
+
+    Args:
+        items: The sibling items to render.
+        levels: The number of levels of nested items to descend into.
+            'None' means that there is no limit.
+        depth: The number of levels below the item being rendered that the
+            items are at.
+
+    Yields:
+        Lines of roff, each ending with a newline.
+    """
+    for item in items:
+        if item.formatter.visible:
+            if isinstance(item, DefinitionItem):
+                ((term, term_positions), (args, args_positions),
+                 (message, message_positions)) = item._parse_content(
+                     item.content)
+                signature = _apply_markup(term, term_positions)
+                if args:
+                    signature += " " + _apply_markup(args, args_positions)
+                yield ".TP\n"
+                yield signature + "\n"
+                if message:
+                    yield _apply_markup(message, message_positions) + "\n"
+            else:
+                text, positions = item._parse_content(item.content)[0]
+                yield ".PP\n"
+                yield _apply_markup(text, positions) + "\n"
+
+        if item.children and (levels is None or depth < levels):
+            yield ".RS\n"
+            yield from _iter_items(item.children, levels, depth + 1)
+            yield ".RE\n"
+
+
+def iter_roff(
+        root_item: Item, levels=None, item_id=None, title=None, section="1"
+        ) -> Generator[str, None, None]:
+    """Render a tree of items as roff one line at a time.
+
+    The output uses the 'man' macros and is produced as the tree is
+    traversed.
+
+    Args:
+        root_item: The root of the item tree.
+        levels: The number of levels of nested items to descend into.
+            'None' means that there is no limit.
+        item_id: The ID of the item to render. If 'None,' this defaults to
+            the root item.
+        title: The title of the man page. If 'None,' no title line is added.
+        section: The section of the manual that the page belongs to.
+
+    Raises:
+        ValueError: An item with the given ID doesn't exist.
+
+    Yields:
+        Lines of roff, each ending with a newline.
+    """
+    if item_id is None:
+        target_item = root_item
+    else:
+        target_item = root_item.get_item_by_id(item_id, raising=True)
+
+    if title is not None:
+        yield '.TH "{0}" "{1}"\n'.format(
+            _escape_arg(title), _escape_arg(section))
+
+    if target_item.parent:
+        yield from _iter_items([target_item], levels, 0)
+    elif levels is None or levels > 0:
+        yield from _iter_items(target_item.children, levels, 1)
+
+
+def render_roff(
+        root_item: Item, levels=None, item_id=None, title=None, section="1"
+        ) -> str:
+    """Render a tree of items as a roff man page.
+
+    Args:
+        root_item: The root of the item tree.
+        levels: The number of levels of nested items to descend into.
+            'None' means that there is no limit.
+        item_id: The ID of the item to render. If 'None,' this defaults to
+            the root item.
+        title: The title of the man page. If 'None,' no title line is added.
+        section: The section of the manual that the page belongs to.
+
+    Raises:
+        ValueError: An item with the given ID doesn't exist.
+
+    Returns:
+        The roff source as a single string.
+    """
+    return "".join(iter_roff(
+        root_item, levels=levels, item_id=item_id, title=title,
+        section=section))
@@ -0,0 +1,203 @@
+"""Search the content of a tree of items.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import re
+import bisect
+import weakref
+from typing import Dict, List
+
+from linotype.items import DefinitionItem, Item
+
+TOKEN_REGEX = re.compile(r"\w+")
+
+# These are the fields that text is indexed under. Matches in fields with
+# lower values are ranked higher. The text of text items is a message.
+FIELD_TERM = 0
+FIELD_ARGS = 1
+FIELD_MESSAGE = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words.
+
+    Args:
+        text: The text to split.
+
+    Returns:
+        A list of words.
+    """
+    return TOKEN_REGEX.findall(text.lower())
+
+
+class SearchIndex:
+    """An inverted index of the words in a tree of items.
+
+    Only items with an ID are indexed, since those are the items that can be
+    formatted on their own. The index is kept up to date as new items are
+    added to the tree, but changes to the content of existing items are not
+    indexed. The tree only holds a weak reference to the index, so the index
+    stops being updated once it is garbage collected or closed.
+
+    Args:
+        root_item: The item to index along with its descendants.
+
+    Attributes:
+        _root_item: The item being indexed.
+        _postings: A dict where keys are words and values are dicts mapping
+            the ID of each item containing the word to the best field that it
+            appears in.
+        _tokens: A sorted list of every word in the index, which is used to
+            find words by their prefix.
+        _order: A dict where keys are indexed item IDs and values are the
+            order in which they were indexed, which breaks ties in ranking.
+        _finalizer: A weakref.finalize object which removes the index from
+            the tree's list of observers.
+    """
+    def __init__(self, root_item: Item) -> None:
+        self._root_item = root_item
+        self._postings = {}
+        self._tokens = []
+        self._order = {}
+
+        # Words are sorted once after every item is indexed instead of being
+        # inserted in order one at a time.
+        for item in root_item.get_items():
+            self._add_item(item, sort=False)
+        self._tokens.sort()
+
+        index_ref = weakref.ref(self)
+
+        def observe(item):
+            index = index_ref()
+            if index is not None:
+                index._observe(item)
+
+        root_item._observers.append(observe)
+        self._finalizer = weakref.finalize(
+            self, root_item._observers.remove, observe)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def close(self) -> None:
+        """Stop indexing items which are added to the tree."""
+        self._finalizer()
+
+    def _observe(self, item: Item) -> None:
+        """Index an item that was added to the tree if it is a descendant."""
+        ancestor = item.parent
+        while ancestor is not None:
+            if ancestor is self._root_item:
+                self._add_item(item)
+                return
+            ancestor = ancestor.parent
+
+    def _add_item(self, item: Item, sort=True) -> None:
+        """Add the content of an item to the index.
+
+        Manual markup is removed from the text before it is indexed.
+
+        Args:
+            item: The item to add.
+            sort: Keep the list of words sorted. If 'False,' new words are
+                added to the end of the list.
+        """
+        if item.id is None or item.id in self._order or not item.parent:
+            return
+        self._order[item.id] = len(self._order)
+
+        if isinstance(item, DefinitionItem):
+            fields = zip([FIELD_TERM, FIELD_ARGS, FIELD_MESSAGE], item.content)
+        else:
+            fields = [(FIELD_MESSAGE, item.content)]
+
+        for field, text in fields:
+            if item.formatter.manual_markup:
+                text = item.parse_manual_markup(text)[0]
+            for token in tokenize(text):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    if sort:
+                        bisect.insort(self._tokens, token)
+                    else:
+                        self._tokens.append(token)
+                postings[item.id] = min(postings.get(item.id, field), field)
+
+    def _lookup(self, token: str, prefix: bool) -> Dict[str, int]:
+        """Get the items containing a word.
+
+        Args:
+            token: The word to look up.
+            prefix: Match every word which starts with the given word.
+
+        Returns:
+            A dict where keys are item IDs and values are the best field that
+            the word appears in.
+        """
+        if not prefix:
+            return self._postings.get(token, {})
+
+        matches = {}
+        index = bisect.bisect_left(self._tokens, token)
+        while (index < len(self._tokens)
+               and self._tokens[index].startswith(token)):
+            for item_id, field in self._postings[self._tokens[index]].items():
+                matches[item_id] = min(matches.get(item_id, field), field)
+            index += 1
+
+        return matches
+
+    def search(self, query: str, prefix=False, limit=None) -> List[str]:
+        """Find the items which contain every word in a query.
+
+        Items where the words appear in the term are ranked before items where
+        they appear in the arguments, which are ranked before items where they
+        only appear in the message. Items that rank the same are in the order
+        that they were added to the tree.
+
+        Args:
+            query: The words to search for. Case and punctuation are ignored.
+            prefix: Match words which start with the words in the query
+                instead of only whole words.
+            limit: The maximum number of results to return. 'None' means that
+                there is no limit.
+
+        Returns:
+            A list of item IDs, which can be passed to Item.format().
+        """
+        ranks = None
+        for token in tokenize(query):
+            matches = self._lookup(token, prefix)
+            if ranks is None:
+                ranks = dict(matches)
+            else:
+                # An item ranks by the worst field of any word in the query.
+                ranks = {
+                    item_id: max(rank, matches[item_id])
+                    for item_id, rank in ranks.items() if item_id in matches}
+            if not ranks:
+                return []
+
+        if ranks is None:
+            return []
+
+        results = sorted(
+            ranks, key=lambda item_id: (ranks[item_id], self._order[item_id]))
+        return results[:limit]
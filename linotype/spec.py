@@ -0,0 +1,305 @@
+"""Build a tree of items from a declarative JSON or TOML file.
+
+A spec is a dict with an optional 'formatter' table of Formatter attributes
+and an 'items' list. Each item is a dict with either a 'text' key for a text
+item or a 'term' key, and optionally 'args' and 'message' keys, for a
+definition item. Items can also have an 'id', a 'formatter' table which
+overrides attributes of their parent's Formatter and an 'items' list of
+children. For example:
+
+    {
+        "formatter": {"def_style": "ALIGNED"},
+        "items": [
+            {"text": "Commands:", "id": "commands", "items": [
+                {"term": "add", "args": "task", "message": "Add a task."}
+            ]}
+        ]
+    }
+
+The children of each item are only added to the tree the first time they
+are accessed, so formatting a single item only builds that item, its
+descendants and its ancestors.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import copy
+import json
+import functools
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+from linotype.ansi import ansi_format
+from linotype.items import DefStyle, Formatter, Item
+
+FORMATTER_KEYS = set(vars(Formatter()))
+TEXT_KEYS = {"text", "id", "formatter", "items"}
+DEFINITION_KEYS = {"term", "args", "message", "id", "formatter", "items"}
+
+# These are the types that each Formatter attribute can have in a spec. The
+# 'strong' and 'em' attributes are either the arguments to ansi_format() or a
+# pair of strings.
+FORMATTER_TYPES = {
+    "max_width": int, "auto_width": bool, "indent_spaces": int,
+    "def_gap": int, "def_style": str, "auto_markup": bool,
+    "manual_markup": bool, "visible": bool, "strong": (dict, list, tuple),
+    "em": (dict, list, tuple)}
+
+
+def _convert_formatter_value(key: str, value: Any) -> Any:
+    """Convert a value from a spec to the type used by Formatter.
+
+    Args:
+        key: The name of the Formatter attribute.
+        value: The value from the spec.
+
+    Raises:
+        ValueError: The value was invalid.
+
+    Returns:
+        The converted value.
+    """
+    if key == "def_style" and isinstance(value, str):
+        try:
+            return DefStyle[value.upper()]
+        except KeyError:
+            raise ValueError("unknown definition style '{0}'".format(value))
+    elif key in ("strong", "em"):
+        if isinstance(value, dict):
+            # These are the arguments to ansi_format().
+            return ansi_format(**value)
+        return tuple(value)
+
+    return value
+
+
+def _make_formatter(
+        parent_formatter: Formatter, overrides: Optional[Dict[str, Any]]
+        ) -> Optional[Formatter]:
+    """Create a Formatter from the attributes in a spec.
+
+    Args:
+        parent_formatter: The Formatter to copy attributes from.
+        overrides: The attributes to change.
+
+    Returns:
+        The new Formatter object, or 'None' if there are no attributes to
+        change.
+    """
+    if not overrides:
+        return None
+
+    formatter = copy.copy(parent_formatter)
+    for key, value in overrides.items():
+        setattr(formatter, key, _convert_formatter_value(key, value))
+
+    return formatter
+
+
+def _describe_item(spec: Dict[str, Any], path: Tuple[int, ...]) -> str:
+    """Get the name of an item in a spec for error messages."""
+    name = ".".join("items[{0}]".format(index) for index in path)
+    if spec.get("id") is not None:
+        name += " (ID '{0}')".format(spec["id"])
+    return name
+
+
+def _validate_formatter(overrides: Any, name: str) -> None:
+    """Check the attributes for a Formatter in a spec.
+
+    Args:
+        overrides: The attributes to check.
+        name: The name of the item they belong to, for error messages.
+
+    Raises:
+        ValueError: The attributes were invalid.
+    """
+    if overrides is None:
+        return
+    if not isinstance(overrides, dict):
+        raise ValueError("{0}: 'formatter' must be a table".format(name))
+
+    unknown_keys = set(overrides) - FORMATTER_KEYS
+    if unknown_keys:
+        raise ValueError("{0}: unknown formatter attributes: {1}".format(
+            name, ", ".join(sorted(unknown_keys))))
+
+    for key, value in sorted(overrides.items()):
+        expected_type = FORMATTER_TYPES.get(key, object)
+        # Booleans are integers in Python, but not in JSON or TOML.
+        if (not isinstance(value, expected_type)
+                or (isinstance(value, bool) and expected_type is not bool)):
+            raise ValueError(
+                "{0}: the formatter attribute '{1}' has the wrong "
+                "type".format(name, key))
+        if (key in ("strong", "em") and not isinstance(value, dict)
+                and (len(value) != 2 or not all(
+                    isinstance(string, str) for string in value))):
+            raise ValueError(
+                "{0}: the formatter attribute '{1}' must be a pair of "
+                "strings".format(name, key))
+
+        try:
+            _convert_formatter_value(key, value)
+        except (TypeError, ValueError) as e:
+            raise ValueError("{0}: {1}".format(name, e))
+
+
+def _index_items(
+        item_specs: List[Dict[str, Any]], lazy_ids: Dict[str, Tuple[int, ...]]
+        ) -> None:
+    """Check the items in a spec and find the path to each ID.
+
+    This doesn't create any items, so it is much cheaper than building the
+    tree.
+
+    Args:
+        item_specs: The list of items at the root of the spec.
+        lazy_ids: The dict to add the path to each item ID to.
+
+    Raises:
+        ValueError: The spec was invalid or contained duplicate IDs.
+    """
+    pending = [(item_specs, ())]
+    while pending:
+        specs, path = pending.pop()
+        if not isinstance(specs, list):
+            raise ValueError("'items' must be a list")
+
+        for index, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                raise ValueError("each item must be a table")
+            if "text" in spec:
+                unknown_keys = set(spec) - TEXT_KEYS
+            elif "term" in spec:
+                unknown_keys = set(spec) - DEFINITION_KEYS
+            else:
+                raise ValueError(
+                    "each item must have either a 'text' or a 'term' key")
+            if unknown_keys:
+                raise ValueError("unknown item keys: {0}".format(
+                    ", ".join(sorted(unknown_keys))))
+
+            item_path = path + (index,)
+            _validate_formatter(
+                spec.get("formatter"), _describe_item(spec, item_path))
+
+            item_id = spec.get("id")
+            if item_id is not None:
+                if item_id in lazy_ids:
+                    raise ValueError(
+                        "the item ID '{0}' is already in use".format(item_id))
+                lazy_ids[item_id] = item_path
+
+            if "items" in spec:
+                pending.append((spec["items"], item_path))
+
+
+def _add_items(item_specs: List[Dict[str, Any]], parent: Item) -> None:
+    """Add the items in a spec as children of an item.
+
+    The children of the new items are added when they are first accessed.
+
+    Args:
+        item_specs: The list of items to add.
+        parent: The item to add them to.
+    """
+    for spec in item_specs:
+        item_id = spec.get("id")
+        if item_id is not None:
+            # The item is about to exist, so it no longer needs a path.
+            del parent._lazy_ids[item_id]
+
+        formatter = _make_formatter(parent.formatter, spec.get("formatter"))
+        if "text" in spec:
+            new_item = parent.add_text(
+                spec["text"], formatter=formatter, item_id=item_id)
+        else:
+            new_item = parent.add_def(
+                spec["term"], spec.get("args", ""), spec.get("message", ""),
+                formatter=formatter, item_id=item_id)
+
+        if spec.get("items"):
+            new_item._pending_children = functools.partial(
+                _add_items, spec["items"])
+
+
+def load_dict(spec: Dict[str, Any]) -> Item:
+    """Build a tree of items from a spec.
+
+    Args:
+        spec: The spec, which is usually parsed from JSON or TOML.
+
+    Raises:
+        ValueError: The spec was invalid or contained duplicate IDs.
+
+    Returns:
+        The root item of the tree. Its descendants are added when they are
+        first accessed.
+    """
+    _validate_formatter(spec.get("formatter"), "the root item")
+    root_item = Item(
+        _make_formatter(Formatter(), spec.get("formatter")) or Formatter())
+
+    item_specs = spec.get("items", [])
+    _index_items(item_specs, root_item._lazy_ids)
+    for item_id in root_item._lazy_ids:
+        root_item._id_suggester.add(item_id)
+        root_item._id_trie.add(item_id)
+    if item_specs:
+        root_item._pending_children = functools.partial(
+            _add_items, item_specs)
+
+    return root_item
+
+
+def load_file(path: str) -> Item:
+    """Build a tree of items from a JSON or TOML file.
+
+    The format is determined by the file extension, which must be '.json' or
+    '.toml'. Reading TOML files requires the 'tomllib' module, which is part
+    of the standard library in Python 3.11 and later.
+
+    Args:
+        path: The path of the file.
+
+    Raises:
+        ValueError: The file type was unsupported or the spec was invalid.
+
+    Returns:
+        The root item of the tree. Its descendants are added when they are
+        first accessed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, encoding="utf-8") as file:
+            spec = json.load(file)
+    elif extension == ".toml":
+        if tomllib is None:
+            raise ValueError(
+                "reading TOML files requires Python 3.11 or later")
+        with open(path, "rb") as file:
+            spec = tomllib.load(file)
+    else:
+        raise ValueError("unsupported file type '{0}'".format(extension))
+
+    return load_dict(spec)
@@ -0,0 +1,181 @@
+"""Suggest similar item IDs when an ID doesn't exist.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import heapq
+import difflib
+import collections
+from typing import Iterable, List
+
+NGRAM_SIZE = 3
+
+# The number of candidates with the most n-grams in common with a word which
+# are compared with it more precisely.
+CANDIDATES = 20
+
+# N-grams which appear in more than this fraction of the words, like "cmd" in
+# dotted IDs, are too common to tell words apart and aren't counted. N-grams
+# in at most COMMON_MINIMUM words are always counted so that small sets of
+# words aren't affected.
+COMMON_FRACTION = 0.1
+COMMON_MINIMUM = 100
+
+# The minimum similarity of a suggestion, which is the same as the default for
+# difflib.get_close_matches().
+CUTOFF = 0.6
+
+
+def _ngrams(word: str) -> List[str]:
+    """Get the distinct n-grams in a word.
+
+    The word is padded so that short words have n-grams and the start and end
+    of the word are weighted more.
+    """
+    padded = " " + word + " "
+    return list({
+        padded[i:i+NGRAM_SIZE]
+        for i in range(max(1, len(padded) - NGRAM_SIZE + 1))})
+
+
+class Suggester:
+    """Find the words most similar to a given word.
+
+    Words are indexed by their n-grams, so only words which share n-grams with
+    the given word are compared with it. N-grams which appear in a large
+    fraction of the words are skipped, so each lookup only counts the words
+    which share a less common n-gram with the given word. The index is only
+    built the first time suggestions are requested, so adding words is cheap
+    until then.
+
+    Args:
+        words: The words to add.
+
+    Attributes:
+        _words: The set of words that can be suggested.
+        _index: A dict where keys are n-grams and values are sets of the words
+            containing them, or 'None' if it hasn't been built yet.
+        _ngram_counts: A dict where keys are indexed words and values are the
+            number of distinct n-grams in them.
+    """
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self._words = set(words)
+        self._index = None
+        self._ngram_counts = {}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, word: str) -> None:
+        """Add a word that can be suggested."""
+        if word in self._words:
+            return
+
+        self._words.add(word)
+        if self._index is not None:
+            self._index_word(self._index, word)
+
+    def discard(self, word: str) -> None:
+        """Remove a word if it has been added."""
+        if word not in self._words:
+            return
+
+        self._words.remove(word)
+        if self._index is not None:
+            for ngram in _ngrams(word):
+                self._index[ngram].discard(word)
+            del self._ngram_counts[word]
+
+    def _index_word(self, index, word: str) -> None:
+        """Add a word to an n-gram index."""
+        ngrams = _ngrams(word)
+        for ngram in ngrams:
+            index[ngram].add(word)
+        self._ngram_counts[word] = len(ngrams)
+
+    def suggest(self, word: str, limit=3) -> List[str]:
+        """Get the words which are most similar to a word.
+
+        Args:
+            word: The word to find similar words to.
+            limit: The maximum number of suggestions.
+
+        Returns:
+            A list of similar words, most similar first.
+        """
+        index = self._index
+        if index is None:
+            # The index is only assigned once it is complete so that it can be
+            # shared between threads that don't add words.
+            index = collections.defaultdict(set)
+            for indexed_word in self._words:
+                self._index_word(index, indexed_word)
+            self._index = index
+
+        ngrams = _ngrams(word)
+        postings = [index[ngram] for ngram in ngrams if index.get(ngram)]
+        max_postings = max(
+            COMMON_MINIMUM, int(len(self._words) * COMMON_FRACTION))
+        rare_postings = [
+            words for words in postings if len(words) <= max_postings]
+        if not rare_postings and postings:
+            # Every n-gram is common, so only the least common one is used.
+            rare_postings = [min(postings, key=len)]
+
+        shared_counts = collections.Counter()
+        for words in rare_postings:
+            shared_counts.update(words)
+
+        # Rank candidates by the proportion of their n-grams that are shared
+        # so that long words aren't favored.
+        ngram_counts = self._ngram_counts
+        candidates = heapq.nlargest(
+            CANDIDATES, shared_counts, key=lambda candidate: (
+                shared_counts[candidate] / (
+                    len(ngrams) + ngram_counts[candidate]),
+                candidate))
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        scored = []
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if (matcher.real_quick_ratio() >= CUTOFF
+                    and matcher.quick_ratio() >= CUTOFF):
+                ratio = matcher.ratio()
+                if ratio >= CUTOFF:
+                    scored.append((ratio, candidate))
+
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [candidate for ratio, candidate in scored[:limit]]
+
+
+def format_suggestions(suggestions: List[str]) -> str:
+    """Get a phrase listing suggested item IDs for an error message.
+
+    Returns:
+        A string to append to an error message, which is empty if there are
+        no suggestions.
+    """
+    if not suggestions:
+        return ""
+
+    quoted = ["'{0}'".format(suggestion) for suggestion in suggestions]
+    if len(quoted) > 1:
+        quoted = [", ".join(quoted[:-1]), quoted[-1]]
+
+    return "; did you mean {0}?".format(" or ".join(quoted))
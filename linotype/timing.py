@@ -0,0 +1,250 @@
+"""Measure where time is spent when formatting items.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import time
+import threading
+import contextlib
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+# These are the stages that formatting an item is split into.
+STAGES = ["parse", "wrap", "markup", "indent"]
+
+ItemTiming = NamedTuple(
+    "ItemTiming",
+    [("item_id", Optional[str]), ("item_type", str), ("level", int),
+     ("total", float), ("stages", Dict[str, float]), ("output_size", int)])
+ItemTiming.__doc__ = """The time spent formatting a single item.
+
+Attributes:
+    item_id: The ID of the item.
+    item_type: The name of the class of the item.
+    level: The indentation level of the item in the output.
+    total: The total number of seconds spent formatting the item.
+    stages: A dict where keys are the names of stages and values are the
+        number of seconds spent in that stage. The stages are 'parse' for
+        computing the positions of markup, 'wrap' for wrapping text, 'markup'
+        for inserting the strings that apply markup and 'indent' for indenting
+        the output.
+    output_size: The number of characters in the formatted output.
+"""
+
+
+class Counters:
+    """Count operations performed while formatting items.
+
+    These are counted whether or not timings are being recorded.
+
+    Attributes:
+        items_rendered: The number of items that were formatted.
+        parse_calls: The number of times the positions of markup were parsed
+            from a string.
+        cache_hits: The number of times a cached value was reused.
+        regex_compiles: The number of regular expressions that were compiled.
+    """
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all counters to zero."""
+        self.items_rendered = 0
+        self.parse_calls = 0
+        self.cache_hits = 0
+        self.regex_compiles = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        """Get the value of each counter as a dict."""
+        return dict(vars(self))
+
+
+counters = Counters()
+
+
+class Recorder:
+    """Record the time spent formatting each item.
+
+    Args:
+        callback: A function which is called with an ItemTiming instance each
+            time an item is formatted.
+
+    Attributes:
+        callback: A function which is called with an ItemTiming instance each
+            time an item is formatted.
+        timings: A list of ItemTiming instances for every item that was
+            formatted, in the order they were formatted.
+        _stages: The dict of stage times for the item that is currently being
+            formatted.
+    """
+    def __init__(self, callback: Optional[Callable[[ItemTiming], Any]] = None
+                 ) -> None:
+        self.callback = callback
+        self.timings = []
+        self._stages = None
+
+    def record_item(self, item, format_func: Callable[[Any], str]) -> str:
+        """Format an item and record the time spent on it.
+
+        Args:
+            item: The Item object to format.
+            format_func: The function for formatting the item's content.
+
+        Returns:
+            The formatted item.
+        """
+        stages = dict.fromkeys(STAGES, 0.0)
+        previous_stages = self._stages
+        self._stages = stages
+        start = time.perf_counter()
+        try:
+            output = format_func(item.content)
+        finally:
+            end = time.perf_counter()
+            self._stages = previous_stages
+
+        timing = ItemTiming(
+            item.id, type(item).__name__, item.current_level, end - start,
+            stages, len(output) if output else 0)
+        self.add_item(timing, start, end)
+
+        return output
+
+    def add_item(self, timing: ItemTiming, start: float, end: float) -> None:
+        """Store the timing of an item after it has been formatted.
+
+        Args:
+            timing: The time spent formatting the item.
+            start: The value of time.perf_counter() when formatting started.
+            end: The value of time.perf_counter() when formatting ended.
+        """
+        self.timings.append(timing)
+        if self.callback is not None:
+            self.callback(timing)
+
+    def add_stage(self, name: str, start: float, end: float) -> None:
+        """Add the time spent in a stage to the current item.
+
+        Args:
+            name: The name of the stage.
+            start: The value of time.perf_counter() when the stage started.
+            end: The value of time.perf_counter() when the stage ended.
+        """
+        self._stages[name] += end - start
+
+
+class _Stage:
+    """Time a stage of formatting an item.
+
+    Args:
+        recorder: The Recorder to add the time to.
+        name: The name of the stage.
+    """
+    def __init__(self, recorder: Recorder, name: str) -> None:
+        self.recorder = recorder
+        self.name = name
+        self.start = None
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.recorder.add_stage(self.name, self.start, time.perf_counter())
+
+
+class _NullStage:
+    """Do nothing when timings aren't being recorded."""
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+# Each thread and each asyncio task has its own recorder so that items can be
+# formatted in several of them at once. Before Python 3.7, tasks on the same
+# thread share a recorder.
+if contextvars is not None:
+    _recorder_var = contextvars.ContextVar("recorder", default=None)
+else:
+    _local = threading.local()
+
+
+def current_recorder() -> Optional[Recorder]:
+    """Get the Recorder that timings are currently being recorded with."""
+    if contextvars is not None:
+        return _recorder_var.get()
+    return getattr(_local, "recorder", None)
+
+
+def _set_recorder(recorder: Optional[Recorder]) -> None:
+    """Set the Recorder that timings are recorded with."""
+    if contextvars is not None:
+        _recorder_var.set(recorder)
+    else:
+        _local.recorder = recorder
+
+
+def stage(name: str):
+    """Get a context manager that times a stage of formatting an item.
+
+    Args:
+        name: The name of the stage.
+
+    Returns:
+        A context manager that does nothing if no item is being timed.
+    """
+    recorder = current_recorder()
+    if recorder is None or recorder._stages is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name)
+
+
+@contextlib.contextmanager
+def instrument(callback: Optional[Callable[[ItemTiming], Any]] = None,
+               recorder: Optional[Recorder] = None):
+    """Record the time spent formatting each item inside this context.
+
+    Example:
+        >>> with instrument() as recorder:
+        ...     root_item.format()
+        >>> slowest = max(recorder.timings, key=lambda x: x.total)
+
+    Args:
+        callback: A function which is called with an ItemTiming instance each
+            time an item is formatted.
+        recorder: The Recorder object to record timings with. If 'None,' a new
+            one is created.
+
+    Yields:
+        The Recorder object that timings are recorded with.
+    """
+    if recorder is None:
+        recorder = Recorder(callback)
+
+    previous_recorder = current_recorder()
+    _set_recorder(recorder)
+    try:
+        yield recorder
+    finally:
+        _set_recorder(previous_recorder)
@@ -0,0 +1,139 @@
+"""Find item IDs which match a glob pattern.
+
+Item IDs are often dotted paths like 'cmd.sync.options.exclude'. IDs are
+stored in a trie where each level is one segment of the path, so a pattern
+only visits the parts of the trie that can match it.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import fnmatch
+from typing import Dict, Iterable, List
+
+SEPARATOR = "."
+
+# A pattern segment which matches any number of segments, including none.
+RECURSIVE_WILDCARD = "**"
+
+GLOB_CHARS = set("*?[")
+
+
+class IdTrie:
+    """A trie of item IDs split into segments.
+
+    The trie is only built the first time it is searched, so adding IDs is
+    cheap until then.
+
+    Args:
+        item_ids: The IDs to add.
+
+    Attributes:
+        _ids: The set of IDs in the trie.
+        _root: The root node of the trie, or 'None' if it hasn't been built
+            yet. Each node is a dict where keys are segments and values are
+            child nodes. The key 'None' maps to the ID which ends at that
+            node.
+    """
+    def __init__(self, item_ids: Iterable[str] = ()) -> None:
+        self._ids = set(item_ids)
+        self._root = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _insert(root: Dict, item_id: str) -> None:
+        """Add an ID to a trie."""
+        node = root
+        for segment in item_id.split(SEPARATOR):
+            node = node.setdefault(segment, {})
+        node[None] = item_id
+
+    def add(self, item_id: str) -> None:
+        """Add an ID to the trie."""
+        if item_id in self._ids:
+            return
+
+        self._ids.add(item_id)
+        if self._root is not None:
+            self._insert(self._root, item_id)
+
+    def discard(self, item_id: str) -> None:
+        """Remove an ID if it has been added."""
+        if item_id not in self._ids:
+            return
+
+        self._ids.remove(item_id)
+        if self._root is not None:
+            node = self._root
+            for segment in item_id.split(SEPARATOR):
+                node = node[segment]
+            del node[None]
+
+    def match(self, pattern: str) -> List[str]:
+        """Find the IDs which match a pattern.
+
+        The pattern is split into segments in the same way as IDs. Each
+        segment is matched against one segment of an ID using the rules of
+        fnmatch, so '*' matches a whole segment and 'opt*' matches segments
+        starting with 'opt'. The segment '**' matches any number of segments,
+        so 'cmd.**' matches 'cmd' and every ID that starts with 'cmd.'.
+
+        Args:
+            pattern: The pattern to match.
+
+        Returns:
+            A sorted list of matching IDs.
+        """
+        root = self._root
+        if root is None:
+            root = {}
+            for item_id in self._ids:
+                self._insert(root, item_id)
+            self._root = root
+
+        segments = pattern.split(SEPARATOR)
+        matches = set()
+        visited = set()
+        pending = [(root, 0)]
+        while pending:
+            node, index = pending.pop()
+            # Recursive wildcards can reach the same node in more than one way.
+            if (id(node), index) in visited:
+                continue
+            visited.add((id(node), index))
+
+            if index == len(segments):
+                if None in node:
+                    matches.add(node[None])
+                continue
+
+            segment = segments[index]
+            if segment == RECURSIVE_WILDCARD:
+                # Either stop matching this segment or consume one more.
+                pending.append((node, index + 1))
+                pending.extend(
+                    (child, index) for key, child in node.items()
+                    if key is not None)
+            elif GLOB_CHARS.intersection(segment):
+                pending.extend(
+                    (child, index + 1) for key, child in node.items()
+                    if key is not None and fnmatch.fnmatchcase(key, segment))
+            elif segment in node:
+                pending.append((node[segment], index + 1))
+
+        return sorted(matches)
@@ -20,6 +20,7 @@ along with linotype.  If not, see <http://www.gnu.org/licenses/>.
 import pytest
 
 from linotype import ansi_format
+from linotype.ansi import use_ansi
 
 
 def test_foreground_color():
@@ -52,3 +53,23 @@ def test_hex_color(color_spec):
 def test_multiple_styles():
     """Using multiple styles results in correct output."""
     assert ansi_format(bold=True, underline=True) == ("\x1b[1;4m", "\x1b[0m")
+
+
+class FakeTerminal:
+    def isatty(self):
+        return True
+
+
+def test_use_ansi(monkeypatch):
+    """ANSI escape sequences are only used for terminals."""
+    monkeypatch.delenv("NO_COLOR", raising=False)
+    assert use_ansi(FakeTerminal())
+    assert not use_ansi(object())
+
+
+def test_use_ansi_no_color(monkeypatch):
+    """ANSI escape sequences aren't used if NO_COLOR is set."""
+    monkeypatch.setenv("NO_COLOR", "1")
+    assert not use_ansi(FakeTerminal())
+    monkeypatch.setenv("NO_COLOR", "")
+    assert use_ansi(FakeTerminal())
@@ -0,0 +1,83 @@
+"""Test 'completion.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import sys
+import subprocess
+
+import pytest
+
+from linotype import Item
+from linotype.completion import (
+    Completion, CompletionIndex, build_completion_index,
+    write_completion_index)
+
+
+@pytest.fixture
+def root_item():
+    root_item = Item()
+    commands = root_item.add_text("Commands:")
+    add = commands.add_def("add", "task", "Add a task.", item_id="add")
+    options = add.add_text("Options:")
+    options.add_def("--priority", "*number*", "The priority.")
+    options.add_def("--note", "text", "A note.")
+    commands.add_def("archive", "", "Archive tasks.", item_id="archive")
+    root_item.add_def("--help", "", "Show help.")
+    return root_item
+
+
+def test_build_completion_index(root_item):
+    """Definitions are grouped under their nearest ancestor with an ID."""
+    assert build_completion_index(root_item) == {
+        "": [["--help", ""], ["add", "task"], ["archive", ""]],
+        "add": [["--note", "text"], ["--priority", "number"]]}
+
+
+def test_complete(root_item, tmp_path):
+    """Terms are completed by prefix."""
+    path = str(tmp_path / "completion.idx")
+    write_completion_index(root_item, path)
+    index = CompletionIndex.load(path)
+
+    assert index.complete("a") == [
+        Completion("add", "task"), Completion("archive", "")]
+    assert index.complete("ad") == [Completion("add", "task")]
+    assert index.complete("--p", group="add") == [
+        Completion("--priority", "number")]
+    assert index.complete("", group="add") == [
+        Completion("--note", "text"), Completion("--priority", "number")]
+    assert index.complete("x") == []
+    assert index.complete("", group="missing") == []
+
+
+def test_unsupported_version():
+    """Indices written by other versions are rejected."""
+    with pytest.raises(ValueError):
+        CompletionIndex('{"version": 0}\n')
+
+
+def test_loader_does_not_import_docutils(root_item, tmp_path):
+    """Completing terms doesn't import docutils."""
+    path = str(tmp_path / "completion.idx")
+    write_completion_index(root_item, path)
+    code = (
+        "import sys\n"
+        "from linotype.completion import CompletionIndex\n"
+        "CompletionIndex.load({0!r}).complete('a')\n"
+        "assert 'docutils' not in sys.modules\n").format(path)
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,41 @@
+"""Configure the test suite.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--scaling", action="store_true", default=False,
+        help="run the tests that check how operations scale with input size")
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "scaling: check how an operation scales with input size")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--scaling"):
+        return
+
+    skip_scaling = pytest.mark.skip(reason="needs the --scaling option")
+    for item in items:
+        if "scaling" in item.keywords:
+            item.add_marker(skip_scaling)
@@ -17,17 +17,26 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with linotype.  If not, see <http://www.gnu.org/licenses/>.
 """
+import io
+import os
+import re
 import textwrap
 
 import pytest
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
 from docutils.frontend import OptionParser
 from docutils.parsers.rst import Parser
 from docutils.parsers.rst import directives
 from docutils.utils import new_document
 
+from linotype import ext
 from linotype.ext import LinotypeDirective
 from linotype import Item
 
+# The number of times get_counted_test_item() has been called.
+build_count = 0
+
 
 def get_test_item():
     root_item = Item()
@@ -42,6 +51,12 @@ def get_test_item():
     return root_item
 
 
+def get_counted_test_item():
+    global build_count
+    build_count += 1
+    return get_test_item()
+
+
 def get_simple_test_item():
     root_item = Item()
     root_item.add_text("This is the *parent* text item.", item_id="text")
@@ -60,6 +75,52 @@ def parse_rst(text: str) -> str:
     return document.pformat()
 
 
+def build_sphinx(srcdir, documents, parallel=1, read_docs=None, status=None,
+                 **kwargs) -> str:
+    """Build a Sphinx project using the 'linotype' directive.
+
+    Files are only written if their content changed so that the build can be
+    incremental.
+
+    Args:
+        srcdir: The directory to create the project in.
+        documents: A dict where keys are document names and values are their
+            reStructuredText content.
+        parallel: The number of processes to build with.
+        read_docs: A list to append the names of documents which were read to.
+        status: A file object to write the status output of the build to.
+        kwargs: Extra arguments to pass to the Sphinx application.
+
+    Returns:
+        The warnings emitted during the build.
+    """
+    files = {"conf.py": textwrap.dedent("""\
+        extensions = ["linotype.ext"]
+        master_doc = "index"
+        """)}
+    for name, content in documents.items():
+        files[name + ".rst"] = content
+    for name, content in files.items():
+        path = srcdir / name
+        if not path.exists() or path.read_text() != content:
+            path.write_text(content)
+
+    warnings = io.StringIO()
+    outdir = srcdir / "_build"
+    with docutils_namespace():
+        app = Sphinx(
+            str(srcdir), str(srcdir), str(outdir / "html"),
+            str(outdir / "doctrees"), "html", status=status, warning=warnings,
+            parallel=parallel, **kwargs)
+        if read_docs is not None:
+            app.connect(
+                "env-before-read-docs",
+                lambda app, env, docnames: read_docs.extend(docnames))
+        app.build()
+
+    return warnings.getvalue()
+
+
 def test_option_module():
     """The :module: option imports the function from the specified module."""
     rst = textwrap.dedent("""\
@@ -187,6 +248,21 @@ def test_option_item_id():
     assert output == expected
 
 
+def test_option_item_id_unknown():
+    """An unknown :item_id: is reported with similar IDs."""
+    rst = textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_test_item
+            :item_id: parent_txt
+        """)
+
+    output = parse_rst(rst)
+
+    assert "an item with the ID 'parent_txt' does not exist" in output
+    assert "did you mean 'parent_text'" in output
+
+
 def test_option_children():
     """The :children: option shows hides the item."""
     rst = textwrap.dedent("""\
@@ -685,3 +761,355 @@ def test_extend_multiple():
     output = textwrap.dedent(parse_rst(rst))
 
     assert output == expected
+
+
+def test_tree_is_cached():
+    """The tree is only built once for directives using the same function."""
+    ext._tree_cache.clear()
+    rst = textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_counted_test_item
+            :item_id: parent_text
+
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_counted_test_item
+            :item_id: definition
+        """)
+
+    previous_count = build_count
+    parse_rst(rst)
+
+    assert build_count == previous_count + 1
+
+
+def test_tree_cache_is_scoped_to_document():
+    """Without Sphinx, trees are only reused within the same document."""
+    rst = textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_counted_test_item
+        """)
+
+    previous_count = build_count
+    parse_rst(rst)
+    parse_rst(rst)
+
+    assert build_count == previous_count + 2
+
+
+def test_tree_cache_is_scoped_to_build(tmp_path):
+    """Each Sphinx build calls the builder function again."""
+    documents = {"index": textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_counted_test_item
+        """)}
+
+    previous_count = build_count
+    build_sphinx(tmp_path, documents)
+    build_sphinx(tmp_path, documents, freshenv=True)
+
+    assert build_count == previous_count + 2
+
+
+def test_option_children_does_not_modify_cached_tree():
+    """The :children: option doesn't affect other directives."""
+    ext._tree_cache.clear()
+    rst = textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_test_item
+            :item_id: parent_text
+            :children:
+
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_test_item
+            :item_id: parent_text
+        """)
+
+    expected = textwrap.dedent("""\
+        <document source="test">
+            <paragraph>
+                This is the child text item.
+            <paragraph>
+                This is the 
+                <emphasis>
+                    parent
+                 text item.
+            <definition_list>
+                <definition_list_item>
+                    <term>
+                    <definition>
+                        <paragraph>
+                            This is the child text item.
+        """)
+
+    output = textwrap.dedent(parse_rst(rst))
+
+    assert output == expected
+
+
+def test_cached_tree_is_rebuilt_when_file_changes(tmp_path):
+    """The cached tree is rebuilt when the file it came from changes."""
+    ext._tree_cache.clear()
+    builder_path = tmp_path / "builder.py"
+    rst = textwrap.dedent("""\
+        .. linotype::
+            :filepath: {0}
+            :function: help_message
+        """.format(builder_path))
+    builder_code = textwrap.dedent("""\
+        from linotype import Item
+
+        def help_message():
+            root_item = Item()
+            root_item.add_text({0!r})
+            return root_item
+        """)
+
+    builder_path.write_text(builder_code.format("First version."))
+    assert "First version." in parse_rst(rst)
+
+    builder_path.write_text(builder_code.format("The second version."))
+    assert "The second version." in parse_rst(rst)
+
+
+def test_parallel_build(tmp_path):
+    """The extension is safe for parallel builds."""
+    directive = textwrap.dedent("""\
+        Title
+        =====
+
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_test_item
+        """)
+    documents = {"doc{0}".format(i): directive for i in range(8)}
+    documents["index"] = ".. toctree::\n\n" + "".join(
+        "   doc{0}\n".format(i) for i in range(8))
+
+    warnings = build_sphinx(tmp_path, documents, parallel=2)
+
+    assert "parallel" not in warnings
+    for i in range(8):
+        html = (tmp_path / "_build" / "html" / "doc{0}.html".format(
+            i)).read_text()
+        assert "List information about" in html
+
+
+def write_builder(path, text: str, mtime_offset=0) -> None:
+    """Write a file containing a function that builds a tree of items.
+
+    Args:
+        path: The path of the file to write.
+        text: The text of the item in the tree.
+        mtime_offset: The number of seconds to move the modification time of
+            the file forward by. This makes sure that Sphinx sees that the
+            file changed regardless of the resolution of the clock.
+    """
+    path.write_text(textwrap.dedent("""\
+        from linotype import Item
+
+        def help_message():
+            root_item = Item()
+            root_item.add_text({0!r})
+            return root_item
+        """).format(text))
+    if mtime_offset:
+        stat = path.stat()
+        os.utime(str(path), (stat.st_atime, stat.st_mtime + mtime_offset))
+
+
+def test_changed_builder_rebuilds_dependent_documents(tmp_path):
+    """Only documents using a builder that changed are read again."""
+    first_path = tmp_path / "first_builder.py"
+    second_path = tmp_path / "second_builder.py"
+    write_builder(first_path, "First builder.")
+    write_builder(second_path, "Second builder.")
+    directive = textwrap.dedent("""\
+        Title
+        =====
+
+        .. linotype::
+            :filepath: {0}
+            :function: help_message
+        """)
+    documents = {
+        "index": ".. toctree::\n\n   first\n   second\n",
+        "first": directive.format(first_path),
+        "second": directive.format(second_path)}
+
+    build_sphinx(tmp_path, documents)
+
+    read_docs = []
+    build_sphinx(tmp_path, documents, read_docs=read_docs)
+    assert read_docs == []
+
+    write_builder(first_path, "First builder, changed.", mtime_offset=10)
+    build_sphinx(tmp_path, documents, read_docs=read_docs)
+    assert read_docs == ["first"]
+
+    html = (tmp_path / "_build" / "html" / "first.html").read_text()
+    assert "First builder, changed." in html
+
+
+def test_track_imports(tmp_path, monkeypatch):
+    """Modules imported by the builder are dependencies if enabled."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helper_path = tmp_path / "linotype_test_helper.py"
+    helper_path.write_text("TEXT = 'Imported text.'\n")
+    builder_path = tmp_path / "builder.py"
+    builder_path.write_text(textwrap.dedent("""\
+        import os
+        from linotype import Item
+        from linotype_test_helper import TEXT
+
+        def help_message():
+            root_item = Item()
+            root_item.add_text(TEXT)
+            return root_item
+        """))
+    documents = {
+        "index": textwrap.dedent("""\
+            Title
+            =====
+
+            .. linotype::
+                :filepath: {0}
+                :function: help_message
+            """).format(builder_path)}
+    overrides = {"linotype_track_imports": True}
+
+    build_sphinx(tmp_path, documents, confoverrides=overrides)
+
+    helper_path.write_text("TEXT = 'Changed text.'\n")
+    stat = helper_path.stat()
+    os.utime(str(helper_path), (stat.st_atime, stat.st_mtime + 10))
+    read_docs = []
+    build_sphinx(
+        tmp_path, documents, read_docs=read_docs, confoverrides=overrides)
+
+    assert read_docs == ["index"]
+
+
+def test_find_imported_files_skips_libraries(tmp_path):
+    """Modules in the standard library and site-packages are skipped."""
+    path = tmp_path / "builder.py"
+    path.write_text("import os\nimport textwrap\nimport docutils.nodes\n")
+
+    assert ext._find_imported_files(str(path), None) == []
+
+
+def test_nodes_are_reused_between_builds(tmp_path, monkeypatch):
+    """Directives that didn't change reuse the nodes from the last build."""
+    builder_path = tmp_path / "builder.py"
+    write_builder(builder_path, "Builder text.")
+    directive = textwrap.dedent("""\
+        {0}
+        =====
+
+        .. linotype::
+            :filepath: {1}
+            :function: help_message
+        """)
+    documents = {
+        "index": ".. toctree::\n\n   page\n",
+        "page": directive.format("First", builder_path)}
+    build_sphinx(tmp_path, documents)
+
+    parse_calls = []
+    original_parse_tree = LinotypeDirective._parse_tree
+
+    def counted_parse_tree(self, *args, **kwargs):
+        parse_calls.append(self.lineno)
+        return original_parse_tree(self, *args, **kwargs)
+
+    monkeypatch.setattr(LinotypeDirective, "_parse_tree", counted_parse_tree)
+
+    read_docs = []
+    documents["page"] = directive.format("Other", builder_path)
+    build_sphinx(tmp_path, documents, read_docs=read_docs)
+
+    assert read_docs == ["page"]
+    assert parse_calls == []
+    html = (tmp_path / "_build" / "html" / "page.html").read_text()
+    assert "Builder text." in html
+
+    write_builder(builder_path, "Changed text.", mtime_offset=10)
+    build_sphinx(tmp_path, documents)
+
+    assert len(parse_calls) == 1
+    html = (tmp_path / "_build" / "html" / "page.html").read_text()
+    assert "Changed text." in html
+
+
+def test_included_content_is_updated(tmp_path):
+    """Files included by the directive content are read again if changed."""
+    snippet_path = tmp_path / "snippet.txt"
+    snippet_path.write_text("First snippet.\n")
+    documents = {"index": textwrap.dedent("""\
+        Title
+        =====
+
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_simple_test_item
+
+            text : @rst
+                .. include:: snippet.txt
+        """)}
+    html_path = tmp_path / "_build" / "html" / "index.html"
+
+    build_sphinx(tmp_path, documents)
+    assert "First snippet." in html_path.read_text()
+
+    for text in ["Second snippet.", "Third snippet."]:
+        snippet_path.write_text(text + "\n")
+        stat = snippet_path.stat()
+        os.utime(str(snippet_path), (stat.st_atime, stat.st_mtime + 10))
+        read_docs = []
+        build_sphinx(tmp_path, documents, read_docs=read_docs)
+
+        assert read_docs == ["index"]
+        assert text in html_path.read_text()
+
+
+def test_report_slowest(tmp_path):
+    """The slowest directives and cache statistics are logged."""
+    directive = textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_test_item
+            :item_id: {0}
+        """)
+    documents = {"index": "Title\n=====\n\n" + directive.format(
+        "parent_text") + "\n" + directive.format("definition")}
+    status = io.StringIO()
+
+    build_sphinx(
+        tmp_path, documents, status=status,
+        confoverrides={"linotype_report_slowest": 1})
+
+    output = status.getvalue()
+    assert "linotype: 2 directives" in output
+    assert "tree cache: 1 hits, 1 misses" in output
+    assert "node cache: 0 hits, 2 misses" in output
+    assert "slowest linotype directives:" in output
+    assert len(re.findall(r"index\.rst:\d+ \(import", output)) == 1
+
+
+def test_report_slowest_disabled(tmp_path):
+    """Nothing is logged unless enabled."""
+    documents = {"index": textwrap.dedent("""\
+        .. linotype::
+            :module: tests.ext_test
+            :function: get_test_item
+        """)}
+    status = io.StringIO()
+
+    build_sphinx(tmp_path, documents, status=status)
+
+    assert "linotype:" not in status.getvalue()
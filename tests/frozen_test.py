@@ -0,0 +1,135 @@
+"""Test 'frozen.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import threading
+
+import pytest
+
+from linotype import DefStyle, Formatter, Item
+from linotype.frozen import KIND_DEFINITION, KIND_ROOT, KIND_TEXT
+
+
+def build_tree(def_style=DefStyle.PARAGRAPH) -> Item:
+    """Build a tree with nested text and definition items."""
+    def formatter():
+        return Formatter(
+            max_width=50, auto_width=False, def_style=def_style)
+
+    root_item = Item(formatter())
+    commands = root_item.add_text(
+        "Commands:", formatter=formatter(), item_id="commands")
+    add = commands.add_def(
+        "add", "[options] task", "Add a new task to the end of the list of "
+        "tasks and print its number.", formatter=formatter(), item_id="add")
+    add.add_text(
+        "Tasks can have a *priority*, which is set with **--priority**.",
+        formatter=formatter(), item_id="add_note")
+    add.add_def(
+        "--priority", "number", "The priority of the task.",
+        formatter=formatter(), item_id="priority")
+    commands.add_def(
+        "remove", "task", "Remove a task.", formatter=formatter(),
+        item_id="remove")
+    options = root_item.add_text(
+        "Options:", formatter=formatter(), item_id="options")
+    options.add_def(
+        "--help", "", "Show this help message and exit.",
+        formatter=formatter(), item_id="help")
+    hidden = options.add_text(
+        "Hidden text.", formatter=Formatter(visible=False))
+    hidden.add_text("Text under hidden text.", formatter=formatter())
+    return root_item
+
+
+@pytest.mark.parametrize("def_style", list(DefStyle))
+@pytest.mark.parametrize("item_id", [None, "commands", "add", "help"])
+@pytest.mark.parametrize("levels", [None, 0, 1, 2])
+def test_format(def_style, item_id, levels):
+    """Frozen trees are formatted the same as item trees."""
+    root_item = build_tree(def_style)
+    frozen_tree = root_item.freeze()
+    expected = root_item.format(levels=levels, item_id=item_id)
+    assert frozen_tree.format(levels=levels, item_id=item_id) == expected
+
+
+def test_arrays():
+    """Items are stored in preorder."""
+    frozen_tree = build_tree().freeze()
+    assert len(frozen_tree) == 10
+    assert frozen_tree.parents == (-1, 0, 1, 2, 2, 1, 0, 6, 6, 8)
+    assert frozen_tree.depths == (0, 1, 2, 3, 3, 2, 1, 2, 2, 3)
+    assert frozen_tree.kinds[:3] == (KIND_ROOT, KIND_TEXT, KIND_DEFINITION)
+    assert frozen_tree.subtree_sizes == (10, 5, 3, 1, 1, 1, 4, 1, 2, 1)
+    assert frozen_tree.contents[2] == (
+        "add", "[options] task", "Add a new task to the end of the list of "
+        "tasks and print its number.")
+    assert frozen_tree.ids[frozen_tree.get_index("remove")] == "remove"
+
+
+def test_formatters_are_shared():
+    """Items with the same Formatter settings share an entry."""
+    frozen_tree = build_tree().freeze()
+    assert len(frozen_tree.formatters) == 2
+    assert not frozen_tree.formatters[
+        frozen_tree.formatter_indices[-2]].visible
+
+
+def test_iter_indices():
+    """Descendants below the level cutoff are skipped."""
+    frozen_tree = build_tree().freeze()
+    assert list(frozen_tree.iter_indices(levels=1)) == [0, 1, 6]
+    assert list(frozen_tree.iter_indices(levels=1, item_id="add")) == [
+        2, 3, 4]
+
+
+def test_unknown_item_id():
+    """An error is raised for an ID that doesn't exist."""
+    with pytest.raises(ValueError):
+        build_tree().freeze().format(item_id="missing")
+
+
+def test_frozen_tree_is_independent():
+    """Changing the item tree doesn't change the frozen tree."""
+    root_item = build_tree()
+    frozen_tree = root_item.freeze()
+    expected = frozen_tree.format()
+    root_item.get_item_by_id("add").add_text("New text.")
+    root_item.get_item_by_id("help").formatter.max_width = 20
+    assert frozen_tree.format() == expected
+    with pytest.raises(AttributeError):
+        frozen_tree.formatters[0].max_width = 20
+
+
+def test_threads():
+    """Frozen trees can be formatted from multiple threads."""
+    frozen_tree = build_tree().freeze()
+    expected = build_tree().format()
+    results = []
+
+    def format_tree():
+        for _ in range(20):
+            results.append(frozen_tree.format())
+
+    threads = [threading.Thread(target=format_tree) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [expected] * 80
@@ -0,0 +1,102 @@
+"""Test 'html.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import textwrap
+
+import pytest
+
+from linotype import Formatter, Item
+from linotype.html import iter_html, render_html
+
+
+@pytest.fixture
+def root_item():
+    """Return a tree of items with IDs."""
+    root_item = Item(Formatter(auto_markup=True, manual_markup=True))
+    usage = root_item.add_text("Usage: todo <command>", item_id="usage")
+    usage.add_def(
+        "add", "task", "Add *task* to the list.", item_id="add")
+    remove = usage.add_def("remove", "", "Remove a task.", item_id="remove")
+    remove.add_text("Tasks can't be recovered.")
+    usage.add_text("Run **todo help** for more information.")
+    return root_item
+
+
+def test_render_html(root_item):
+    """Items are rendered as paragraphs and definition lists."""
+    expected = textwrap.dedent("""\
+        <div class="linotype">
+        <p>Usage: todo &lt;command&gt;</p>
+        <div class="linotype-indent">
+        <dl>
+        <dt><strong>add</strong> <em>task</em></dt>
+        <dd><p>Add <em>task</em> to the list.</p>
+        </dd>
+        <dt><strong>remove</strong></dt>
+        <dd><p>Remove a task.</p>
+        <p>Tasks can't be recovered.</p>
+        </dd>
+        </dl>
+        <p>Run <strong>todo help</strong> for more information.</p>
+        </div>
+        </div>
+        """)
+
+    assert render_html(root_item) == expected
+
+
+def test_render_html_item_id(root_item):
+    """Only the item with the given ID and its children are rendered."""
+    expected = textwrap.dedent("""\
+        <div class="linotype">
+        <dl>
+        <dt><strong>remove</strong></dt>
+        <dd><p>Remove a task.</p>
+        </dd>
+        </dl>
+        </div>
+        """)
+
+    assert render_html(root_item, item_id="remove", levels=0) == expected
+
+
+def test_render_html_no_markup(root_item):
+    """Markup isn't applied if it's disabled in the formatter."""
+    for item in root_item.get_items():
+        item.formatter.auto_markup = False
+        item.formatter.manual_markup = False
+
+    output = render_html(root_item, item_id="add")
+
+    assert "<dt>add task</dt>" in output
+    assert "<p>Add *task* to the list.</p>" in output
+
+
+def test_iter_html_streams(root_item):
+    """The output is produced in pieces."""
+    chunks = list(iter_html(root_item))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == render_html(root_item)
+
+
+def test_render_html_unknown_id(root_item):
+    """Rendering an item that doesn't exist raises an exception."""
+    with pytest.raises(ValueError):
+        render_html(root_item, item_id="missing")
@@ -17,11 +17,18 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with linotype.  If not, see <http://www.gnu.org/licenses/>.
 """
+import io
+import asyncio
+import copy
 import textwrap
 
 import pytest
 
 from linotype import DefStyle, Formatter, Item, ansi_format
+from linotype.items import FormattedLine, MarkupPositions, iter_markup
+from linotype.suggest import Suggester
+from linotype.timing import counters
+from linotype.trie import IdTrie
 
 
 @pytest.fixture
@@ -316,3 +323,312 @@ def test_duplicate_ids(formatter):
     root_item.add_text("foo", item_id="duplicate")
     with pytest.raises(ValueError):
         root_item.add_text("bar", item_id="duplicate")
+
+
+def test_root_layout_is_empty(formatter):
+    """The root of a tree has an empty layout."""
+    root_item = Item(formatter)
+    assert root_item._format(None) == ""
+
+
+def test_children_share_tree_state(formatter, monkeypatch):
+    """Only the root item creates the state shared by the tree."""
+    created = []
+
+    def counting(name, cls):
+        def create():
+            created.append(name)
+            return cls()
+        return create
+
+    monkeypatch.setattr(
+        "linotype.items.Suggester", counting("suggester", Suggester))
+    monkeypatch.setattr("linotype.items.IdTrie", counting("trie", IdTrie))
+
+    root_item = Item(formatter)
+    child = root_item.add_text("foo", item_id="foo")
+    grandchild = child.add_def("bar", "", "baz")
+
+    assert created == ["suggester", "trie"]
+    for item in (child, grandchild):
+        assert item._ids is root_item._ids
+        assert item._lazy_ids is root_item._lazy_ids
+        assert item._observers is root_item._observers
+
+
+def test_iter_markup():
+    """Nested markup is split into text and the start and end of markup."""
+    positions = MarkupPositions(
+        [("--opt value", 0)], [("value", 0), ("value", 1)])
+    events = list(iter_markup("Use --opt value to set value.", positions))
+
+    assert events == [
+        ("text", "Use "), ("start", "strong"), ("text", "--opt "),
+        ("start", "em"), ("text", "value"), ("end", "em"), ("text", ""),
+        ("end", "strong"), ("text", " to set "), ("start", "em"),
+        ("text", "value"), ("end", "em"), ("text", ".")]
+
+
+def test_iter_markup_skips_overlapping_spans():
+    """Spans which overlap an enclosing span are skipped."""
+    positions = MarkupPositions([("one two", 0)], [("two three", 0)])
+    events = list(iter_markup("one two three", positions))
+
+    assert events == [
+        ("text", ""), ("start", "strong"), ("text", "one two"),
+        ("end", "strong"), ("text", " three")]
+
+
+def test_prepared_parts_are_reused(formatter):
+    """Markup is only parsed again when the content or settings change."""
+    formatter.manual_markup = True
+    formatter.auto_markup = True
+    root_item = Item(formatter)
+    definition = root_item.add_def("add", "task", "Add a **task**.")
+    root_item.format()
+
+    counters.reset()
+    root_item.format()
+    assert counters.parse_calls == 0
+
+    definition.content[2] = "Add a *task*."
+    assert "\x1b[4mtask" in root_item.format()
+    assert counters.parse_calls > 0
+
+
+@pytest.mark.parametrize("def_style", [DefStyle.INLINE, DefStyle.ALIGNED])
+def test_definition_tabs(formatter, def_style):
+    """Tab stops in messages count the signature before the message."""
+    formatter.def_style = def_style
+    root_item = Item(formatter)
+    root_item.add_def("ls", "", "tabs\there")
+
+    assert root_item.format() == "ls  tabs        here"
+
+
+def test_format_many(formatter):
+    """Each width and profile is the same as formatting separately."""
+    formatter.auto_markup = True
+    plain = {"strong": ("", ""), "em": ("", "")}
+
+    def build_tree(width=79, overrides=None):
+        tree_formatter = copy.copy(formatter)
+        tree_formatter.max_width = width
+        for key, value in (overrides or {}).items():
+            setattr(tree_formatter, key, value)
+        root_item = Item(tree_formatter)
+        text_item = root_item.add_text("Commands:", item_id="commands")
+        text_item.add_def(
+            "add", "task", "Add the task to the end of the list of tasks.")
+        return root_item
+
+    output = build_tree().format_many(
+        [30, 50], profiles={"color": {}, "plain": plain},
+        item_id="commands")
+
+    assert output == {
+        (width, name): build_tree(width, overrides).format(
+            item_id="commands")
+        for width in [30, 50]
+        for name, overrides in [("color", {}), ("plain", plain)]}
+
+
+def test_format_many_restores_tree(formatter):
+    """The tree isn't changed by formatting it many times."""
+    root_item = Item(formatter)
+    root_item.add_text("Commands:", item_id="commands").add_text("Add.")
+    expected_output = root_item.format()
+
+    formatters = [item.formatter for item in root_item.get_items()]
+
+    root_item.format_many(
+        [20, 40], profiles={"narrow": {"indent_spaces": 2}},
+        item_id="commands")
+    assert root_item.format() == expected_output
+    assert [item.formatter for item in root_item.get_items()] == formatters
+    assert formatter.indent_spaces == 4
+    with pytest.raises(ValueError):
+        root_item.format_many([20], profiles={"bad": {"width": 20}})
+
+
+def test_format_many_plain(formatter):
+    """Profiles can leave out the strings which apply markup."""
+    formatter.manual_markup = True
+    formatter.strong = ("<", ">")
+    root_item = Item(formatter)
+    root_item.add_text("Some **commands**.")
+
+    output = root_item.format_many(
+        [40], profiles={"color": {}, "plain": {"plain": True}})
+
+    assert output == {
+        (40, "color"): "Some <commands>.",
+        (40, "plain"): "Some commands."}
+
+
+def test_format_many_aligned_subtree(formatter):
+    """Definitions are aligned with siblings outside of the subtree."""
+    formatter.def_style = DefStyle.ALIGNED
+    root_item = Item(formatter)
+    root_item.add_def("ls", "", "List files.", item_id="ls")
+    root_item.add_def("mkdir", "dir", "Make a directory.")
+
+    output = root_item.format_many([40], item_id="ls")
+
+    assert output == {(40, "default"): root_item.format(item_id="ls")}
+
+
+@pytest.mark.parametrize("def_style", list(DefStyle))
+def test_plain(formatter, def_style):
+    """Plain output is the same as styled output without markup."""
+    formatter.auto_markup = True
+    formatter.manual_markup = True
+    formatter.def_style = def_style
+    formatter.strong = ("<", ">")
+    formatter.em = ("[", "]")
+    root_item = Item(formatter)
+    text_item = root_item.add_text("Some **commands**:", item_id="commands")
+    text_item.add_def(
+        "add", "task", "Add the *task* to the end of the list of tasks.")
+
+    styled_output = root_item.format()
+    for char in "<>[]":
+        styled_output = styled_output.replace(char, "")
+
+    assert root_item.format(plain=True) == styled_output
+    assert root_item.freeze().format(plain=True) == styled_output
+    assert "*" not in styled_output
+
+
+def test_print(formatter):
+    """Markup is left out when the stream isn't a terminal."""
+    formatter.manual_markup = True
+    root_item = Item(formatter)
+    root_item.add_text("Some **commands**.")
+
+    file = io.StringIO()
+    root_item.print(file=file)
+    assert file.getvalue() == "Some commands.\n"
+
+    file = io.StringIO()
+    root_item.print(file=file, plain=False)
+    assert file.getvalue() == root_item.format() + "\n"
+
+
+def test_format_does_not_change_tree(formatter):
+    """Formatting an item doesn't change how the tree is formatted later."""
+    root_item = Item(formatter)
+    parent = root_item.add_text("Parent.", item_id="parent")
+    parent.add_text("Child.", item_id="child").add_text("Grandchild.")
+    expected_output = root_item.format()
+
+    assert root_item.format(item_id="child") == "Child.\n    Grandchild."
+    assert root_item.format(item_id="child") == "Child.\n    Grandchild."
+    assert root_item.format() == expected_output
+
+
+def build_lines_tree(formatter) -> Item:
+    formatter.max_width = 30
+    root_item = Item(formatter)
+    commands = root_item.add_text("Commands:", item_id="commands")
+    commands.add_def(
+        "add", "task", "Add the task to the end of the list of tasks.",
+        item_id="add")
+    commands.add_text("That is all.")
+    return root_item
+
+
+def test_iter_lines(formatter):
+    """Lines are tagged with their item and level."""
+    root_item = build_lines_tree(formatter)
+    lines = list(root_item.iter_lines())
+
+    assert [line.text for line in lines] == root_item.format().split("\n")
+    assert [(line.item_id, line.level) for line in lines] == (
+        [("commands", 0)] + [("add", 1)]*(len(lines) - 2) + [(None, 1)])
+
+
+def test_iter_lines_window(formatter):
+    """Only the lines in the window are yielded."""
+    root_item = build_lines_tree(formatter)
+    all_lines = list(root_item.iter_lines())
+
+    assert list(root_item.iter_lines(start_line=2, max_lines=2)) == (
+        all_lines[2:4])
+    assert list(root_item.iter_lines(start_line=10)) == []
+    assert list(root_item.iter_lines(max_lines=0)) == []
+    assert list(root_item.iter_lines(item_id="add", max_lines=1)) == [
+        FormattedLine("add task", "add", 0)]
+
+
+def test_iter_lines_stops_early(formatter):
+    """Items after the last line aren't formatted."""
+    root_item = build_lines_tree(formatter)
+
+    counters.reset()
+    list(root_item.iter_lines(max_lines=1))
+    assert counters.items_rendered == 1
+
+
+def run_coroutine(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_format_async(formatter):
+    """Formatting asynchronously gives the same output."""
+    root_item = build_lines_tree(formatter)
+
+    assert run_coroutine(root_item.format_async(batch_size=1)) == (
+        root_item.format())
+    assert run_coroutine(root_item.format_async(item_id="add")) == (
+        root_item.format(item_id="add"))
+
+
+def test_format_async_cancel(formatter):
+    """Cancelling the task stops formatting and leaves the tree unchanged."""
+    root_item = build_lines_tree(formatter)
+    expected_output = root_item.format()
+
+    async def cancel_render():
+        task = asyncio.ensure_future(root_item.format_async(batch_size=1))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    counters.reset()
+    run_coroutine(cancel_render())
+    assert counters.items_rendered == 1
+    assert root_item.format() == expected_output
+
+
+def test_format_async_invisible_items(formatter):
+    """Items which aren't printed still count towards a batch."""
+    formatter.visible = False
+    root_item = Item(formatter)
+    for _ in range(5):
+        root_item.add_text("This text is invisible.")
+
+    async def count_switches():
+        switches = 0
+        task = asyncio.ensure_future(root_item.format_async(batch_size=1))
+        while not task.done():
+            switches += 1
+            await asyncio.sleep(0)
+        return switches, task.result()
+
+    switches, output = run_coroutine(count_switches())
+    assert switches >= 5
+    assert output == ""
+
+
+def test_format_async_batch_size(formatter):
+    """The batch size must be positive."""
+    root_item = build_lines_tree(formatter)
+
+    with pytest.raises(ValueError):
+        run_coroutine(root_item.format_async(batch_size=0))
@@ -0,0 +1,126 @@
+"""Test 'profile.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+
+import pytest
+
+from linotype import Item
+from linotype.profile import import_function, main, profile
+
+
+def get_test_item():
+    root_item = Item()
+    text_item = root_item.add_text("This is *text*.", item_id="text")
+    text_item.add_def("ls", "[options] files", "List files.", item_id="ls")
+    return root_item
+
+
+def test_import_function_from_module():
+    """Functions can be imported from a module."""
+    assert import_function("tests.profile_test:get_test_item") is (
+        get_test_item)
+
+
+def test_import_function_from_filepath():
+    """Functions can be imported from a file."""
+    func = import_function("{0}:get_test_item".format(__file__))
+    assert func().format() == get_test_item().format()
+
+
+@pytest.mark.parametrize("spec", [
+    "tests.profile_test", "tests.profile_test:", "tests.profile_test:foo"])
+def test_import_function_invalid(spec):
+    """Invalid specs raise an exception."""
+    with pytest.raises(ValueError):
+        import_function(spec)
+
+
+def test_profile_spans():
+    """The trace contains spans for each stage of formatting."""
+    recorder = profile(get_test_item, repeat=2, width=40)
+    names = [event["name"] for event in recorder.events]
+
+    assert names.count("build") == 1
+    assert names.count("format") == 2
+    assert names.count("TextItem text") == 2
+    assert names.count("DefinitionItem ls") == 2
+    assert {"parse", "wrap", "markup", "indent"} <= set(names)
+
+
+def test_profile_width_is_restored():
+    """Profiling at a fixed width doesn't change the tree or the defaults."""
+    def get_default_item():
+        root_item = Item()
+        root_item.add_text("This text is long enough to wrap at 20 columns.")
+        return root_item
+
+    expected_output = get_default_item().format()
+    profile(get_default_item, repeat=1, width=20)
+
+    assert get_default_item().format() == expected_output
+    assert Item().formatter.max_width != 20
+
+
+def test_profile_item_id():
+    """Only the selected item is formatted."""
+    recorder = profile(get_test_item, repeat=1, item_id="ls")
+    assert [timing.item_id for timing in recorder.timings] == ["ls"]
+
+
+def test_main_writes_trace(tmp_path, capsys):
+    """The trace is written to a JSON file."""
+    output_path = tmp_path / "trace.json"
+    main([
+        "tests.profile_test:get_test_item", "--repeat", "3",
+        "--output", str(output_path)])
+
+    with output_path.open() as file:
+        trace = json.load(file)
+
+    assert all(event["ph"] == "X" for event in trace["traceEvents"])
+    assert "Slowest items" in capsys.readouterr().out
+
+
+def get_unnamed_item():
+    root_item = Item()
+    options = root_item.add_text("Options:", item_id="options")
+    options.add_def("--all", "", "Show everything.")
+    options.add_def("--quiet", "", "Show nothing.")
+    options.add_text("More options are coming.")
+    return root_item
+
+
+def test_profile_names_items_without_ids():
+    """Items without an ID are named by their position in the tree."""
+    recorder = profile(get_unnamed_item, repeat=2)
+
+    assert recorder.item_names == [
+        "options", "options/0 --all", "options/1 --quiet", "options/2"] * 2
+
+
+def test_main_unknown_item_id(tmp_path, capsys):
+    """An unknown item ID is reported as a usage error."""
+    with pytest.raises(SystemExit) as excinfo:
+        main([
+            "tests.profile_test:get_test_item", "--item-id", "sl",
+            "--output", str(tmp_path / "trace.json")])
+
+    assert excinfo.value.code == 2
+    assert "the ID 'sl' does not exist" in capsys.readouterr().err
@@ -0,0 +1,88 @@
+"""Test 'roff.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import textwrap
+
+import pytest
+
+from linotype import Formatter, Item
+from linotype.roff import iter_roff, render_roff
+
+
+@pytest.fixture
+def root_item():
+    """Return a tree of items with IDs."""
+    root_item = Item(Formatter(auto_markup=True, manual_markup=True))
+    usage = root_item.add_text("Usage: todo [options]", item_id="usage")
+    usage.add_def(
+        "--file", "path", "Read tasks from *path*.", item_id="file")
+    remove = usage.add_def(
+        "remove", "", "Remove a task.", item_id="remove")
+    remove.add_text(".Tasks can't be recovered.")
+    return root_item
+
+
+def test_render_roff(root_item):
+    """Items are rendered as paragraphs and tagged paragraphs."""
+    expected = textwrap.dedent("""\
+        .TH "todo" "1"
+        .PP
+        Usage: todo [options]
+        .RS
+        .TP
+        \\fB\\-\\-file\\fR \\fIpath\\fR
+        Read tasks from \\fIpath\\fR.
+        .TP
+        \\fBremove\\fR
+        Remove a task.
+        .RS
+        .PP
+        \\&.Tasks can't be recovered.
+        .RE
+        .RE
+        """)
+
+    assert render_roff(root_item, title="todo") == expected
+
+
+def test_render_roff_title_quotes():
+    """Double quotes in the title don't end the argument."""
+    root_item = Item()
+
+    assert render_roff(root_item, title='say "hi"') == (
+        '.TH "say \\(dqhi\\(dq" "1"\n')
+
+
+def test_render_roff_nested_markup():
+    """Nested markup returns to the enclosing font."""
+    root_item = Item(Formatter(auto_markup=True, manual_markup=True))
+    root_item.add_def("cp", "source", "**Copy source** to C:\\.")
+
+    assert render_roff(root_item).splitlines()[1:] == [
+        "\\fBcp\\fR \\fIsource\\fR",
+        "\\fBCopy \\fIsource\\fB\\fR to C:\\e."]
+
+
+def test_render_roff_levels(root_item):
+    """Nested items are only rendered up to the given level."""
+    output = render_roff(root_item, item_id="usage", levels=1)
+
+    assert ".RS\n" in output
+    assert "recovered" not in output
+    assert "".join(iter_roff(root_item, levels=0)) == ""
@@ -0,0 +1,242 @@
+"""Test that operations on item trees scale linearly with input size.
+
+These tests only run when the '--scaling' option is passed to pytest. Each
+operation is run at doubling input sizes, and the number of Python and C
+function calls it makes is counted. Counting calls instead of measuring time
+makes the tests deterministic, and an operation whose cost quietly becomes
+quadratic makes roughly four times as many calls each time the input size
+doubles.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import sys
+from typing import Callable
+
+import pytest
+
+from linotype import DefStyle, Formatter, Item
+from linotype.items import DefinitionItem
+
+pytestmark = pytest.mark.scaling
+
+# These are large enough that the regular expressions compiled for each item
+# don't fit in the cache in the 're' module at any size. Otherwise, the number
+# of calls jumps when the cache starts overflowing.
+SIZES = [1000, 2000, 4000]
+
+# Linear growth doubles the number of calls, and quadratic growth quadruples
+# it. This leaves room for constant overhead and n*log(n) growth.
+MAX_GROWTH = 2.5
+
+
+def count_calls(func: Callable[[], None]) -> int:
+    """Count the Python and C function calls made by a function."""
+    calls = 0
+
+    def profiler(frame, event, arg):
+        nonlocal calls
+        if event in ("call", "c_call"):
+            calls += 1
+
+    sys.setprofile(profiler)
+    try:
+        func()
+    finally:
+        sys.setprofile(None)
+
+    return calls
+
+
+def count_lines(func: Callable[[], None]) -> int:
+    """Count the lines of Python code executed by a function.
+
+    This catches loops which don't call any functions.
+    """
+    lines = 0
+
+    def tracer(frame, event, arg):
+        nonlocal lines
+        if event == "line":
+            lines += 1
+        return tracer
+
+    sys.settrace(tracer)
+    try:
+        func()
+    finally:
+        sys.settrace(None)
+
+    return lines
+
+
+def assert_linear(
+        setup: Callable[[int], Callable[[], None]],
+        count: Callable[[Callable[[], None]], int] = count_calls) -> None:
+    """Assert that an operation scales linearly with its input size.
+
+    Args:
+        setup: A function that accepts an input size and returns the operation
+            to measure for that size.
+        count: The function used to measure the cost of the operation.
+    """
+    counts = [count(setup(size)) for size in SIZES]
+    for size, previous, current in zip(SIZES[1:], counts, counts[1:]):
+        growth = current / previous
+        assert growth <= MAX_GROWTH, (
+            "the number of calls grew by a factor of {0:.2f} at size {1}: "
+            "{2}".format(growth, size, counts))
+
+
+@pytest.fixture
+def formatter():
+    """Return a new Formatter object."""
+    return Formatter(
+        max_width=79, auto_width=False, auto_markup=True, manual_markup=True)
+
+
+def test_add_items_with_ids(formatter):
+    """Adding items with IDs doesn't search the whole tree for each item."""
+    def setup(size):
+        root_item = Item(formatter)
+        section = root_item.add_text("Section", item_id="section")
+
+        def operation():
+            for i in range(size):
+                section.add_text("Text", item_id="text{0}".format(i))
+
+        return operation
+
+    assert_linear(setup)
+
+
+def test_get_item_by_id(formatter):
+    """Looking up an item by its ID doesn't search the whole tree."""
+    def setup(size):
+        root_item = Item(formatter)
+        for i in range(size):
+            root_item.add_text("Text", item_id="text{0}".format(i))
+
+        def operation():
+            for i in range(size):
+                root_item.get_item_by_id("text{0}".format(i), raising=True)
+
+        return operation
+
+    assert_linear(setup)
+
+
+def test_format_aligned_definitions(formatter):
+    """Aligning definitions doesn't compare every pair of siblings."""
+    formatter.def_style = DefStyle.ALIGNED
+    formatter.manual_markup = False
+
+    def setup(size):
+        root_item = Item(formatter)
+        for i in range(size):
+            root_item.add_def("--option{0}".format(i), "value", "Message.")
+
+        return root_item.format
+
+    assert_linear(setup)
+
+
+@pytest.mark.parametrize("plain", [False, True])
+def test_frozen_format_is_not_slower(formatter, plain):
+    """Formatting a frozen tree does less work than formatting the items."""
+    root_item = Item(formatter)
+    for i in range(100):
+        section = root_item.add_text(
+            "Section *{0}* has **options**.".format(i))
+        for j in range(5):
+            section.add_def(
+                "--option{0}".format(j), "[value]",
+                "Set the value of the *option* to value.")
+    frozen_tree = root_item.freeze()
+
+    # The prepared parts of each item are cached after the first format.
+    root_item.format(plain=plain)
+
+    assert count_calls(lambda: frozen_tree.format(plain=plain)) <= (
+        count_calls(lambda: root_item.format(plain=plain)))
+
+
+def test_parse_args_markup():
+    """Finding the instances of repeated arguments takes linear time."""
+    def setup(size):
+        return lambda: DefinitionItem.parse_args_markup("arg " * size)
+
+    assert_linear(setup)
+
+
+def test_parse_message_markup():
+    """Finding the instances of arguments in a message takes linear time."""
+    def setup(size):
+        return lambda: DefinitionItem.parse_message_markup(
+            "arg", "arg " * size)
+
+    assert_linear(setup)
+
+
+def test_parse_manual_markup():
+    """Finding the instances of repeated manual markup takes linear time."""
+    def setup(size):
+        return lambda: Item.parse_manual_markup("*em* **strong** " * size)
+
+    assert_linear(setup)
+
+
+def test_format_manual_markup(formatter):
+    """Applying many instances of the same markup takes linear time."""
+    def setup(size):
+        root_item = Item(formatter)
+        root_item.add_text("*em* **strong** " * size)
+        return root_item.format
+
+    assert_linear(setup)
+
+
+def test_ext_apply_markup():
+    """Converting many instances of markup to nodes takes linear time."""
+    from linotype import ext
+
+    def setup(size):
+        text, positions = Item.parse_manual_markup(
+            "**strong *em* strong** *em* " * size)
+        return lambda: ext._apply_markup(text, positions)
+
+    assert_linear(setup, count_lines)
+
+
+def test_ext_parse_tree():
+    """Converting wide sections of nested items to nodes takes linear time."""
+    from linotype import ext
+    from linotype.ext import LinotypeDirective
+
+    def setup(size):
+        root_item = Item(Formatter(auto_markup=False, manual_markup=False))
+        section = root_item.add_text("Section")
+        for i in range(size):
+            definition = section.add_def("--option{0}".format(i), "", "")
+            definition.add_text("Nested text.")
+
+        directive = LinotypeDirective.__new__(LinotypeDirective)
+        directive.options = {"no_auto_markup": None, "no_manual_markup": None}
+        extra_content = ext.collections.defaultdict(lambda: None)
+        return lambda: directive._parse_tree(root_item, extra_content)
+
+    assert_linear(setup, count_lines)
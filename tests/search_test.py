@@ -0,0 +1,126 @@
+"""Test 'search.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import gc
+import weakref
+
+import pytest
+
+from linotype import Item
+from linotype.search import SearchIndex, tokenize
+from linotype.spec import load_dict
+
+
+@pytest.fixture
+def root_item():
+    root_item = Item()
+    commands = root_item.add_text("Commands:", item_id="commands")
+    commands.add_def(
+        "compress", "file", "Make a *file* smaller.", item_id="compress")
+    commands.add_def(
+        "archive", "files", "Store files together and **compress** them.",
+        item_id="archive")
+    commands.add_def(
+        "extract", "archive", "Unpack an archive.", item_id="extract")
+    commands.add_text("Compression is slow.")
+    return root_item
+
+
+def test_tokenize():
+    """Text is split into lowercase words."""
+    assert tokenize("Use --dry-run, or *DON'T*.") == [
+        "use", "dry", "run", "or", "don", "t"]
+
+
+def test_search(root_item):
+    """Term matches rank before argument and message matches."""
+    index = SearchIndex(root_item)
+    assert index.search("compress") == ["compress", "archive"]
+    assert index.search("archive") == ["archive", "extract"]
+    assert index.search("FILE") == ["compress"]
+
+
+def test_search_every_word(root_item):
+    """Items must contain every word in the query."""
+    index = SearchIndex(root_item)
+    assert index.search("files compress") == ["archive"]
+    assert index.search("files missing") == []
+    assert index.search("") == []
+
+
+def test_search_prefix(root_item):
+    """Words can be matched by their prefix."""
+    index = SearchIndex(root_item)
+    assert index.search("comp") == []
+    assert index.search("comp", prefix=True) == ["compress", "archive"]
+    assert index.search("fil", prefix=True) == ["compress", "archive"]
+    assert index.search("comp", prefix=True, limit=1) == ["compress"]
+
+
+def test_items_without_ids(root_item):
+    """Items without an ID are not indexed."""
+    index = SearchIndex(root_item)
+    assert len(index) == 4
+    assert index.search("slow") == []
+
+
+def test_new_items(root_item):
+    """Items added after the index is built are indexed."""
+    index = SearchIndex(root_item)
+    root_item.get_item_by_id("extract").add_def(
+        "--compress", "", "Decompress the archive.", item_id="decompress")
+    assert index.search("compress") == ["compress", "decompress", "archive"]
+
+
+def test_subtree(root_item):
+    """Only the descendants of the given item are indexed."""
+    options = root_item.add_text("Options:", item_id="options")
+    index = SearchIndex(options)
+    options.add_def("--compress", "", "", item_id="compress_option")
+    root_item.get_item_by_id("commands").add_def(
+        "list", "", "List compressed files.", item_id="list")
+    assert index.search("compress") == ["compress_option"]
+
+
+def test_lazy_items():
+    """Items in a spec are indexed."""
+    root_item = load_dict({"items": [
+        {"text": "Commands:", "items": [
+            {"term": "compress", "id": "compress"}]}]})
+    assert SearchIndex(root_item).search("compress") == ["compress"]
+
+
+def test_close(root_item):
+    """Items added after the index is closed aren't indexed."""
+    index = SearchIndex(root_item)
+    index.close()
+    root_item.add_text("Compress everything.", item_id="everything")
+
+    assert index.search("compress") == ["compress", "archive"]
+    assert root_item._observers == []
+
+
+def test_index_is_released(root_item):
+    """The tree doesn't keep the index alive."""
+    index_ref = weakref.ref(SearchIndex(root_item))
+    gc.collect()
+    root_item.add_text("Compress everything.", item_id="everything")
+
+    assert index_ref() is None
+    assert root_item._observers == []
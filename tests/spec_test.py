@@ -0,0 +1,155 @@
+"""Test 'spec.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+import textwrap
+
+import pytest
+
+from linotype import DefStyle, Formatter, Item
+from linotype import spec as spec_module
+from linotype.spec import load_dict, load_file
+
+SPEC = {
+    "formatter": {"auto_width": False, "auto_markup": False},
+    "items": [
+        {"text": "Commands:", "id": "commands", "items": [
+            {"term": "add", "args": "task", "message": "Add a task.",
+             "id": "add", "items": [
+                 {"text": "Tasks are added to the end.", "id": "add_note"}]},
+            {"term": "remove", "message": "Remove a task.", "id": "remove",
+             "formatter": {"def_style": "INLINE"}}]},
+        {"text": "Options:", "id": "options", "items": [
+            {"term": "--help", "message": "Show help.", "id": "help"}]}]}
+
+
+def build_eager_tree() -> Item:
+    """Build the same tree as SPEC using the Item methods."""
+    root_item = Item(Formatter(auto_width=False, auto_markup=False))
+    commands = root_item.add_text("Commands:", item_id="commands")
+    add = commands.add_def("add", "task", "Add a task.", item_id="add")
+    add.add_text("Tasks are added to the end.", item_id="add_note")
+    formatter = Formatter(
+        auto_width=False, auto_markup=False, def_style=DefStyle.INLINE)
+    commands.add_def(
+        "remove", "", "Remove a task.", formatter=formatter,
+        item_id="remove")
+    options = root_item.add_text("Options:", item_id="options")
+    options.add_def("--help", "", "Show help.", item_id="help")
+    return root_item
+
+
+def test_load_dict():
+    """The tree is the same as one built with the Item methods."""
+    assert load_dict(SPEC).format() == build_eager_tree().format()
+
+
+def test_load_dict_item_id():
+    """Formatting an item only adds that item, its children and ancestors."""
+    root_item = load_dict(SPEC)
+    expected = textwrap.dedent("""\
+        add task
+            Add a task.
+            Tasks are added to the end.""")
+
+    assert root_item.format(item_id="add") == expected
+
+    commands, options = root_item._children
+    assert options._pending_children is not None
+    assert commands._children[1]._pending_children is None
+    assert set(root_item._lazy_ids) == {"help"}
+
+
+def test_load_file_json(tmp_path):
+    """Specs can be loaded from JSON files."""
+    path = tmp_path / "help.json"
+    path.write_text(json.dumps(SPEC))
+
+    assert load_file(str(path)).format() == build_eager_tree().format()
+
+
+@pytest.mark.skipif(
+    spec_module.tomllib is None, reason="tomllib is not available")
+def test_load_file_toml(tmp_path):
+    """Specs can be loaded from TOML files."""
+    path = tmp_path / "help.toml"
+    path.write_text(textwrap.dedent("""\
+        [formatter]
+        auto_width = false
+        auto_markup = false
+
+        [[items]]
+        text = "Options:"
+        id = "options"
+
+        [[items.items]]
+        term = "--help"
+        message = "Show help."
+        id = "help"
+        """))
+
+    root_item = Item(Formatter(auto_width=False, auto_markup=False))
+    options = root_item.add_text("Options:", item_id="options")
+    options.add_def("--help", "", "Show help.", item_id="help")
+
+    assert load_file(str(path)).format() == root_item.format()
+
+
+def test_duplicate_ids():
+    """Specs with duplicate item IDs raise an exception."""
+    spec = {"items": [{"text": "One", "id": "same"}, {"text": "Two", "items": [
+        {"text": "Three", "id": "same"}]}]}
+
+    with pytest.raises(ValueError):
+        load_dict(spec)
+
+
+@pytest.mark.parametrize("spec", [
+    {"items": [{"message": "No term."}]},
+    {"items": [{"text": "Text", "term": "term"}]},
+    {"items": [{"text": "Text", "formatter": {"width": 80}}]},
+    {"items": {"text": "Not a list"}}])
+def test_invalid_spec(spec):
+    """Invalid specs raise an exception before building any items."""
+    with pytest.raises(ValueError):
+        load_dict(spec)
+
+
+@pytest.mark.parametrize("formatter, message", [
+    ({"def_style": "sideways"}, "unknown definition style 'sideways'"),
+    ({"def_style": 2}, "'def_style' has the wrong type"),
+    ({"max_width": "80"}, "'max_width' has the wrong type"),
+    ({"indent_spaces": True}, "'indent_spaces' has the wrong type"),
+    ({"strong": ["<"]}, "'strong' must be a pair of strings"),
+    ({"em": {"fg": "nocolor"}}, "nocolor")])
+def test_invalid_formatter(formatter, message):
+    """Invalid formatter values raise an exception naming the item."""
+    spec = {"items": [{"text": "Options:", "items": [
+        {"term": "--help", "id": "help", "formatter": formatter}]}]}
+
+    with pytest.raises(ValueError) as excinfo:
+        load_dict(spec)
+    assert str(excinfo.value).startswith("items[0].items[0] (ID 'help'): ")
+    assert message in str(excinfo.value)
+
+
+def test_unsupported_file_type(tmp_path):
+    """Only JSON and TOML files can be loaded."""
+    with pytest.raises(ValueError):
+        load_file(str(tmp_path / "help.yaml"))
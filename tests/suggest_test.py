@@ -0,0 +1,90 @@
+"""Test 'suggest.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import pytest
+
+from linotype import Item
+from linotype.spec import load_dict
+from linotype.suggest import Suggester, format_suggestions
+
+WORDS = ["install", "uninstall", "list", "search", "show", "config"]
+
+
+def test_suggest():
+    """The most similar words are suggested first."""
+    suggester = Suggester(WORDS)
+    assert suggester.suggest("instal") == ["install", "uninstall"]
+    assert suggester.suggest("serach") == ["search"]
+    assert suggester.suggest("instal", limit=1) == ["install"]
+    assert suggester.suggest("xyzzy") == []
+
+
+def test_add_and_discard():
+    """Words added after the index is built can be suggested."""
+    suggester = Suggester(WORDS)
+    suggester.suggest("list")
+    suggester.add("lint")
+    suggester.discard("list")
+    suggester.discard("missing")
+    assert suggester.suggest("liste") == ["lint"]
+    assert len(suggester) == len(WORDS)
+
+
+def test_common_ngrams():
+    """Words are found when most words share the same n-grams."""
+    words = ["cmd.sync.option{0}".format(i) for i in range(2000)]
+    suggester = Suggester(words + ["cmd.push.force"])
+    assert suggester.suggest("cmd.psh.force") == ["cmd.push.force"]
+    assert suggester.suggest("cmd.sync.option1999", limit=1) == [
+        "cmd.sync.option1999"]
+
+
+def test_format_suggestions():
+    """Suggestions are listed in a phrase."""
+    assert format_suggestions([]) == ""
+    assert format_suggestions(["a"]) == "; did you mean 'a'?"
+    assert format_suggestions(["a", "b", "c"]) == (
+        "; did you mean 'a', 'b' or 'c'?")
+
+
+def test_item_errors():
+    """Errors for unknown item IDs include suggestions."""
+    root_item = Item()
+    root_item.add_text("Commands:", item_id="commands")
+    renamed = root_item.add_text("Options:", item_id="options")
+    renamed.id = "flags"
+
+    message = "did you mean 'commands'?"
+    with pytest.raises(ValueError, match=message):
+        root_item.get_item_by_id("comands", raising=True)
+    with pytest.raises(ValueError, match=message):
+        root_item.format(item_id="comands")
+    with pytest.raises(ValueError, match=message):
+        root_item.freeze().format(item_id="comands")
+    with pytest.raises(ValueError, match="does not exist$"):
+        root_item.get_item_by_id("option", raising=True)
+
+
+def test_lazy_item_errors():
+    """IDs of items in a spec are suggested before the items are added."""
+    root_item = load_dict({"items": [
+        {"text": "Commands:", "items": [
+            {"term": "install", "id": "install"}]}]})
+    with pytest.raises(ValueError, match="did you mean 'install'?"):
+        root_item.get_item_by_id("instal", raising=True)
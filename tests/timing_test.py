@@ -0,0 +1,125 @@
+"""Test 'timing.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import asyncio
+
+import pytest
+
+from linotype import Formatter, Item
+from linotype.timing import STAGES, counters, instrument
+
+
+@pytest.fixture
+def root_item():
+    """Return a tree of items with IDs."""
+    root_item = Item(Formatter(auto_width=False))
+    section = root_item.add_text("Commands:", item_id="commands")
+    section.add_def(
+        "ls", "[options] files", "List the *files*.", item_id="ls")
+    return root_item
+
+
+def test_timings_are_recorded(root_item):
+    """A timing is recorded for each formatted item."""
+    with instrument() as recorder:
+        output = root_item.format()
+
+    assert [timing.item_id for timing in recorder.timings] == [
+        "commands", "ls"]
+    assert [timing.item_type for timing in recorder.timings] == [
+        "TextItem", "DefinitionItem"]
+    assert [timing.level for timing in recorder.timings] == [0, 1]
+    assert sum(timing.output_size for timing in recorder.timings) == (
+        len(output) - 1)
+
+
+def test_timings_have_stages(root_item):
+    """The time spent in each stage is recorded."""
+    with instrument() as recorder:
+        root_item.format()
+
+    for timing in recorder.timings:
+        assert set(timing.stages) == set(STAGES)
+        assert all(seconds >= 0 for seconds in timing.stages.values())
+        assert sum(timing.stages.values()) <= timing.total
+
+
+def test_callback_is_called(root_item):
+    """The callback is called once for each formatted item."""
+    timings = []
+    with instrument(callback=timings.append) as recorder:
+        root_item.format()
+
+    assert timings == recorder.timings
+
+
+def test_no_timings_outside_context(root_item):
+    """Timings are not recorded after the context exits."""
+    with instrument() as recorder:
+        pass
+    root_item.format()
+
+    assert recorder.timings == []
+
+
+def test_output_is_unchanged(root_item):
+    """Recording timings doesn't change the output."""
+    expected_output = root_item.format()
+    with instrument():
+        assert root_item.format() == expected_output
+
+
+def test_counters(root_item):
+    """Operations are counted while formatting."""
+    counters.reset()
+    root_item.format()
+
+    assert counters.items_rendered == 2
+    assert counters.parse_calls > 0
+    assert set(counters.as_dict()) == {
+        "items_rendered", "parse_calls", "cache_hits", "regex_compiles"}
+
+    counters.reset()
+    root_item.format()
+
+    assert counters.regex_compiles == 0
+    assert counters.cache_hits > 0
+
+
+def test_tasks_have_separate_recorders(root_item):
+    """Tasks on the same thread record timings separately."""
+    pytest.importorskip("contextvars")
+
+    async def record():
+        with instrument() as recorder:
+            await root_item.format_async(batch_size=1)
+        return recorder
+
+    async def record_many():
+        return await asyncio.gather(record(), record())
+
+    loop = asyncio.new_event_loop()
+    try:
+        recorders = loop.run_until_complete(record_many())
+    finally:
+        loop.close()
+
+    for recorder in recorders:
+        assert [timing.item_id for timing in recorder.timings] == [
+            "commands", "ls"]
@@ -0,0 +1,112 @@
+"""Test 'trie.py'.
+
+Copyright © 2017-2018 Garrett Powell <garrett@gpowell.net>
+
+This file is part of linotype.
+
+linotype is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+linotype is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with linotype.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import pytest
+
+from linotype import Formatter, Item
+from linotype.spec import load_dict
+from linotype.trie import IdTrie
+
+IDS = [
+    "cmd", "cmd.sync", "cmd.sync.options", "cmd.sync.options.exclude",
+    "cmd.push", "cmd.push.options", "cmd.push.options.force", "help"]
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    ("cmd.sync", ["cmd.sync"]),
+    ("cmd.*.options", ["cmd.push.options", "cmd.sync.options"]),
+    ("cmd.s*", ["cmd.sync"]),
+    ("cmd.**", [
+        "cmd", "cmd.push", "cmd.push.options", "cmd.push.options.force",
+        "cmd.sync", "cmd.sync.options", "cmd.sync.options.exclude"]),
+    ("**.options", ["cmd.push.options", "cmd.sync.options"]),
+    ("**.**.force", ["cmd.push.options.force"]),
+    ("cmd.sync.*.*", ["cmd.sync.options.exclude"]),
+    ("cmd.syn", []),
+    ("missing.**", []),
+])
+def test_match(pattern, expected):
+    """Patterns are matched one segment at a time."""
+    assert IdTrie(IDS).match(pattern) == expected
+
+
+def test_add_and_discard():
+    """IDs added after the trie is built can be matched."""
+    trie = IdTrie(IDS)
+    trie.match("cmd")
+    trie.add("cmd.pull")
+    trie.discard("cmd.push")
+    trie.discard("missing")
+    assert trie.match("cmd.*") == ["cmd.pull", "cmd.sync"]
+    assert len(trie) == len(IDS)
+
+
+def build_tree() -> Item:
+    root_item = Item()
+    commands = root_item.add_text("Commands:", item_id="cmd")
+    for command in ["sync", "push"]:
+        definition = commands.add_def(
+            command, "", "Run {0}.".format(command),
+            item_id="cmd.{0}".format(command))
+        options = definition.add_text(
+            "Options:", item_id="cmd.{0}.options".format(command))
+        options.add_def(
+            "--all", "", "Use everything.",
+            item_id="cmd.{0}.options.all".format(command))
+    return root_item
+
+
+def test_get_items_matching():
+    """Matching items are in the order they appear in the tree."""
+    root_item = build_tree()
+    items = root_item.get_items_matching("cmd.*.options")
+    assert [item.id for item in items] == [
+        "cmd.sync.options", "cmd.push.options"]
+    push = root_item.get_item_by_id("cmd.push")
+    assert push.get_items_matching("cmd.*.options") == [items[1]]
+
+
+def test_format_matching():
+    """Each matching subtree is formatted once."""
+    root_item = build_tree()
+    expected = "\n".join([
+        root_item.format(item_id="cmd.sync.options"),
+        root_item.format(item_id="cmd.push.options")])
+    assert root_item.format_matching("cmd.*.options") == expected
+    assert root_item.format_matching("cmd.**") == (
+        root_item.format(item_id="cmd"))
+    assert root_item.format_matching("missing") == ""
+
+
+def test_format_matching_plain():
+    """Markup can be left out of the matching subtrees."""
+    root_item = Item(Formatter(manual_markup=True, auto_width=False))
+    root_item.add_text("Some **commands**.", item_id="cmd.text")
+    assert root_item.format_matching("cmd.*", plain=True) == "Some commands."
+    assert root_item.format_matching("cmd.*") == root_item.format()
+
+
+def test_lazy_items():
+    """Items in a spec can be matched before they are added."""
+    root_item = load_dict({"items": [
+        {"text": "Commands:", "id": "cmd", "items": [
+            {"term": "sync", "id": "cmd.sync"},
+            {"term": "push", "id": "cmd.push"}]}]})
+    assert [item.id for item in root_item.get_items_matching("cmd.*")] == [
+        "cmd.sync", "cmd.push"]